@@ -3,26 +3,35 @@
 # Copyright © 2022 Vladimir Ein. All rights reserved.
 # License: http://opensource.org/licenses/MIT
 # 
-from datetime import date, datetime
+# Must go first: the startup profile counts the time spent on importing
+# everything else.
+from impl.startup import StartupProfile
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
 import os
-import tempfile
+import sys
 import time
-from typing import Any, Dict, Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Tuple
 import wx
 from wx.grid import Grid                # for brevity
 import wx.lib.agw.persist as persist    # type: ignore[import-untyped]
-import yaml
-from yaml import Dumper, Node
 
+from impl.board import BoardStorage, open_board_storage
+from impl.catalog import BoardCatalog, BoardInfo
+from impl.importer import PlainTextImporter, import_plain_text_file
+from impl.search import SearchEntry, SearchJob, run_ranked_search, run_search
 from impl.task import Epic, Task, TaskComment, TaskFilter, TaskStatus
+from impl.task_index import TaskIndex
+from impl.watcher import BoardWatcher, ConflictPolicy, merge_external_changes
 from ui.app_gui import ActiveListMenuBase, AppWindowBase
 from ui.comment_list import CommentAttrProvider
-from ui.task_list import TaskListDropTarget, TaskListTable, TaskStatusRenderer, EVT_TASK_LIST_DROP
+from ui.controls import CollapseButtonEvent, EVT_COLLAPSE_BUTTON
+from ui.task_list import TaskListDropEvent, TaskListDropTarget, TaskListTable, TaskStatusRenderer, EVT_TASK_LIST_DROP
 
-# TODO: move to impl
-class NoAliasDumper(yaml.Dumper):
-    def ignore_aliases(self, data: Any) -> bool:
-        return True
+# Run the app with --startup-profile to find out where the startup time goes
+startup_profile = StartupProfile.from_argv(sys.argv)
+startup_profile.record("imports", 0)
 
 
 class MSWTLWHandler(persist.TLWHandler):
@@ -70,6 +79,65 @@ class ActiveListMenu(ActiveListMenuBase):
         event.Skip()
 
 
+class BoardTab:
+    """
+    A board shown as a tab in tabs_boards.  All the boards found on startup
+    are parsed in the background, but the widgets are only populated when
+    the tab gets activated.  Inactive boards may be unloaded to save memory;
+    they'll be loaded again on activation.
+    """
+    board_id: str
+    storage: BoardStorage
+    # The background load started by AppWindow.StartLoadingBoard(); None if
+    # the board has never been loaded, or has been unloaded.
+    loading: "Optional[Future[Tuple[Dict[str, Epic], Dict[str, Task], List[str]]]]" = None
+    loaded: bool = False
+    epics_pool: Dict[str, Epic]
+    tasks_pool: Dict[str, Task]
+    # IDs of active tasks in the order of priority, as of the last time
+    # the board was deactivated (or loaded).
+    active_ids: List[str]
+    # time.monotonic() of the last activation, to pick boards for unloading
+    last_active: float = 0
+    watcher: Optional[BoardWatcher] = None
+    # Reading the changes made outside of the app (see
+    # AppWindow.ReloadExternalChanges): the order we've last saved, the
+    # board as it is on disk, and the active tasks that have been closed there.
+    reloading: "Optional[Future[Tuple[List[str], Tuple[Dict[str, Epic], Dict[str, Task], List[str]], Dict[str, Task]]]]" = None
+    # Search index over tasks_pool; see AppWindow.OnSearchPrepared
+    task_index: TaskIndex
+    # Reading the completed tasks (see AppWindow.LoadCompletedTasks): the
+    # tasks that weren't in the pool yet.
+    completed_loading: "Optional[Future[List[Task]]]" = None
+    completed_loaded: bool = False
+
+    def __init__(self, board_id: str, storage: BoardStorage) -> None:
+        self.board_id = board_id
+        self.storage = storage
+        self.epics_pool = {}
+        self.tasks_pool = {}
+        self.active_ids = []
+        self.task_index = TaskIndex()
+
+    def Unload(self) -> None:
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.storage.close()
+        # The storage object remembers things about the loaded tasks (e.g.
+        # whether completed tasks have been loaded), so we need a fresh one.
+        self.storage = open_board_storage(self.board_id)
+        self.loading = None
+        self.reloading = None
+        self.loaded = False
+        self.completed_loading = None
+        self.completed_loaded = False
+        self.epics_pool = {}
+        self.tasks_pool = {}
+        self.active_ids = []
+        self.task_index = TaskIndex()
+
+
 class AppWindow(AppWindowBase):
 
     # TODO: initialize somewhere else? or otherwise instances of this class will
@@ -82,6 +150,20 @@ class AppWindow(AppWindowBase):
     font: wx.Font
 
     board_id: str = ""
+    storage: BoardStorage
+    task_index: TaskIndex
+    boards: List[BoardTab]
+    current_board: Optional[BoardTab] = None
+    catalog: BoardCatalog
+    # Boards are parsed on these threads
+    load_executor: ThreadPoolExecutor
+    # Inactive boards are unloaded when there are more boards loaded than
+    # this; the least recently used ones go first.
+    MAX_LOADED_BOARDS = 4
+    # Tasks completed more than this many days ago are moved to the archive
+    # when the board is loaded (see BoardStorage.archive_completed); None
+    # turns archiving off.
+    ARCHIVE_AFTER_DAYS: Optional[int] = 90
     # RichTextCtrl.ChangeValue() should not be sending EVT_TEXT events; however,
     # due to a bug in wxWindows, it does send them. As a result, sometimes we
     # need to ignore the events. This field can be removed as soon as the bug
@@ -91,11 +173,38 @@ class AppWindow(AppWindowBase):
     autosave_timer: wx.Timer
     # seconds
     AUTOSAVE_DELAY = 120
+    # Writes the edits to the storage's write-ahead log (see
+    # BoardStorage.log_changes) shortly after they are made.  The timer is not
+    # restarted by further edits, so that a burst of them costs one flush.
+    log_timer: wx.Timer
+    # milliseconds
+    LOG_DELAY = 1000
     board_modified: bool = False
+    # Incremented on every change to the board; lets the background save
+    # find out whether the board has been modified while it was writing.
+    board_version: int = 0
+    # The board is written to disk on this thread, one save at a time, so that
+    # the UI doesn't freeze on large boards.
+    save_executor: ThreadPoolExecutor
 
     search_timer: wx.Timer
     # milliseconds
     SEARCH_DELAY = 500
+    # Long searches run here, so that typing never has to wait for them
+    search_executor: ThreadPoolExecutor
+    # The latest background search; it's cancelled when a new one starts
+    search_job: Optional[SearchJob] = None
+    # Searches that need to check more tasks than this go to the background
+    SYNC_SEARCH_LIMIT = 2000
+    # How many of the best matches a ranked search shows in each list
+    RANKED_SEARCH_LIMIT = 100
+
+    # Checks whether the board has been modified outside of the app
+    watch_timer: wx.Timer
+    # milliseconds
+    WATCH_INTERVAL = 2000
+    # What to do if a task has been modified both here and outside of the app
+    CONFLICT_POLICY = ConflictPolicy.KEEP_BOTH
 
     normal_pos: wx.Point
     normal_size: wx.Size
@@ -105,8 +214,20 @@ class AppWindow(AppWindowBase):
     persist_config: str = ""
     persist_mgr: persist.PersistenceManager
 
+    # Boards whose loading has been started before the widgets were built;
+    # they get their tabs in OnFrameShow().  See PreloadBoards().
+    preloaded_boards: "Optional[Future[List[Tuple[BoardInfo, BoardTab]]]]" = None
+
     def __init__(self, *args, **kwds) -> None:
-        AppWindowBase.__init__(self, *args, **kwds)
+        # The catalog is read and the boards are parsed in the background
+        # while the widgets are being built.
+        self.boards = []
+        self.catalog = BoardCatalog(".")
+        self.load_executor = ThreadPoolExecutor(thread_name_prefix="load")
+        self.preloaded_boards = self.load_executor.submit(self.PreloadBoards)
+
+        with startup_profile.phase("AppWindowBase.__init__"):
+            AppWindowBase.__init__(self, *args, **kwds)
 
         self.SetName("MainFrame")
         # TODO: how will this be stored with multiple tabs? a unique name for each tab?
@@ -124,7 +245,7 @@ class AppWindow(AppWindowBase):
         self.grid_tasks.EnableDragCell()
         self.grid_tasks.DisableDragColSize()
         self.grid_tasks.DisableDragRowSize()
-        self.grid_tasks.SetDefaultRenderer(wx.grid.GridCellAutoWrapStringRenderer())
+        # The word-wrapping renderer is set up by TaskList itself
         # This editor is a bit cumbersome when it comes to adding a lot of text to a 
         # single-line cell, but that's what we probably have to put up with for now.
         self.grid_tasks.SetDefaultEditor(wx.grid.GridCellAutoWrapStringEditor())
@@ -156,7 +277,6 @@ class AppWindow(AppWindowBase):
         self.grid_done.EnableDragCell()
         self.grid_done.DisableDragColSize()
         self.grid_done.DisableDragRowSize()
-        self.grid_done.SetDefaultRenderer(wx.grid.GridCellAutoWrapStringRenderer())
         self.grid_done.SetDefaultCellFont(self.font)
         self.grid_done.EnableEditing(False)
         # We don't want to let user position tasks in the 'done' list during 
@@ -222,6 +342,7 @@ class AppWindow(AppWindowBase):
         self.edit_labels.Bind(wx.EVT_KILL_FOCUS, self.OnEditLabelsKillFocus)
 
         self.label_done.SetBuddy(self.grid_done, self.panel_done_grid_buttons)
+        self.label_done.Bind(EVT_COLLAPSE_BUTTON, self.OnLabelDoneExpand)
         self.label_active.SetBuddy(self.grid_tasks, self.panel_active_grid_buttons)
 
         # These drop targets include the collapser 'buttons' and static lines
@@ -239,13 +360,22 @@ class AppWindow(AppWindowBase):
 
         self.autosave_timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self.OnAutosaveTimer, self.autosave_timer)
-
-        self.persist_mgr = persist.PersistenceManager.Get()
-        # TODO: find a better place for this config file
-        self.persist_config = os.path.join(os.getcwd(), "WhaddaDoo_UI.ini")
-        self.persist_mgr.SetPersistenceFile(self.persist_config)
-        self.persist_mgr.Register(self, MSWTLWHandler)
-        self.persist_mgr.Restore(self)
+        self.log_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnLogTimer, self.log_timer)
+        self.save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.watch_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnWatchTimer, self.watch_timer)
+        self.watch_timer.Start(self.WATCH_INTERVAL)
+        self.tabs_boards.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.OnBoardTabChanged)
+
+        with startup_profile.phase("persistence restore"):
+            self.persist_mgr = persist.PersistenceManager.Get()
+            # TODO: find a better place for this config file
+            self.persist_config = os.path.join(os.getcwd(), "WhaddaDoo_UI.ini")
+            self.persist_mgr.SetPersistenceFile(self.persist_config)
+            self.persist_mgr.Register(self, MSWTLWHandler)
+            self.persist_mgr.Restore(self)
 
         self.grid_tasks.SetFocus()
 
@@ -268,9 +398,23 @@ class AppWindow(AppWindowBase):
         # TODO: make sure it's also called when the app is being closed due to
         # the system shutdown
         self.search_timer.Stop()
+        self.watch_timer.Stop()
+        self.log_timer.Stop()
         self.SaveTaskChanges()
         self.SaveLabels()
-        self.SaveBoard()
+        self.SaveBoard(wait=True)
+        if self.current_board is not None:
+            # Nobody is going to show the result, but the next start will use it
+            self.UpdateCatalog(self.current_board, dict(self.tasks_pool), show=False)
+        self.save_executor.shutdown()
+        # No need to wait for the boards that are still being parsed
+        self.load_executor.shutdown(wait=False)
+        self.CancelSearch()
+        self.search_executor.shutdown(wait=False)
+        for board in self.boards:
+            if board.watcher is not None:
+                board.watcher.close()
+            board.storage.close()
 
         # If for some reason we can't store settings in the .ini file, we'd rather
         # ignore it so that wxPython does not nag the user with an error message.
@@ -440,9 +584,9 @@ class AppWindow(AppWindowBase):
         # Updating the 'modified' flag
         self.HandleBoardChange(task.desc != desc or task.summary != summary)
 
-        task.desc = desc
+        task.set_desc(desc)
         if summary != task.summary:
-            task.summary = summary
+            task.set_summary(summary)
             # TODO: tell the grid to update only the task we've modified
             self.grid_tasks.AutoSizeRow(self.selected_task_row)
             self.grid_tasks.ForceRefresh()
@@ -503,16 +647,29 @@ class AppWindow(AppWindowBase):
 
         self.grid_comments.Table.SetList(task.comments)
         self.grid_comments.AutoSizeRows()
+        self.ShowMatchedComments(task)
         # TODO: fill in the remaining controls
 
+    def ShowMatchedComments(self, task: Task) -> None:
+        """Selects the comments that have made `task` show up in the search results."""
+        self.grid_comments.ClearSelection()
+        table = self.grid_tasks.GetTable()
+        assert isinstance(table, TaskListTable)
+        matched = table.last_filter.find_comments(task)
+        for i in matched:
+            # Every comment takes two rows: the date and the text
+            self.grid_comments.SelectRow(2 * i + 1, addToSelected=True)
+        if matched:
+            self.grid_comments.MakeCellVisible(2 * matched[0] + 1, 1)
+
     def OnDateDeadlineChanged(self, event: wx.Event) -> None:
         if self.selected_task is not None:
             self.HandleBoardChange()
             date_picker = event.GetEventObject()
             assert isinstance(date_picker, wx.adv.DatePickerCtrl)    # for mypy
             dt = date_picker.Value
-            self.selected_task.deadline = date(dt.year, dt.month + 1, dt.day) if dt.IsValid() \
-                else None
+            self.selected_task.set_deadline(date(dt.year, dt.month + 1, dt.day) if dt.IsValid() \
+                else None)
             # TODO: only repaint the current task, and ideally only the status cell
             self.grid_tasks.ForceRefresh()
         event.Skip()
@@ -523,8 +680,8 @@ class AppWindow(AppWindowBase):
             combo = event.GetEventObject()
             assert isinstance(combo, wx.ComboBox)   # for mypy
             sel_epic_id = combo.GetClientData(combo.GetSelection())
-            self.selected_task.epic = self.epics_pool[sel_epic_id] if sel_epic_id is not None \
-                else None
+            self.selected_task.set_epic(self.epics_pool[sel_epic_id] if sel_epic_id is not None \
+                else None)
             # TODO: only repaint the current task, and ideally only the status cell
             self.grid_tasks.ForceRefresh()
             
@@ -534,7 +691,7 @@ class AppWindow(AppWindowBase):
         if self.selected_task is not None:
             new_labels = sorted(self.edit_labels.Value.split())
             self.HandleBoardChange(self.selected_task.labels != new_labels)
-            self.selected_task.labels = new_labels
+            self.selected_task.set_labels(new_labels)
             # TODO: only repaint the current task, and ideally only the status cell
             self.grid_tasks.ForceRefresh()
             self.grid_done.ForceRefresh()
@@ -571,12 +728,27 @@ class AppWindow(AppWindowBase):
         event.Skip()
 
     def OnGridTasksCellChanged(self, event: wx.grid.GridEvent) -> None:
+        task = self.grid_tasks.Table.GetItem(event.GetRow())
         self.HandleBoardChange()
         self.grid_tasks.AutoSizeRow(event.GetRow())
         # We need to reload the description box on the right side.
         self.LoadTaskDetails()
         event.Skip()
         
+    def PreloadBoards(self) -> List[Tuple[BoardInfo, BoardTab]]:
+        """
+        Reads the catalog and starts loading the boards listed there.  Runs on
+        the load thread: the catalog itself is small, but it's in YAML, and
+        importing yaml takes longer than reading it.
+        """
+        preloaded = []
+        with startup_profile.phase("catalog refresh"):
+            for info in self.catalog.refresh(rebuild_stale=False):
+                board = BoardTab(info.name, open_board_storage(info.path))
+                board.loading = self.load_executor.submit(board.storage.load)
+                preloaded.append((info, board))
+        return preloaded
+
     def OnFrameShow(self, event: wx.Event) -> None:
         self.ResizeGridColumns(self.grid_tasks)
         self.ResizeGridColumns(self.grid_done)
@@ -585,96 +757,230 @@ class AppWindow(AppWindowBase):
         # Can't do it in the frame's __init__() because for a maximized frame,
         # maximizing actually happens *after* __init__(), and the frame remains
         # in the 'restored' state all the way through __init__().
-        self.persist_mgr.RegisterAndRestore(self.splitter_main)
-
-        for f in os.scandir("."):
-            if f.is_dir() and os.path.isfile(os.path.join(f.path, "tasks.yaml")):
-                self.LoadBoard(f.name)
-                # TODO: remove this line after adding support for multiple boards
-                break
-
-        if not self.board_id:
+        with startup_profile.phase("persistence restore (splitter)"):
+            self.persist_mgr.RegisterAndRestore(self.splitter_main)
+
+        # The catalog gives us the list of boards (and the numbers to show on
+        # the tabs) without reading the boards; their loading has started in
+        # __init__().  Those that have been changed outside of the app are
+        # updated once they're loaded.
+        assert self.preloaded_boards is not None    # for mypy
+        with startup_profile.phase("waiting for the catalog"):
+            preloaded_boards = self.preloaded_boards.result()
+        self.preloaded_boards = None
+        for (info, board) in preloaded_boards:
+            self.AddBoardTab(board, info)
+            if self.catalog.is_stale(info):
+                assert board.loading is not None   # for mypy
+                board.loading.add_done_callback(lambda f, board=board: wx.CallAfter(self.OnBoardLoaded, board, f))
+
+        if not self.boards:
             # If we couldn't find any boards, let's create a new one
             self.NewBoard("Main")
+        elif self.current_board is None:
+            self.ActivateBoard(0)
 
+        # By the time this gets called, the first paint is done
+        wx.CallAfter(self.OnStartupComplete)
         event.Skip()
 
+    def OnStartupComplete(self) -> None:
+        startup_profile.record("first paint", startup_profile.now())
+        startup_profile.report()
+        # Only the first startup matters
+        startup_profile.enabled = False
+
     def NewBoard(self, board_id: str) -> None:
-        self.board_id = board_id
-        self.board_modified = False
-        self.tasks_pool = {}
-        self.epics_pool = {}
-        self.InitBoardWidgets([], [])
+        board = BoardTab(board_id, BoardStorage(board_id))
+        # Nothing to load here
+        board.loaded = True
+        self.AddBoardTab(board)
+        self.ActivateBoard(len(self.boards) - 1)
+
+    def AddBoardTab(self, board: BoardTab, info: Optional[BoardInfo] = None) -> None:
+        # The first board gets the page that holds the board widgets
+        if self.boards:
+            page = wx.Panel(self.tabs_boards, wx.ID_ANY)
+            page.SetSizer(wx.BoxSizer(wx.VERTICAL))
+            self.tabs_boards.AddPage(page, "")
+        self.boards.append(board)
+        self.UpdateBoardTabText(board, info)
+
+    def UpdateBoardTabText(self, board: BoardTab, info: Optional[BoardInfo]) -> None:
+        text = board.board_id
+        if info is not None:
+            text += f" ({info.active_count})"
+        self.tabs_boards.SetPageText(self.boards.index(board), text)
+
+    def OnBoardLoaded(self, board: BoardTab, future: "Future[Tuple[Dict[str, Epic], Dict[str, Task], List[str]]]") -> None:
+        """Updates the catalog entry of a board that has been changed outside of the app."""
+        if board.loading is not future or future.exception() is not None:
+            return
+        _, tasks_pool, _ = future.result()
+        self.UpdateCatalog(board, dict(tasks_pool))
+
+    def UpdateCatalog(self, board: BoardTab, tasks_pool: Dict[str, Task], show: bool = True) -> None:
+        """
+        Refreshes the catalog entry of `board` on the save thread (it has to
+        count the tasks and look at every file of the board), after whatever
+        is being saved at the moment.  `tasks_pool` must not be modified
+        afterwards, so it's usually a copy.  If `show` is True, the tab text
+        is updated once the entry is ready.
+        """
+        future = self.save_executor.submit(self.catalog.update, board.board_id, board.storage, tasks_pool)
+        if show:
+            future.add_done_callback(lambda f: wx.CallAfter(self.OnCatalogUpdated, board, f))
+
+    def OnCatalogUpdated(self, board: BoardTab, future: "Future[BoardInfo]") -> None:
+        # The catalog is only a cache, so a failure is not worth mentioning
+        if future.exception() is None and board in self.boards:
+            self.UpdateBoardTabText(board, future.result())
+
+    def StartLoadingBoard(self, board: BoardTab) -> None:
+        if board.loading is None and not board.loaded:
+            board.loading = self.load_executor.submit(board.storage.load)
+
+    def OnBoardTabChanged(self, event: wx.BookCtrlEvent) -> None:
+        self.ActivateBoard(event.GetSelection())
+        event.Skip()
+
+    def ActivateBoard(self, index: int) -> None:
+        """
+        Shows the board from the tab at `index`, loading it if necessary.
+        All tabs share the same set of widgets, which get moved to the page
+        of the active tab.
+        """
+        board = self.boards[index]
+        if board is self.current_board:
+            return
+        if self.current_board is not None:
+            self.DeactivateBoard()
+
+        self.MoveBoardWidgets(self.tabs_boards.GetPage(index))
+        if self.tabs_boards.GetSelection() != index:
+            # Unlike SetSelection(), doesn't send EVT_NOTEBOOK_PAGE_CHANGED
+            self.tabs_boards.ChangeSelection(index)
+        with startup_profile.phase("LoadBoard"):
+            self.LoadBoard(board)
+        if self.edit_search.Value:
+            self.FilterTasks(self.edit_search.Value)
+        self.UnloadInactiveBoards()
+
+    def DeactivateBoard(self) -> None:
+        """Stores the state of the current board before switching to another one."""
+        board = self.current_board
+        assert board is not None
+        self.SaveTaskChanges()
+        self.SaveLabels()
+        board.active_ids = [ task.id for task in self.grid_tasks.GetTable().GetList() if task ]
+        self.autosave_timer.Stop()
+        self.log_timer.Stop()
+        self.SaveBoard()
+        self.current_board = None
+
+    def MoveBoardWidgets(self, page: wx.Window) -> None:
+        if self.splitter_main.GetParent() is page:
+            return
+        sizer = self.splitter_main.GetContainingSizer()
+        if sizer is not None:
+            sizer.Detach(self.splitter_main)
+        self.splitter_main.Reparent(page)
+        if page.GetSizer() is None:
+            page.SetSizer(wx.BoxSizer(wx.VERTICAL))
+        page.GetSizer().Add(self.splitter_main, 1, wx.ALL | wx.EXPAND, 8)
+        page.Layout()
+
+    def UnloadInactiveBoards(self, max_loaded: Optional[int] = None) -> None:
+        """
+        Unloads the least recently used inactive boards, so that no more than
+        `max_loaded` boards (MAX_LOADED_BOARDS by default) remain in memory.
+        Boards with unsaved changes are kept.
+        """
+        if max_loaded is None:
+            max_loaded = self.MAX_LOADED_BOARDS
+        inactive = sorted((board for board in self.boards if board.loaded and board is not self.current_board),
+            key=lambda board: board.last_active)
+        excess = len(inactive) + (1 if self.current_board is not None else 0) - max_loaded
+        for board in inactive[:max(excess, 0)]:
+            # The board is saved on deactivation, but the save might not have
+            # completed yet (or might have failed).
+            if not any(task.dirty for task in board.tasks_pool.values()):
+                board.Unload()
 
     # TODO: think on naming conventions. Are "Save/Load" about disk I/O? If so,
     # how should we name methods dealing with memory objects and widgets?
-    def SaveBoard(self) -> None:
+    def SaveBoard(self, wait: bool = False, log_only: bool = False) -> None:
+        """
+        Writes the board changes to disk on the save thread.  The tasks to be
+        written are copied here, on the UI thread, so that the user can keep
+        editing the board while it's being saved.  If `wait` is True, returns
+        only after the board has been written (or failed to).  If `log_only`
+        is True, the changes only go to the write-ahead log, even if the
+        storage would rather write a full snapshot.
+        """
         # TODO: only save the board if it has been modified? Add a 'force' parm?
         # At least we don't want extra writing when called from OnClose().
-
-        # TODO: keep a sequential list of IDs from the reading op, and use it
-        # to determine the sequence in which the Task objects should be
-        # written to the output file.
-        dir_name = self.board_id
+        # (With the journal, a save without changes doesn't write anything.)
+        version = self.board_version
+        changed_ids = self.GetDirtyTaskIds()
+        full = not log_only and self.storage.needs_snapshot()
+        pool = self.storage.snapshot_pool(self.tasks_pool, changed_ids, full)
+        order = [ task.id for task in self.grid_tasks.GetTable().GetList() if task ]   # ignoring None values
+
+        if log_only:
+            future = self.save_executor.submit(self.storage.log_changes, pool, order, changed_ids)
+        else:
+            future = self.save_executor.submit(self.storage.write_changes, pool, order, changed_ids, full)
+        # Another board might get activated before the save is complete
+        board = self.current_board
+        assert board is not None
+        if wait:
+            self.OnSaveDone(future, version, board, pool)
+        else:
+            future.add_done_callback(lambda f: wx.CallAfter(self.OnSaveDone, f, version, board, pool))
+        # Only full snapshots refresh the catalog; the saves that only append
+        # to the log happen every second or so while the user is typing.
+        # (The full pool is a copy already.)  A waiting save is the last one,
+        # and OnClose takes care of the catalog then.
+        if full and not wait:
+            self.UpdateCatalog(board, pool)
+
+    def OnSaveDone(self, future: "Future[None]", version: int, board: BoardTab,
+        saved_pool: Dict[str, Task]) -> None:
+        """
+        Called on the UI thread when a save started by `SaveBoard` is complete.
+        `saved_pool` holds the copies of the tasks that have been written.
+        """
         try:
-            try:
-                os.mkdir(dir_name)
-            except FileExistsError:
-                # It's ok for the directory to already exist
-                pass
-            
-            # TODO: we can append new data to tasks.yaml if it's known to have
-            # no changes to the old contents (e.g. the user only added new tasks
-            # and didn't touch the *contents* of the old ones). Caveat: we do
-            # store the status inside of tasks.yaml. Maybe it's wrong.
-
-            tasks_file_name = None
-            with tempfile.NamedTemporaryFile(mode="w", dir=dir_name, delete=False,
-                encoding='utf8', prefix="tasks.", suffix=".yaml") as f:
-
-                yaml.dump(self.tasks_pool, f, default_flow_style=False,
-                    allow_unicode=True, sort_keys=False, Dumper=NoAliasDumper)
-                # Keep it for future reference
-                tasks_file_name = f.name
-
-            index_file_name = None
-            with tempfile.NamedTemporaryFile(mode="w", dir=dir_name, delete=False,
-                encoding='utf8', prefix="active.", suffix=".txt") as f:
-
-                for task in self.grid_tasks.GetTable().GetList():
-                    if task:            # ignoring None values
-                        f.write(task.id + "\n")
-                # Keep it for future reference
-                index_file_name = f.name
-
-            # Note: we do not implement a full transaction-like rename here
-            # because the new files have been created successfully, so even
-            # in the worst scenario when something breaks in the middle, the
-            # user can manually rename them. A full rename (renaming the
-            # old files first) would help implement a clean recovery in case
-            # of errors, and would also help in case the old files are
-            # locked (on Windows). But it's too complicated for such a
-            # simple tool.
-            self.ReplaceFile(os.path.join(dir_name, "tasks.yaml"), tasks_file_name)
-            self.ReplaceFile(os.path.join(dir_name, "active.txt"), index_file_name)
+            future.result()
+        except OSError as e:
+            # The tasks remain dirty and will be saved on the next autosave
+            self.autosave_timer.StartOnce(self.AUTOSAVE_DELAY * 1000)
+            wx.MessageBox(f"Could not save the board:\n{e}", "WhaddaDoo", wx.OK | wx.ICON_ERROR, self)
+            return
 
-            self.board_modified = False
+        for (k, saved_task) in saved_pool.items():
+            task = board.tasks_pool.get(k)
+            if task is not None:
+                # If the task has been edited during the save, it stays dirty
+                task.mark_saved(saved_task.version)
 
-        except OSError:
-            # TODO: !!IMPORTANT!! show an error message
-            pass
+        # Same for the board as a whole: if the user has edited it while we
+        # were saving, the autosave timer has been restarted.
+        if self.board_version == version:
+            self.board_modified = False
 
-    @staticmethod
-    def ReplaceFile(old_name: str, new_name: str) -> None:
-        try:
-            os.remove(old_name)
-        except FileNotFoundError:
-            # It's okay, we've just created a new file, no old version here
-            pass
-        os.rename(new_name, old_name)
+    def GetDirtyTaskIds(self) -> List[str]:
+        """Returns the IDs of the tasks that have been added or modified since the last save."""
+        # The index knows which tasks have been edited, so there's no need to
+        # check the whole pool; the saved ones are dropped from it on the way.
+        self.task_index.catch_up(self.tasks_pool)
+        edited = self.task_index.edited
+        dirty_ids = [ k for k in edited if k in self.tasks_pool and self.tasks_pool[k].dirty ]
+        edited.intersection_update(dirty_ids)
+        return dirty_ids
 
     def InitBoardWidgets(self, active_tasks: Sequence[Task], completed_tasks: Sequence[Task]) -> None:
-        self.tabs_boards.SetPageText(0, self.board_id)
         self.combo_epic.Clear()
         # Note: we want the 'no epic' (blank) string to be at the top of the
         # list, and therefore can't rely on the native sorting provided by 
@@ -683,7 +989,6 @@ class AppWindow(AppWindowBase):
         for epic in sorted(self.epics_pool.values(), key=lambda epic: epic.name):
             self.combo_epic.Append(epic.name, epic.id)
 
-        # TODO: sort tasks by completion date, newer to older
         self.grid_done.SetTaskList(completed_tasks, self.tasks_pool)
         self.grid_done.AutoSizeRows()
         self.grid_done.SetGridCursor(0, 1)
@@ -693,62 +998,130 @@ class AppWindow(AppWindowBase):
         # grid_tasks.SetGridCursor() to go after grid_done.SetGridCursor(),
         # not before it).
         self.grid_tasks.SetTaskList(active_tasks, self.tasks_pool)
-        self.grid_tasks.AutoSizeRows()
+        with startup_profile.phase("first AutoSizeRows"):
+            self.grid_tasks.AutoSizeRows()
         self.grid_tasks.SetGridCursor(0, 1)
     
-    def LoadBoard(self, board_id: str) -> None:
-        self.board_id = board_id
+    def LoadBoard(self, board: BoardTab) -> None:
+        # Whatever is being searched for belongs to the previous board
+        self.CancelSearch()
+        self.current_board = board
+        board.last_active = time.monotonic()
+        self.board_id = board.board_id
         self.board_modified = False
-        self.tasks_pool = {}
         active_tasks = []
-        dir_name = self.board_id
-        self.epics_pool = {}
-        try:
-            with open(os.path.join(dir_name, "epics.yaml"), "r", encoding='utf8') as f:
-                obj_pool = yaml.load(f, Loader=yaml.SafeLoader)
-                # TODO: verify that obj_pool is a dict
-                for (k, v) in obj_pool.items():
-                    self.epics_pool[k] = Epic.from_plain_object(k, v)
-        except FileNotFoundError:
-            # We don't care if there are no epics
-            pass
-        # TODO: handle key lookup exceptions that Epic.from_plain_object might
-        # throw (or add another exception to from_plain_object that would better 
-        # describe the error).
-
-        # TODO: handle exceptions
+
+        if not board.loaded:
+            self.StartLoadingBoard(board)
+            assert board.loading is not None   # for mypy
+            # Most likely, the board has already been parsed in the background
+            # by now; if not, we have to wait.
+            with wx.BusyCursor(), startup_profile.phase("waiting for the board to parse"):
+                # TODO: handle exceptions
+                board.epics_pool, board.tasks_pool, board.active_ids = board.loading.result()
+            board.loaded = True
+            self.ArchiveOldTasks(board)
+
+        self.storage = board.storage
+        self.epics_pool = board.epics_pool
+        self.tasks_pool = board.tasks_pool
+        self.task_index = board.task_index
+        active_ids = board.active_ids
+        if board.watcher is None:
+            board.watcher = BoardWatcher(board.storage)
+
         completed_set = {}
         active_set = {}
-        print(">>> Before searching for tasks.yaml")
-        with open(os.path.join(dir_name, "tasks.yaml"), "r", encoding='utf8') as f:
-            # Since we don't save object tags in save_board(), it's ok to use
-            # the SafeLoader here - YAML won't be able to deduce class names
-            # anyway.
-            obj_pool = yaml.load(f, Loader=yaml.SafeLoader)
-            # TODO: verify that obj_pool is a dict
-            for (k, v) in obj_pool.items():
-                task = Task.from_plain_object(k, v, self.epics_pool)
-                self.tasks_pool[k] = task
-                if task.status == TaskStatus.ACTIVE:
-                    active_set[k] = task
-                else:
-                    completed_set[k] = task
-
-        with open(os.path.join(dir_name, "active.txt"), "r", encoding='utf8') as f:
-            for task_id in f.readlines():
-                task_id = task_id.strip()
-                if task_id in self.tasks_pool:
-                    # TODO: make sure the status is 'active'
-                    active_tasks.append(self.tasks_pool[task_id])
-                    del active_set[task_id]
-                else:
-                    # TODO: show an error message. Maybe throw an exception.
-                    # But we probably want to recover as much of the board 
-                    # contents as we can in case of such errors.
-                    pass
+        for (k, task) in self.tasks_pool.items():
+            if task.status == TaskStatus.ACTIVE:
+                active_set[k] = task
+            else:
+                completed_set[k] = task
+
+        for task_id in active_ids:
+            if task_id in active_set:
+                active_tasks.append(self.tasks_pool[task_id])
+                del active_set[task_id]
+            else:
+                # TODO: show an error message. Maybe throw an exception.
+                # But we probably want to recover as much of the board 
+                # contents as we can in case of such errors.
+                pass
 
         # TODO: verify that active_set is empty
-        self.InitBoardWidgets(active_tasks, list(completed_set.values()))
+        # Usually, these are just the tasks closed since the last snapshot;
+        # the rest will be loaded from the storage when the user needs them.
+        completed_tasks = sorted(completed_set.values(),
+            key=lambda task: task.close_date or task.creation_date, reverse=True)
+        self.InitBoardWidgets(active_tasks, completed_tasks)
+        if self.grid_done.IsShown():
+            self.LoadCompletedTasks()
+
+    def ArchiveOldTasks(self, board: BoardTab) -> None:
+        """
+        Moves old completed tasks to the archive in the background.  These
+        tasks haven't been loaded into the pool yet (completed tasks are
+        loaded lazily), so the board in memory is not affected.
+        """
+        if self.ARCHIVE_AFTER_DAYS is None:
+            return
+        before = date.today() - timedelta(days=self.ARCHIVE_AFTER_DAYS)
+        # Runs on the save thread so that it doesn't interfere with saves.
+        # If it fails, the tasks just stay where they are until the next time.
+        self.save_executor.submit(board.storage.archive_completed, before)
+
+    def LoadCompletedTasks(self) -> "Optional[Future[List[Task]]]":
+        """
+        Makes sure all completed tasks get loaded from the storage and added
+        to grid_done (see OnCompletedTasksLoaded).  Returns the loading in
+        progress, or None if the tasks have already been loaded.
+
+        They are read on the load thread: the storage may be busy with a save
+        or with the archive for a while, and the UI must not wait for it.  The
+        storage adds the tasks to a copy of the pool, since the pool itself
+        belongs to the UI thread.
+        """
+        board = self.current_board
+        if board is None or board.completed_loaded:
+            return None
+        if board.completed_loading is None:
+            future = self.load_executor.submit(board.storage.load_completed, dict(board.tasks_pool))
+            board.completed_loading = future
+            future.add_done_callback(lambda f, board=board: wx.CallAfter(self.OnCompletedTasksLoaded, board, f))
+        return board.completed_loading
+
+    def OnCompletedTasksLoaded(self, board: BoardTab, future: "Future[List[Task]]") -> None:
+        if board.completed_loading is not future:
+            # The board has been unloaded in the meantime
+            return
+        board.completed_loading = None
+        if future.exception() is not None:
+            # Let's try again next time
+            return
+        board.completed_loaded = True
+        # The pool might have got these tasks in the meantime, e.g. from the
+        # changes made outside of the app; those copies are newer.
+        completed_tasks = [ task for task in future.result() if task.id not in board.tasks_pool ]
+        for task in completed_tasks:
+            board.tasks_pool[task.id] = task
+            board.task_index.add(task)
+        if board is not self.current_board:
+            # The grid will be filled from the pool on activation
+            return
+        if completed_tasks:
+            table = self.grid_done.GetTable()
+            assert isinstance(table, TaskListTable)
+            # Everything in the grid is newer than what we've just loaded
+            table.InsertItems(table.GetNumberRows(), completed_tasks)
+        # The search results are incomplete without them
+        if self.edit_search.Value != "":
+            self.FilterTasks(self.edit_search.Value)
+
+    def OnLabelDoneExpand(self, event: wx.Event) -> None:
+        assert isinstance(event, CollapseButtonEvent)   # for mypy
+        if event.expanded:
+            self.LoadCompletedTasks()
+        event.Skip()
 
     def MarkCompleted(self, final_status: TaskStatus = TaskStatus.DONE) -> None:
         task = self.selected_task
@@ -772,6 +1145,9 @@ class AppWindow(AppWindowBase):
             # Nothing to do here
             return
         self.HandleBoardChange()
+        # If the task has been found in the archive, this also brings it back:
+        # its new copy is saved along with the active tasks and takes
+        # precedence over the archived one.
         task.set_status(TaskStatus.ACTIVE)
         self.grid_done.DeleteRows(self.selected_task_row)
         self.grid_tasks.GetTable().InsertItems(0, [task])
@@ -785,9 +1161,11 @@ class AppWindow(AppWindowBase):
         self.LoadTaskDetails()
 
     def InsertNewTask(self, row: int) -> None:
-        self.HandleBoardChange()
         task = Task()
+        task.gen_id(self.tasks_pool)
+        self.HandleBoardChange()
         self.tasks_pool[task.id] = task
+        self.task_index.add(task)
         self.grid_tasks.Table.InsertItems(row, [task])
         self.grid_tasks.AutoSizeRow(row)
         self.grid_tasks.SetGridCursor(row, 1)
@@ -842,6 +1220,9 @@ class AppWindow(AppWindowBase):
         self.HandleBoardChange()
         comment = TaskComment(self.edit_comment.Value)
         self.grid_comments.Table.AddNewComment(comment)
+        # The table has appended the comment to the task's own list
+        if self.selected_task is not None:
+            self.selected_task.touch()
         self.ShowCommentEditor(False)
         last_row = self.grid_comments.NumberRows - 1
         self.grid_comments.AutoSizeRow(last_row - 1)
@@ -855,8 +1236,159 @@ class AppWindow(AppWindowBase):
 
     def FilterTasks(self, query: str) -> None:
         print("Filter called")
-        self.grid_done.Filter(TaskFilter(query))
-        self.grid_tasks.Filter(TaskFilter(query))
+        self.CancelSearch()
+        if query == "" or self.current_board is None:
+            self.SearchTasks(TaskFilter(query))
+            return
+        # Search results must include all the completed tasks, even the
+        # archived ones.  Until the completed tasks are loaded, we show what
+        # we have; the search is repeated once they're in.  Archived tasks
+        # are older, so they come after them.
+        self.PrepareSearch(query, self.LoadCompletedTasks() is None)
+
+    def PrepareSearch(self, query: str, archived: bool) -> None:
+        """
+        Does the part of the search that needs the storage, on the search
+        thread, since the storage may be busy saving: looks for the archived
+        tasks matching `query` if `archived` is True, and lets the storage
+        narrow the search down (see BoardStorage.prefilter).  The search goes
+        on in OnSearchPrepared.  The storage keeps the archive decompressed
+        and indexed after the first lookup, so it's cheap to do on every query.
+        """
+        board = self.current_board
+        assert board is not None
+        storage = board.storage
+        # Only checked for membership, which is safe while we modify the pool
+        known = board.tasks_pool
+        unsaved_ids = self.GetDirtyTaskIds()
+        job = self.search_job = SearchJob(TaskFilter(query))
+
+        def prepare() -> List[Task]:
+            # The user might have typed on in the meantime
+            if job.cancelled:
+                return []
+            archived_tasks = storage.search_archived(job.filter, known) if archived else []
+            storage.prefilter(job.filter, unsaved_ids)
+            if job.filter.candidates is not None:
+                job.filter.candidates.update(task.id for task in archived_tasks)
+            return archived_tasks
+
+        future = self.search_executor.submit(prepare)
+        future.add_done_callback(lambda f: wx.CallAfter(self.OnSearchPrepared, job, f))
+
+    def OnSearchPrepared(self, job: SearchJob, future: "Future[List[Task]]") -> None:
+        """
+        Adds the archived tasks found by PrepareSearch to the pool and to
+        grid_done, and goes on with the search, narrowed down by the index.
+        The index only knows the tasks in the pool, so the filter is only
+        good for the grids.
+        """
+        if job is not self.search_job or job.cancelled:
+            return
+        self.search_job = None
+        # If the archive can't be read, the rest of the tasks can still be searched
+        archived_tasks = [ task for task in future.result() if task.id not in self.tasks_pool ] \
+            if future.exception() is None else []
+        for task in archived_tasks:
+            self.tasks_pool[task.id] = task
+            self.task_index.add(task)
+        if archived_tasks:
+            table = self.grid_done.GetTable()
+            assert isinstance(table, TaskListTable)
+            # Archived tasks are older than anything else in the grid
+            table.InsertItems(table.GetNumberRows(), archived_tasks)
+        self.task_index.narrow(job.filter, self.tasks_pool)
+        self.SearchTasks(job.filter)
+
+    def SearchTasks(self, filter: TaskFilter) -> None:
+        """Shows the tasks matching `filter` in both lists; see FilterTasks."""
+        if filter.ranked:
+            self.RankTasks(filter)
+            return
+        job = SearchJob(filter)
+        # Active tasks go first: that's what the user is looking at
+        for grid in (self.grid_tasks, self.grid_done):
+            table = grid.GetTable()
+            assert isinstance(table, TaskListTable)
+            # Cached or narrow enough searches are done right here
+            positions = table.PlanSearch(filter)
+            if positions is None or len(positions) <= self.SYNC_SEARCH_LIMIT:
+                grid.Filter(filter)
+                continue
+            snapshot = table.GetSnapshot()
+            matched: List[int] = []
+            self.search_job = job
+            self.search_executor.submit(run_search, job, snapshot, positions,
+                lambda chunk, upto, done, table=table, snapshot=snapshot, matched=matched:
+                    wx.CallAfter(self.OnSearchResults, job, table, snapshot, matched, chunk, upto, done))
+
+    def RankTasks(self, filter: TaskFilter) -> None:
+        """
+        Starts a ranked search (see TaskFilter.ranked) over both lists on the
+        search thread; OnRankedResults shows the results.  The index has
+        already narrowed it down to the tasks having similar words.
+        """
+        job = self.search_job = SearchJob(filter)
+        snapshots = []
+        for grid in (self.grid_tasks, self.grid_done):
+            table = grid.GetTable()
+            assert isinstance(table, TaskListTable)
+            snapshots.append(table.GetSnapshot())
+        self.search_executor.submit(run_ranked_search, job, snapshots, self.RANKED_SEARCH_LIMIT,
+            lambda rankings: wx.CallAfter(self.OnRankedResults, job, snapshots, rankings))
+
+    def OnRankedResults(self, job: SearchJob, snapshots: List[List[Optional[SearchEntry]]],
+        rankings: List[List[Tuple[float, int]]]) -> None:
+        """
+        Shows the best matches of a ranked search in each list, and puts the
+        cursor on the best of them.  The lists keep their own order though:
+        in the active list, that's the priority, and the tasks can still be
+        dragged around as usual.
+        """
+        if job is not self.search_job or job.cancelled:
+            return
+        self.search_job = None
+        grids = (self.grid_tasks, self.grid_done)
+        tables = []
+        for grid in grids:
+            table = grid.GetTable()
+            assert isinstance(table, TaskListTable)
+            tables.append(table)
+        if not all(table.IsSnapshotCurrent(snapshot) for (table, snapshot) in zip(tables, snapshots)):
+            # Same as in OnSearchResults
+            wx.CallAfter(self.FilterTasks, self.edit_search.Value)
+            return
+        # The rest of the tasks are left out
+        filter = job.filter
+        filter.candidates = set(snapshot[pos][0] for (snapshot, ranked) in zip(snapshots, rankings)    # type: ignore[index]
+            for (_, pos) in ranked)
+        for grid in grids:
+            grid.Filter(filter)
+        # Active tasks win a tie
+        (grid, table, ranked) = max(zip(grids, tables, rankings), key=lambda r: r[2][0][0] if r[2] else 0.0)
+        if ranked:
+            row = table.FindItem(table.task_list[ranked[0][1]])    # type: ignore[arg-type]
+            if row >= 0:
+                grid.SetGridCursor(row, 1)
+
+    def OnSearchResults(self, job: SearchJob, table: TaskListTable, snapshot: List[Optional[SearchEntry]],
+        matched: List[int], chunk: List[int], upto: int, done: bool) -> None:
+        """Shows a chunk of results of a background search started by FilterTasks."""
+        if job is not self.search_job or job.cancelled:
+            return
+        if not table.IsSnapshotCurrent(snapshot):
+            # The list has been changed (or a task edited) while we were
+            # searching; the results may be wrong, so let's start over.
+            self.CancelSearch()
+            wx.CallAfter(self.FilterTasks, self.edit_search.Value)
+            return
+        matched.extend(chunk)
+        table.ShowMatches(job.filter, snapshot, matched, upto, done)
+
+    def CancelSearch(self) -> None:
+        if self.search_job is not None:
+            self.search_job.cancel()
+            self.search_job = None
 
     def OnEditSearchCancel(self, event: wx.Event) -> None:
         self.FilterTasks("")
@@ -907,39 +1439,82 @@ class AppWindow(AppWindowBase):
 
         event.Skip()
 
-    # TODO: we probably need some options, e.g. separate tasks by empty lines
-    # (i.e. sequential non-empty lines go to the description of the same task)
-    def ImportPlainText(self, text: str) -> None:
-        self.HandleBoardChange()
-        new_tasks = [ Task(summary=line.strip()) for line in text.splitlines() if len(line.strip()) > 0 ]
-        
-        base_id = int(time.time() * 100)
-        for task in new_tasks:
-            # Overriding the default task ID, because it's not guaranteed to be
-            # unique for tasks series created too fast.
-            task.set_numeric_id(base_id)
-            # We don't want a clash with other default IDs, so let's add a prefix
-            task.id = "imp-" + task.id
-            base_id -= 1
-            self.tasks_pool[task.id] = task
+    def ImportPlainText(self, text: str, paragraphs: bool = False) -> None:
+        importer = PlainTextImporter(self.tasks_pool, paragraphs)
+        new_tasks = importer.feed(text) + importer.finish()
+        self.AddImportedTasks(0, new_tasks)
+        self.FinishImport(len(new_tasks))
 
-        self.grid_tasks.Table.InsertItems(0, new_tasks)
-        self.grid_tasks.AutoSizeRows()
+    def AddImportedTasks(self, pos: int, tasks: Sequence[Task]) -> None:
+        """Adds a batch of imported tasks to the pool and to grid_tasks at `pos`."""
+        if not tasks:
+            return
+        for task in tasks:
+            self.tasks_pool[task.id] = task
+            self.task_index.add(task)
+        table = self.grid_tasks.GetTable()
+        assert isinstance(table, TaskListTable)
+        # Unlike InsertItems, this only notifies the grid once, and only sizes
+        # the new rows.
+        table.ReplaceItems(pos, pos, tasks)
+
+    def FinishImport(self, count: int) -> None:
+        if count == 0:
+            return
+        self.HandleBoardChange()
         self.grid_tasks.SetGridCursor(0, 1)
-        self.grid_tasks.SelectBlock(0, 0, len(new_tasks) - 1, 1)
-
+        self.grid_tasks.SelectBlock(0, 0, count - 1, 1)
 
     def ImportPlainTextFile(self) -> None:
-        with wx.FileDialog(self, "Import tasks", wildcard="Text files (*.txt)|*.txt|All files (*.*)|*.*",
-                       style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as fileDialog:
+        with wx.FileDialog(self, "Import tasks",
+            wildcard="Text files, one task per line (*.txt)|*.txt|"
+                "Text files, tasks separated by blank lines (*.txt)|*.txt|All files (*.*)|*.*",
+            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as fileDialog:
+
             assert fileDialog is not None   # not clear why mypy thinks it can be None here
             if fileDialog.ShowModal() != wx.ID_CANCEL:
-                try:
-                    with open(fileDialog.GetPath(), "r") as f:
-                        self.ImportPlainText(f.read())
-                except IOError:
-                    # TODO: show an error message
-                    pass
+                # With blank lines separating tasks, the lines that follow
+                # the first one go to the description.
+                self.ImportPlainTextStream(fileDialog.GetPath(), fileDialog.GetFilterIndex() == 1)
+
+    def ImportPlainTextStream(self, path: str, paragraphs: bool) -> None:
+        """
+        Imports a text file of any size a chunk at a time, adding the tasks to
+        the top of grid_tasks batch by batch.  Shows the progress, and removes
+        the imported tasks if the user cancels the import.
+        """
+        count = 0
+        cancelled = False
+        progress = wx.ProgressDialog("Import tasks", "Importing tasks...", 1000, self,
+            wx.PD_APP_MODAL | wx.PD_CAN_ABORT | wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME)
+        try:
+            with open(path, "rb") as f:
+                for (tasks, done) in import_plain_text_file(f, self.tasks_pool, paragraphs):
+                    # The file order is kept: each batch goes below the previous one
+                    self.AddImportedTasks(count, tasks)
+                    count += len(tasks)
+                    keep_going, _ = progress.Update(int(done * 1000), f"{count} tasks imported")
+                    if not keep_going:
+                        cancelled = True
+                        break
+        except OSError as e:
+            progress.Destroy()
+            wx.MessageBox(f"Could not import the tasks:\n{e}", "WhaddaDoo", wx.OK | wx.ICON_ERROR, self)
+            # Whatever has been imported so far stays
+            self.FinishImport(count)
+            return
+        progress.Destroy()
+
+        if cancelled:
+            table = self.grid_tasks.GetTable()
+            assert isinstance(table, TaskListTable)
+            for task in table.GetList()[:count]:
+                if task is not None:
+                    del self.tasks_pool[task.id]
+                    self.task_index.remove(task.id)
+            table.ReplaceItems(0, count, [])
+            return
+        self.FinishImport(count)
 
     def HandleBoardChange(self, really_modified: bool = True) -> None:
         """
@@ -947,10 +1522,124 @@ class AppWindow(AppWindowBase):
         the 'dirty' flag is triggered, and the auto-save timer is started.
         If `really_modified` is False, does nothing - this can be used in places
         where the caller needs to compare new contents against the old one.
+
+        The tasks themselves keep track of whether they have been modified
+        (see `Task.dirty`), so that the save only writes those tasks.
         """
         if really_modified:
             self.board_modified = True
+            self.board_version += 1
             self.autosave_timer.StartOnce(self.AUTOSAVE_DELAY * 1000)
+            if not self.log_timer.IsRunning():
+                self.log_timer.StartOnce(self.LOG_DELAY)
+
+    def OnLogTimer(self, event: wx.Event) -> None:
+        self.SaveBoard(log_only=True)
+        event.Skip()
+
+    def OnWatchTimer(self, event: wx.Event) -> None:
+        board = self.current_board
+        if board is not None and board.watcher is not None and board.watcher.check():
+            self.ReloadExternalChanges()
+        event.Skip()
+
+    def ReloadExternalChanges(self) -> None:
+        """
+        Starts reading the board files that have been changed outside of the
+        app.  They're read on the save thread, after our own saves, so that
+        the tasks we've already saved don't look like conflicts; the changes
+        are applied by OnExternalChangesLoaded().
+        """
+        board = self.current_board
+        assert board is not None
+        if board.reloading is not None:
+            return
+        storage = board.storage
+        # Tasks that merge_external_changes() would remove if they're gone
+        # from the active ones on disk
+        active_ids = [ k for (k, task) in board.tasks_pool.items() if task.status == TaskStatus.ACTIVE and not task.dirty ]
+
+        def load() -> Tuple[List[str], Tuple[Dict[str, Epic], Dict[str, Task], List[str]], Dict[str, Task]]:
+            base_order = list(storage.saved_order)
+            board_data = storage.load()
+            closed_pool = storage.find_completed(k for k in active_ids if k not in board_data[1])
+            return base_order, board_data, closed_pool
+
+        future = board.reloading = self.save_executor.submit(load)
+        future.add_done_callback(lambda f: wx.CallAfter(self.OnExternalChangesLoaded, board, f))
+
+    def OnExternalChangesLoaded(self, board: BoardTab,
+        future: "Future[Tuple[List[str], Tuple[Dict[str, Epic], Dict[str, Task], List[str]], Dict[str, Task]]]") -> None:
+        """
+        Applies the changes read by ReloadExternalChanges(), updating only
+        the tasks (and grid rows) that have actually changed.  See
+        merge_external_changes() for how conflicts are handled.
+        """
+        # The board might have been unloaded or closed in the meantime
+        if board.reloading is not future:
+            return
+        board.reloading = None
+        if future.exception() is not None:
+            # Most likely a half-written file; let's look again on the next
+            # check of the watcher
+            if board.watcher is not None:
+                board.watcher.pending = True
+            return
+        base_order, (_, disk_pool, disk_order), closed_pool = future.result()
+
+        if board is not self.current_board:
+            # The board has been switched away from; the widgets will be
+            # filled from its pool when it's shown again
+            result = merge_external_changes(board.tasks_pool, board.epics_pool, board.active_ids, base_order,
+                disk_pool, disk_order, self.CONFLICT_POLICY, closed_pool)
+            for task in result.added:
+                board.task_index.add(task)
+            for task in result.removed:
+                board.task_index.remove(task.id)
+            board.storage.epics_pool = board.epics_pool
+            board.active_ids = result.order
+            return
+
+        local_order = [ task.id for task in self.grid_tasks.GetTable().GetList() if task ]
+        result = merge_external_changes(self.tasks_pool, self.epics_pool, local_order, base_order,
+            disk_pool, disk_order, self.CONFLICT_POLICY, closed_pool)
+        for task in result.added:
+            self.task_index.add(task)
+        for task in result.removed:
+            self.task_index.remove(task.id)
+        # The storage has just read its own copy of the epics, but we want it
+        # to keep using ours.
+        self.storage.epics_pool = self.epics_pool
+
+        self.grid_tasks.GetTable().SyncList([ self.tasks_pool[k] for k in result.order ])
+        changed = set(result.added + result.updated)
+        done_table = self.grid_done.GetTable()
+        completed = [ task for task in done_table.GetList()
+            if task and task.id in self.tasks_pool and task.status != TaskStatus.ACTIVE ]
+        listed = set(task.id for task in completed)
+        new_completed = [ task for task in changed if task.status != TaskStatus.ACTIVE and task.id not in listed ]
+        new_completed.sort(key=lambda task: task.close_date or task.creation_date, reverse=True)
+        done_table.SyncList(new_completed + completed)
+
+        for grid in (self.grid_tasks, self.grid_done):
+            for task in result.updated:
+                row = grid.GetTable().FindItem(task)
+                if row >= 0:
+                    grid.AutoSizeRow(row)
+            grid.ForceRefresh()
+
+        # Unless the user is editing the description right now, the right
+        # pane must show the new version of the task.
+        if self.selected_task in changed and not self.panel_desc_buttons.Shown:
+            self.LoadTaskDetails()
+
+        if result.conflicts:
+            kept = "Their version has been kept." if self.CONFLICT_POLICY == ConflictPolicy.KEEP_THEIRS \
+                else "Your version has been kept."
+            wx.MessageBox(f"{len(result.conflicts)} task(s) have been modified both here and outside of WhaddaDoo.\n"
+                + kept, "WhaddaDoo", wx.OK | wx.ICON_WARNING, self)
+        if any(task.dirty for task in self.tasks_pool.values()) or result.order != list(disk_order):
+            self.HandleBoardChange()
 
     def OnAutosaveTimer(self, event: wx.Event) -> None:
         self.SaveBoard()
@@ -958,6 +1647,8 @@ class AppWindow(AppWindowBase):
 
     def OnGridDropItems(self, event: wx.Event) -> None:
         print("Drop event")
+        assert isinstance(event, TaskListDropEvent)   # for mypy
+        # Dropping into another list changes the status of the tasks
         self.HandleBoardChange()
         event.Skip()
 
@@ -966,23 +1657,16 @@ class MyApp(wx.App):
     frame: AppWindow
 
     def OnInit(self) -> bool:
-        yaml.add_representer(Task, Task.yaml_representer)
-        yaml.add_representer(TaskStatus, TaskStatus.yaml_representer)
-        yaml.add_representer(TaskComment, TaskComment.yaml_representer)
-        yaml.add_representer(datetime, self.yaml_date_representer)
-
-        self.frame = AppWindow(None, wx.ID_ANY, "")
+        with startup_profile.phase("AppWindow"):
+            self.frame = AppWindow(None, wx.ID_ANY, "")
         self.SetTopWindow(self.frame)
 
-        self.frame.Show()
+        with startup_profile.phase("Show"):
+            self.frame.Show()
         return True
 
-    @staticmethod
-    def yaml_date_representer(dumper: Dumper, data: datetime) -> Node:
-        value = data.isoformat(" ", "seconds")
-        return dumper.represent_scalar('tag:yaml.org,2002:timestamp', value)
-
 
 if __name__ == "__main__":
-    app = MyApp(0)
+    with startup_profile.phase("wx.App"):
+        app = MyApp(0)
     app.MainLoop()
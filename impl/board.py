@@ -0,0 +1,1167 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import date, datetime
+import importlib
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Container, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Set, Tuple, Type
+
+from impl.task import Epic, Task, TaskComment, TaskFilter, TaskStatus
+from impl.task_index import TaskIndex
+
+# yaml, hashlib, tempfile and pickle are imported by the functions that use
+# them.  Together, they take longer to import than the rest of the storage,
+# which matters for the command line (see impl.cli) and for the first paint of
+# the app, which loads the boards in the background; and a board loaded from
+# its cache doesn't need anything but pickle.
+if TYPE_CHECKING:
+    import yaml
+
+
+_no_alias_dumper: "Optional[Type[yaml.Dumper]]" = None
+
+
+def no_alias_dumper() -> "Type[yaml.Dumper]":
+    """The dumper for everything we write to YAML; built on first use."""
+    import yaml
+    global _no_alias_dumper
+    if _no_alias_dumper is None:
+        class NoAliasDumper(yaml.Dumper):
+            def ignore_aliases(self, data: Any) -> bool:
+                return True
+
+            @staticmethod
+            def date_representer(dumper: yaml.Dumper, data: datetime) -> yaml.Node:
+                value = data.isoformat(" ", "seconds")
+                return dumper.represent_scalar('tag:yaml.org,2002:timestamp', value)
+
+        NoAliasDumper.add_representer(Task, Task.yaml_representer)
+        NoAliasDumper.add_representer(TaskStatus, TaskStatus.yaml_representer)
+        NoAliasDumper.add_representer(TaskComment, TaskComment.yaml_representer)
+        NoAliasDumper.add_representer(datetime, NoAliasDumper.date_representer)
+        _no_alias_dumper = NoAliasDumper
+    return _no_alias_dumper
+
+
+# An edit of the active list: replaces the IDs in old_order[start:end] with
+# the `ids` list.  This is what we store in the journal instead of the entire
+# contents of active.txt.
+OrderEdit = Tuple[int, int, List[str]]
+
+# Size, modification time (in nanoseconds) and SHA-1 of a file, or None if
+# the file does not exist.
+FileKey = Optional[Tuple[int, int, str]]
+
+# Task IDs are the only top-level keys in a shard; PyYAML quotes them if they
+# look like numbers.
+_SHARD_KEY = re.compile(rb"^'?([\w-]+)'?:", re.MULTILINE)
+
+
+def replace_file(old_name: str, new_name: str) -> None:
+    try:
+        os.remove(old_name)
+    except FileNotFoundError:
+        # It's okay, we've just created a new file, no old version here
+        pass
+    os.rename(new_name, old_name)
+
+
+def write_temp_file(dir_name: str, data: bytes, prefix: str, suffix: str) -> str:
+    """
+    Writes `data` to a new temporary file in `dir_name`, and returns the name
+    of that file, to be renamed over the old version with replace_file().
+    """
+    import tempfile
+    os.makedirs(dir_name, exist_ok=True)
+    with tempfile.NamedTemporaryFile(mode="wb", dir=dir_name, delete=False,
+        prefix=prefix, suffix=suffix) as f:
+
+        f.write(data)
+        # Making sure the data is on the disk before we rename the file
+        # over the old one; otherwise a power loss might leave us with
+        # neither the old nor the new contents.
+        f.flush()
+        os.fsync(f.fileno())
+        return f.name
+
+
+def sync_dir(dir_name: str) -> None:
+    """
+    Flushes the directory entries of `dir_name` to disk, so that the files
+    created or renamed there survive a power loss.  Does nothing on platforms
+    that can't open a directory (i.e. Windows, where this isn't needed).
+    """
+    try:
+        fd = os.open(dir_name, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def is_board_dir(dir_name: str) -> bool:
+    """Checks whether `dir_name` contains a board in any of the supported layouts."""
+    return os.path.isfile(os.path.join(dir_name, BoardStorage.TASKS_FILE)) or \
+        os.path.isfile(os.path.join(dir_name, "board.sqlite")) or \
+        os.path.isdir(os.path.join(dir_name, "tasks"))
+
+
+def open_board_storage(dir_name: str) -> "BoardStorage":
+    """Returns the storage object suitable for the board layout found in `dir_name`."""
+    # Imported here to avoid a circular import, and only if needed (sqlite3
+    # takes a while to import)
+    if os.path.isfile(os.path.join(dir_name, "board.sqlite")):
+        from impl.sqlite_board import SqliteBoardStorage
+        return SqliteBoardStorage(dir_name)
+    if os.path.isdir(os.path.join(dir_name, "tasks")):
+        from impl.sharded_board import ShardedBoardStorage
+        return ShardedBoardStorage(dir_name)
+    return BoardStorage(dir_name)
+
+
+def diff_order(old: Sequence[str], new: Sequence[str]) -> List[OrderEdit]:
+    """
+    Compares two lists of task IDs and returns a list of edits that turn
+    `old` into `new`.  The edits refer to positions in `old`, and must be
+    applied in reverse order (see `apply_order_edits`).
+    """
+    # Typically the user moves or inserts just a couple of tasks, so trimming
+    # the common head and tail leaves SequenceMatcher very little to work on.
+    head = 0
+    max_head = min(len(old), len(new))
+    while head < max_head and old[head] == new[head]:
+        head += 1
+    tail = 0
+    max_tail = max_head - head
+    while tail < max_tail and old[-tail - 1] == new[-tail - 1]:
+        tail += 1
+
+    old_mid = old[head : len(old) - tail]
+    new_mid = new[head : len(new) - tail]
+    # Imported here since it's only needed on save, and takes a while to import
+    from difflib import SequenceMatcher
+    matcher = SequenceMatcher(None, old_mid, new_mid, autojunk=False)
+    return [
+        (head + i1, head + i2, list(new_mid[j1:j2]))
+        for (tag, i1, i2, j1, j2) in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def order_edits_fit(order: Sequence[str], edits: Sequence[OrderEdit]) -> bool:
+    """
+    Tells whether `edits` can be applied to `order`: the edits produced by
+    `diff_order` go in ascending order, don't overlap, and stay within the
+    list they have been computed for.
+    """
+    pos = 0
+    for (start, end, _) in edits:
+        if not pos <= start <= end <= len(order):
+            return False
+        pos = end
+    return True
+
+
+def apply_order_edits(order: List[str], edits: Sequence[OrderEdit]) -> None:
+    """Applies the edits produced by `diff_order` to `order`, in place."""
+    # Going backwards so that positions of the remaining edits stay valid
+    for start, end, ids in reversed(edits):
+        order[start:end] = ids
+
+
+class BoardStorage:
+    """
+    Reads and writes a board stored as a directory with the following files:
+
+    - epics.yaml - the epics (read-only as of now);
+    - tasks.yaml - the active tasks, keyed by task ID;
+    - active.txt - IDs of the active tasks, in the order of priority;
+    - done/YYYY-MM.yaml - the completed tasks, sharded by the month they were
+      closed in.  These are only read when the user actually needs completed
+      tasks (see `load_completed`);
+    - journal.yaml - the changes made since tasks.yaml and active.txt were
+      last written;
+    - board.cache - the contents of the YAML files above (except for the
+      journal) in a binary form that loads much faster than YAML.  It's only
+      used while it's known to match the YAML files, and can be safely deleted;
+    - done/archive/YYYY-MM.yaml.xz - old shards of completed tasks, compressed
+      and never rewritten (see `archive_completed`), along with
+      done/archive/YYYY-MM.ids listing the task IDs in each of them.
+
+    Most saves only append the tasks that have changed (and the edits to the
+    active list) to the journal, which makes it a write-ahead log: the app
+    calls `log_changes` a moment after every edit, and each call costs a
+    single fsync no matter how many tasks it writes.  Once the journal grows past
+    `JOURNAL_LIMIT`, it gets folded into a new snapshot, i.e. tasks.yaml and
+    active.txt are rewritten entirely, and the journal is started anew.
+    The shards are rewritten at the same time, but only those that have
+    changed.
+
+    The task pool may contain just a part of the completed tasks.  Whatever is
+    in the pool is always considered newer than the copies in the shards, and
+    the shards are newer than the archive.  This is how a task gets out of the
+    archive: once it's been modified (e.g. reopened), its new copy is stored
+    in the regular files, and the copy in the archive is ignored from then on.
+
+    The storage can be used from a background thread (e.g. to save the board),
+    with all the public methods serialized by `lock`.  The pool passed to
+    the writing methods must not be modified while they are running; see
+    `snapshot_pool`.
+    """
+
+    dir_name: str
+    # IDs of the active tasks in the order they are stored on disk (that is,
+    # in active.txt with the journal applied on top of it).
+    saved_order: List[str]
+    # Identifies the tasks.yaml + active.txt pair the journal is based on.
+    # None means there's no snapshot on disk yet.
+    snapshot_hash: Optional[str] = None
+    # Whether journal.yaml exists and belongs to the current snapshot; if not,
+    # it must be restarted before appending anything.
+    journal_valid: bool = False
+    journal_size: int = 0
+    # The part of a damaged journal that has been replayed (including the
+    # header), carried over to the journal when it's restarted; otherwise the
+    # changes it holds would be lost on disk.
+    journal_prefix: Optional[bytes] = None
+    # Epics are kept here to write the cache, and to save those that have
+    # been modified (see Epic.dirty)
+    epics_pool: Dict[str, Epic]
+    completed_loaded: bool = False
+    # The shard each completed task has been loaded from
+    shard_of: Dict[str, str]
+    # Shards holding outdated copies of tasks, to be cleaned up on the next
+    # snapshot
+    stale_shards: Set[str]
+    # IDs stored in each shard, so that we can count completed tasks without
+    # loading them
+    shard_ids: Dict[str, Set[str]]
+    # IDs of the tasks written to the journal since the last snapshot
+    journaled_ids: Set[str]
+    # Tasks read from the archive (along with their segment names), so that
+    # the archive is only decompressed once per session; they are not added
+    # to the task pool unless needed.  See read_archived.
+    archived_tasks: Optional[Dict[str, Tuple[Task, str]]] = None
+    # Search index over archived_tasks
+    archived_index: Optional[TaskIndex] = None
+    # Sizes and timestamps of `watched_files` as we've left them
+    known_files: Dict[str, Optional[Tuple[int, int]]]
+    lock: threading.RLock
+
+    # bytes
+    JOURNAL_LIMIT: ClassVar[int] = 1024 * 1024
+    # Must be incremented whenever the pickled classes change incompatibly
+    CACHE_VERSION: ClassVar[int] = 1
+
+    TASKS_FILE: ClassVar[str] = "tasks.yaml"
+    ACTIVE_FILE: ClassVar[str] = "active.txt"
+    EPICS_FILE: ClassVar[str] = "epics.yaml"
+    JOURNAL_FILE: ClassVar[str] = "journal.yaml"
+    # Every journal entry ends with this, so that an entry cut off in the
+    # middle (e.g. by a crash while appending) can be told from a complete one
+    JOURNAL_ENTRY_END: ClassVar[bytes] = b"\n...\n"
+    CACHE_FILE: ClassVar[str] = "board.cache"
+    DONE_DIR: ClassVar[str] = "done"
+    # Relative to DONE_DIR
+    ARCHIVE_DIR: ClassVar[str] = "archive"
+    # Archives are written in this format; all of ARCHIVE_FORMATS can be read.
+    ARCHIVE_SUFFIX: ClassVar[str] = ".yaml.xz"
+    # suffix: the module providing open() and compress(); these are only
+    # imported when the archive is actually used.
+    ARCHIVE_FORMATS: ClassVar[Dict[str, str]] = {
+        ".yaml.xz": "lzma",
+        ".yaml.gz": "gzip",
+    }
+
+    def __init__(self, dir_name: str) -> None:
+        self.dir_name = dir_name
+        self.saved_order = []
+        self.epics_pool = {}
+        self.shard_of = {}
+        self.stale_shards = set()
+        self.shard_ids = {}
+        self.journaled_ids = set()
+        self.known_files = {}
+        self.lock = threading.RLock()
+
+    def path(self, file_name: str) -> str:
+        return os.path.join(self.dir_name, file_name)
+
+    @staticmethod
+    def hash_snapshot(tasks_data: bytes, active_data: bytes) -> str:
+        import hashlib
+        h = hashlib.sha1(tasks_data)
+        h.update(b"\0")
+        h.update(active_data)
+        return h.hexdigest()
+
+    def read_file(self, file_name: str) -> Optional[bytes]:
+        try:
+            with open(self.path(file_name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def file_key(self, file_name: str, data: Optional[bytes]) -> FileKey:
+        """
+        Builds the cache key for a file, given the data just read from it or
+        written to it.
+        """
+        import hashlib
+        if data is None:
+            return None
+        st = os.stat(self.path(file_name))
+        return (st.st_size, st.st_mtime_ns, hashlib.sha1(data).hexdigest())
+
+    def is_file_unchanged(self, file_name: str, key: FileKey) -> bool:
+        try:
+            st = os.stat(self.path(file_name))
+        except FileNotFoundError:
+            return key is None
+        if key is None:
+            return False
+        size, mtime, digest = key
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime:
+            # Same size and same timestamp: we trust it's the same file.  This
+            # is what makes the cache fast, so we don't want to read the file
+            # unless we have to.
+            return True
+        # The file might have been touched or copied without changing its
+        # contents; hashing is still way cheaper than parsing YAML.
+        import hashlib
+        data = self.read_file(file_name)
+        return data is not None and hashlib.sha1(data).hexdigest() == digest
+
+    def load_epics(self, data: Optional[bytes]) -> Dict[str, Epic]:
+        import yaml
+        epics_pool: Dict[str, Epic] = {}
+        if data is not None:
+            obj_pool = yaml.load(data.decode('utf8'), Loader=yaml.SafeLoader)
+            # TODO: verify that obj_pool is a dict
+            for (k, v) in obj_pool.items():
+                epics_pool[k] = Epic.from_plain_object(k, v)
+        # We don't care if there are no epics
+        # TODO: handle key lookup exceptions that Epic.from_plain_object might
+        # throw (or add another exception to from_plain_object that would better
+        # describe the error).
+        return epics_pool
+
+    def load(self) -> Tuple[Dict[str, Epic], Dict[str, Task], List[str]]:
+        """
+        Reads the board from disk, replaying the journal on top of the
+        snapshot.  Returns the epic pool, the task pool, and the IDs of the
+        active tasks in the order of priority.
+        """
+        with self.lock:
+            snapshot = self.load_cache()
+            if snapshot is None:
+                snapshot = self.load_yaml()
+            epics_pool, tasks_pool, order = snapshot
+            self.epics_pool = epics_pool
+
+            self.journaled_ids = set()
+            self.replay_journal(tasks_pool, epics_pool, order)
+            self.saved_order = list(order)
+            self.remember_files()
+
+            return epics_pool, tasks_pool, order
+
+    def watched_files(self) -> List[str]:
+        """Lists the files that someone else might modify behind our back."""
+        return [ self.TASKS_FILE, self.ACTIVE_FILE, self.JOURNAL_FILE ]
+
+    def stat_watched_files(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        for name in self.watched_files():
+            try:
+                st = os.stat(self.path(name))
+                stats[name] = (st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                stats[name] = None
+        return stats
+
+    def remember_files(self) -> None:
+        """Records the state of the watched files after we've read or written them."""
+        self.known_files = self.stat_watched_files()
+
+    def has_external_changes(self, wait: bool = True) -> Optional[bool]:
+        """
+        Tells whether the board files have been modified by someone else since
+        we last read or wrote them.  If `wait` is False and the storage is busy
+        (e.g. a save is being written on another thread), returns None right
+        away instead of waiting for it.
+        """
+        if not self.lock.acquire(blocking=wait):
+            return None
+        try:
+            return self.stat_watched_files() != self.known_files
+        finally:
+            self.lock.release()
+
+    def load_yaml(self) -> Tuple[Dict[str, Epic], Dict[str, Task], List[str]]:
+        import yaml
+        epics_data = self.read_file(self.EPICS_FILE)
+        epics_pool = self.load_epics(epics_data)
+
+        # TODO: handle exceptions
+        with open(self.path(self.TASKS_FILE), "rb") as f:
+            tasks_data = f.read()
+        with open(self.path(self.ACTIVE_FILE), "rb") as f:
+            active_data = f.read()
+        self.snapshot_hash = self.hash_snapshot(tasks_data, active_data)
+
+        tasks_pool: Dict[str, Task] = {}
+        # Since we don't save object tags in save_snapshot(), it's ok to use
+        # the SafeLoader here - YAML won't be able to deduce class names
+        # anyway.
+        obj_pool = yaml.load(tasks_data.decode('utf8'), Loader=yaml.SafeLoader)
+        # TODO: verify that obj_pool is a dict
+        for (k, v) in obj_pool.items():
+            tasks_pool[k] = Task.from_plain_object(k, v, epics_pool)
+
+        order = [ line.strip() for line in active_data.decode('utf8').splitlines() ]
+        order = [ task_id for task_id in order if task_id ]
+
+        # The journal hasn't been applied yet, so that's exactly what the
+        # YAML files contain.
+        self.write_cache(epics_pool, tasks_pool, order, epics_data, tasks_data, active_data)
+
+        return epics_pool, tasks_pool, order
+
+    def load_cache(self) -> Optional[Tuple[Dict[str, Epic], Dict[str, Task], List[str]]]:
+        """
+        Reads the snapshot from board.cache if the cache is up to date.
+        Returns None if it's missing, stale or broken.
+        """
+        import pickle
+        try:
+            with open(self.path(self.CACHE_FILE), "rb") as f:
+                # The header is pickled separately so that we don't have to
+                # unpickle the entire board to find out it's stale.
+                # Note: pickle is only safe for data we've written ourselves,
+                # which is the case here (just like with drag'n'drop).
+                header = pickle.load(f)
+                if not isinstance(header, dict) or header.get("version") != self.CACHE_VERSION:
+                    return None
+                keys = header["keys"]
+                if not all(self.is_file_unchanged(name, keys.get(name))
+                    for name in (self.EPICS_FILE, self.TASKS_FILE, self.ACTIVE_FILE)):
+                    return None
+
+                epics_pool, tasks_pool, order = pickle.load(f)
+                self.snapshot_hash = header["snapshot_hash"]
+                return epics_pool, tasks_pool, order
+
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError, ValueError):
+            # The cache is just an optimization; if it's broken, we'll simply
+            # rebuild it from YAML.
+            return None
+
+    def write_cache(self, epics_pool: Dict[str, Epic], tasks_pool: Dict[str, Task], order: List[str],
+        epics_data: Optional[bytes], tasks_data: bytes, active_data: bytes) -> None:
+
+        import pickle
+        import tempfile
+        try:
+            header = {
+                "version": self.CACHE_VERSION,
+                "snapshot_hash": self.snapshot_hash,
+                "keys": {
+                    self.EPICS_FILE: self.file_key(self.EPICS_FILE, epics_data),
+                    self.TASKS_FILE: self.file_key(self.TASKS_FILE, tasks_data),
+                    self.ACTIVE_FILE: self.file_key(self.ACTIVE_FILE, active_data),
+                },
+            }
+            with tempfile.NamedTemporaryFile(mode="wb", dir=self.dir_name, delete=False,
+                prefix="board.", suffix=".cache") as f:
+
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump((epics_pool, tasks_pool, order), f, pickle.HIGHEST_PROTOCOL)
+                cache_file_name = f.name
+            replace_file(self.path(self.CACHE_FILE), cache_file_name)
+        except OSError:
+            # Not a big deal, we'll just have to parse YAML next time
+            pass
+
+    @staticmethod
+    def is_journal_entry(entry: Any) -> bool:
+        """Checks the structure of a journal entry (other than the header) before it's applied."""
+        if not isinstance(entry, dict):
+            return False
+        if entry.get("op") == "put":
+            return isinstance(entry.get("id"), str) and isinstance(entry.get("task"), dict)
+        if entry.get("op") == "order":
+            edits = entry.get("edits")
+            return isinstance(edits, list) and all(
+                isinstance(edit, list) and len(edit) == 3 and isinstance(edit[0], int) and isinstance(edit[1], int)
+                    and isinstance(edit[2], list) and all(isinstance(task_id, str) for task_id in edit[2])
+                for edit in edits)
+        return False
+
+    def replay_journal(self, tasks_pool: Dict[str, Task], epics_pool: Dict[str, Epic], order: List[str]) -> None:
+        """
+        Applies the journal on top of the snapshot, entry by entry, stopping
+        at the first entry that is incomplete or broken.  Most likely we were
+        interrupted while appending to the journal; whatever has been applied
+        before the broken entry is still valid.  We have to restart the
+        journal though, because appending after the garbage would make the new
+        entries unreadable (see `journal_prefix`).
+        """
+        self.journal_valid = False
+        self.journal_size = 0
+        self.journal_prefix = None
+        data = self.read_file(self.JOURNAL_FILE)
+        if data is None:
+            return
+        import yaml
+        pos = 0
+        while pos < len(data):
+            end = data.find(self.JOURNAL_ENTRY_END, pos)
+            if end < 0:
+                # Cut off before the end
+                break
+            end += len(self.JOURNAL_ENTRY_END)
+            try:
+                entry = yaml.load(data[pos:end].decode('utf8'), Loader=yaml.SafeLoader)
+            except (yaml.YAMLError, UnicodeDecodeError):
+                break
+            if pos == 0:
+                # The journal must start with a header referring to the
+                # snapshot it was written against.  If it doesn't match, the
+                # snapshot was rewritten after the journal (e.g. we crashed
+                # right after folding the journal in), and the journal is
+                # stale.
+                if not isinstance(entry, dict) or entry.get("op") != "base" \
+                    or entry.get("hash") != self.snapshot_hash:
+                    return
+                self.journal_valid = True
+            else:
+                if not self.is_journal_entry(entry):
+                    break
+                try:
+                    if entry["op"] == "put":
+                        task_id = entry["id"]
+                        tasks_pool[task_id] = Task.from_plain_object(task_id, entry["task"], epics_pool)
+                        self.journaled_ids.add(task_id)
+                    else:
+                        # Positions that don't fit mean the journal doesn't
+                        # belong to this order after all
+                        if not order_edits_fit(order, entry["edits"]):
+                            break
+                        apply_order_edits(order, entry["edits"])
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    break
+            pos = end
+
+        if pos < len(data):
+            if self.journal_valid:
+                self.journal_prefix = data[:pos]
+            self.journal_valid = False
+            return
+        self.journal_size = len(data)
+
+    def needs_snapshot(self) -> bool:
+        """
+        Tells whether the next save must write a full snapshot.  It's called
+        on the UI thread, and doesn't take the lock: a save in progress would
+        hold it for as long as it writes.  Reading the attributes is safe
+        anyway; at worst, we see them as they were before that save.
+        """
+        return self.snapshot_hash is None or self.journal_size > self.JOURNAL_LIMIT
+
+    def snapshot_pool(self, tasks_pool: Dict[str, Task], changed_ids: Iterable[str], full: bool) -> Dict[str, Task]:
+        """
+        Makes a copy of the part of `tasks_pool` that is needed to save the
+        changes (or the full snapshot, if `full` is True).  The copy can be
+        written on another thread while the original tasks are being edited.
+        """
+        if full:
+            return dict((k, task.snapshot()) for (k, task) in tasks_pool.items())
+        return dict((k, tasks_pool[k].snapshot()) for k in changed_ids if k in tasks_pool)
+
+    def save(self, tasks_pool: Dict[str, Task], order: Sequence[str], changed_ids: Iterable[str]) -> None:
+        """
+        Saves the changes made to the board since the last load or save.
+        `changed_ids` must list every task that has been added or modified
+        since then; `order` (the IDs of active tasks) is compared against the
+        one on disk.
+        """
+        self.write_changes(tasks_pool, order, changed_ids, self.needs_snapshot())
+
+    def write_changes(self, tasks_pool: Dict[str, Task], order: Sequence[str], changed_ids: Iterable[str],
+        full: bool) -> None:
+        """
+        Same as `save`, but the caller decides whether to write a full
+        snapshot or to append the changes to the journal.  This is what the
+        background save uses, because the pool it passes depends on that
+        decision.
+        """
+        with self.lock:
+            if full:
+                self.save_snapshot(tasks_pool, order, changed_ids)
+            else:
+                self.append_changes(tasks_pool, order, changed_ids)
+
+            dirty_epics = [ (epic, epic.version) for epic in self.epics_pool.values() if epic.dirty ]
+            if dirty_epics:
+                self.save_epics()
+                for (epic, version) in dirty_epics:
+                    epic.saved_version = version
+            self.remember_files()
+
+    def log_changes(self, tasks_pool: Dict[str, Task], order: Sequence[str], changed_ids: Iterable[str]) -> None:
+        """
+        Makes the latest edits durable as cheaply as possible, without ever
+        writing a full snapshot: in this layout, that's one append to the
+        journal.  The journal is replayed by `load`, so the edits survive a
+        crash even if the board is never saved properly.  The caller is
+        expected to batch the edits (group commit) rather than call this on
+        every keystroke.
+        """
+        self.write_changes(tasks_pool, order, changed_ids, False)
+
+    def append_changes(self, tasks_pool: Dict[str, Task], order: Sequence[str], changed_ids: Iterable[str]) -> None:
+        order = list(order)
+        entries: List[Dict[str, Any]] = [
+            { "op": "put", "id": task_id, "task": tasks_pool[task_id] }
+            for task_id in sorted(set(changed_ids)) if task_id in tasks_pool
+        ]
+        if order != self.saved_order:
+            # Tuples would get a Python-specific tag in YAML; lists are safe
+            edits = [ list(edit) for edit in diff_order(self.saved_order, order) ]
+            entries.append({ "op": "order", "edits": edits })
+
+        if entries:
+            self.append_journal(entries)
+        self.journaled_ids.update(entry["id"] for entry in entries if entry["op"] == "put")
+        self.saved_order = order
+
+    def append_journal(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Writes `entries` to the journal, and returns once they're on disk.
+        The data is always fsynced before anything else, and a journal file
+        that has just been created (or replaced) also has its directory
+        synced afterwards: until the directory entry is on disk, a power loss
+        can lose the whole file.  An append to an existing journal only needs
+        the first fsync.
+        """
+        import yaml
+        # Entries are appended in binary, so that the line breaks (and hence
+        # JOURNAL_ENTRY_END) are the same on every platform
+        data = yaml.dump_all(entries, explicit_start=True, explicit_end=True, default_flow_style=False,
+            allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+        if self.journal_valid:
+            with open(self.path(self.JOURNAL_FILE), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        elif self.journal_prefix is not None:
+            # The damaged journal is replaced with its good part followed by
+            # the new entries, in one go
+            data = self.journal_prefix + data
+            replace_file(self.path(self.JOURNAL_FILE), self.write_temp_file(data, "journal.", ".yaml"))
+            sync_dir(self.dir_name)
+        else:
+            header = yaml.dump({ "op": "base", "hash": self.snapshot_hash }, explicit_start=True, explicit_end=True,
+                default_flow_style=False, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+            # A stale journal is overwritten in place; its directory entry is
+            # already there
+            created = not os.path.exists(self.path(self.JOURNAL_FILE))
+            with open(self.path(self.JOURNAL_FILE), "wb") as f:
+                f.write(header + data)
+                f.flush()
+                os.fsync(f.fileno())
+            if created:
+                sync_dir(self.dir_name)
+        self.journal_valid = True
+        self.journal_prefix = None
+        self.journal_size = os.path.getsize(self.path(self.JOURNAL_FILE))
+
+    def save_epics(self) -> None:
+        """
+        Rewrites epics.yaml, e.g. when converting a board from another layout
+        or when an epic has been modified.
+        """
+        import yaml
+        obj_pool = dict((epic.id, { "name": epic.name }) for epic in self.epics_pool.values())
+        epics_data = yaml.dump(obj_pool, default_flow_style=False,
+            allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+        replace_file(self.path(self.EPICS_FILE), self.write_temp_file(epics_data, "epics.", ".yaml"))
+
+    def prefilter(self, filter: TaskFilter, unsaved_ids: Iterable[str] = ()) -> None:
+        """
+        Gives the storage a chance to narrow down the set of tasks `filter`
+        needs to check (see `TaskFilter.candidates`).  The YAML layout has
+        nothing to offer here.
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+    @staticmethod
+    def shard_name(task: Task) -> str:
+        dt = task.close_date if task.close_date is not None else task.creation_date
+        return dt.strftime("%Y-%m")
+
+    def list_shards(self) -> List[str]:
+        """Returns the names of all shards, newest first."""
+        try:
+            names = os.listdir(self.path(self.DONE_DIR))
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith(".yaml")), reverse=True)
+
+    def read_shard(self, shard: str) -> Dict[str, Any]:
+        """Reads a shard as plain objects, without building Task objects."""
+        import yaml
+        try:
+            with open(os.path.join(self.path(self.DONE_DIR), shard + ".yaml"), "r", encoding='utf8') as f:
+                obj_pool = yaml.load(f, Loader=yaml.SafeLoader)
+        except FileNotFoundError:
+            return {}
+        # TODO: verify that obj_pool is a dict
+        return obj_pool if obj_pool is not None else {}
+
+    def read_shard_ids(self, shard: str) -> Set[str]:
+        """Returns the IDs of the tasks stored in a shard, without parsing it."""
+        ids = self.shard_ids.get(shard)
+        if ids is None:
+            data = self.read_file(os.path.join(self.DONE_DIR, shard + ".yaml"))
+            ids = set(m.decode('utf8') for m in _SHARD_KEY.findall(data)) if data is not None else set()
+            self.shard_ids[shard] = ids
+        return ids
+
+    def count_tasks(self, tasks_pool: Dict[str, Task]) -> Tuple[int, int]:
+        """
+        Returns the number of active and completed tasks on the board, given
+        its task pool (which may lack the completed tasks that haven't been
+        loaded yet).
+        """
+        with self.lock:
+            active = sum(1 for task in tasks_pool.values() if task.status == TaskStatus.ACTIVE)
+            done = len(tasks_pool) - active
+            stored: Set[str] = set()
+            if not self.completed_loaded:
+                for shard in self.list_shards():
+                    stored.update(self.read_shard_ids(shard))
+            for segment in self.list_archives():
+                stored.update(self.read_archive_ids(segment))
+            done += len(stored.difference(tasks_pool))
+            return active, done
+
+    def load_completed(self, tasks_pool: Dict[str, Task]) -> List[Task]:
+        """
+        Reads all the completed tasks from the shards, and adds them to
+        `tasks_pool` (unless the pool already has a newer copy).  Returns the
+        newly added tasks, the most recently closed first.  Does nothing if
+        the completed tasks have already been loaded.
+        """
+        with self.lock:
+            return self.load_shards(tasks_pool)
+
+    def load_shards(self, tasks_pool: Dict[str, Task]) -> List[Task]:
+        if self.completed_loaded:
+            return []
+
+        completed = []
+        for shard in self.list_shards():
+            obj_pool = self.read_shard(shard)
+            self.shard_ids[shard] = set(obj_pool)
+            for (k, v) in obj_pool.items():
+                if k in tasks_pool:
+                    # A task could have been reopened (and maybe closed again)
+                    # after being stored in this shard.
+                    if self.shard_of.get(k) != shard:
+                        self.stale_shards.add(shard)
+                    continue
+                task = Task.from_plain_object(k, v, self.epics_pool)
+                tasks_pool[k] = task
+                self.shard_of[k] = shard
+                completed.append(task)
+
+        self.completed_loaded = True
+        completed.sort(key=lambda task: task.close_date or task.creation_date, reverse=True)
+        return completed
+
+    def find_completed(self, ids: Iterable[str]) -> Dict[str, Task]:
+        """
+        Looks for the tasks with the given IDs in the shards, e.g. for the
+        active tasks that have disappeared from the board after someone else
+        has closed them and written a snapshot.  Returns the tasks found; the
+        IDs that aren't there have really been deleted.
+        """
+        wanted = set(ids)
+        found: Dict[str, Task] = {}
+        with self.lock:
+            # Newest first: a task that has just been closed is most likely
+            # in the first shard.  The shards might have been rewritten by
+            # someone else, so the IDs cached for them can't be trusted.
+            for shard in self.list_shards():
+                if len(found) == len(wanted):
+                    break
+                obj_pool = self.read_shard(shard)
+                self.shard_ids[shard] = set(obj_pool)
+                for (k, v) in obj_pool.items():
+                    if k in wanted and k not in found:
+                        found[k] = Task.from_plain_object(k, v, self.epics_pool)
+                        self.shard_of[k] = shard
+        return found
+
+    def save_shards(self, tasks_pool: Dict[str, Task], changed_ids: Optional[Set[str]] = None) -> None:
+        """
+        Writes the completed tasks from the pool to the shards they belong to,
+        removing their older copies from other shards.  Only the shards that
+        are affected by these changes are rewritten.  `changed_ids` lists
+        the tasks that may have changed since they were loaded; by default,
+        those written to the journal.
+        """
+        import yaml
+        if changed_ids is None:
+            changed_ids = self.journaled_ids
+        targets: Dict[str, str] = {}
+        affected = set(self.stale_shards)
+        for (k, task) in tasks_pool.items():
+            if task.status != TaskStatus.ACTIVE:
+                targets[k] = self.shard_name(task)
+            old_shard = self.shard_of.get(k)
+            if old_shard is None or k in changed_ids:
+                if k in targets:
+                    affected.add(targets[k])
+                # The archive is never rewritten; its copy of the task will be
+                # shadowed by the new one.
+                if old_shard is not None and old_shard != targets.get(k) and not self.is_archive(old_shard):
+                    affected.add(old_shard)
+
+        for shard in affected:
+            obj_pool: Dict[str, Any] = {}
+            for (k, v) in self.read_shard(shard).items():
+                if k not in tasks_pool:
+                    # Not loaded, so it hasn't changed
+                    obj_pool[k] = v
+                elif targets.get(k) == shard:
+                    obj_pool[k] = tasks_pool[k]
+                # Otherwise, the task has moved to another shard (or has been
+                # reopened), so the copy is dropped.
+            for (k, target) in targets.items():
+                if target == shard and k not in obj_pool:
+                    obj_pool[k] = tasks_pool[k]
+
+            shard_file = os.path.join(self.path(self.DONE_DIR), shard + ".yaml")
+            self.shard_ids[shard] = set(obj_pool)
+            if obj_pool:
+                shard_data = yaml.dump(obj_pool, default_flow_style=False,
+                    allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+                replace_file(shard_file, self.write_temp_file(shard_data, shard + ".", ".yaml", self.DONE_DIR))
+            else:
+                try:
+                    os.remove(shard_file)
+                except FileNotFoundError:
+                    pass
+
+        for (k, target) in targets.items():
+            self.shard_of[k] = target
+        # Note: the pool might be a snapshot that doesn't have tasks loaded
+        # after it was taken; we must keep those in `shard_of`.
+        for k in [ k for k in self.shard_of if k in tasks_pool and k not in targets ]:
+            del self.shard_of[k]
+        self.stale_shards = set()
+
+    @classmethod
+    def is_archive(cls, shard: str) -> bool:
+        """Tells whether a name from `shard_of` refers to an archive segment."""
+        return shard.startswith(cls.ARCHIVE_DIR + "/")
+
+    def archive_path(self, file_name: str = "") -> str:
+        return os.path.join(self.path(self.DONE_DIR), self.ARCHIVE_DIR, file_name)
+
+    def list_archives(self) -> List[str]:
+        """Returns the names of all archive segments (file names without the suffix), newest first."""
+        try:
+            names = os.listdir(self.archive_path())
+        except FileNotFoundError:
+            return []
+        return sorted((name for name in names if self.archive_format(name) is not None), reverse=True)
+
+    def archive_format(self, name: str) -> Optional[str]:
+        for (suffix, module_name) in self.ARCHIVE_FORMATS.items():
+            if name.endswith(suffix):
+                return module_name
+        return None
+
+    @staticmethod
+    def archive_segment(name: str) -> str:
+        return name.split(".", 1)[0]
+
+    def read_archive(self, name: str) -> Dict[str, Any]:
+        """Decompresses an archive segment, and reads it as plain objects."""
+        import yaml
+        compression = importlib.import_module(self.ARCHIVE_FORMATS[name[len(self.archive_segment(name)):]])
+        with compression.open(self.archive_path(name), "rt", encoding='utf8') as f:
+            obj_pool = yaml.load(f, Loader=yaml.SafeLoader)
+        # TODO: verify that obj_pool is a dict
+        return obj_pool if obj_pool is not None else {}
+
+    def read_archive_ids(self, name: str) -> Set[str]:
+        """Returns the IDs of the tasks in an archive segment, without decompressing it."""
+        key = self.ARCHIVE_DIR + "/" + name
+        ids = self.shard_ids.get(key)
+        if ids is None:
+            try:
+                with open(self.archive_path(self.archive_segment(name) + ".ids"), "r", encoding='utf8') as f:
+                    ids = set(line.strip() for line in f if line.strip())
+            except FileNotFoundError:
+                # Someone has removed the index; the archive is still valid
+                ids = set(self.read_archive(name))
+            self.shard_ids[key] = ids
+        return ids
+
+    def archive_completed(self, before: date) -> int:
+        """
+        Moves the shards of the tasks completed before `before` to the archive.
+        Only whole months are archived.  Returns the number of tasks archived.
+
+        The archive is read-only: an archive segment is written once, and the
+        tasks that get modified later are simply stored in the regular files
+        again.  Archived tasks are not loaded by `load_completed`; use
+        `find_archived` to get them.
+
+        Compressing a segment takes a while, so it's done without holding the
+        lock, letting the app load and search the board in the meantime.  A
+        shard that gets rewritten while it's being compressed stays where it
+        is until the next time.  Only one thread may be archiving at a time;
+        the app does it on the save thread.
+        """
+        import yaml
+        # A shard is named after the month, so its tasks have all been
+        # closed before the first day of the next month.
+        last_month = f"{before.year:04}-{before.month:02}"
+        with self.lock:
+            shards = [ shard for shard in self.list_shards() if shard < last_month ]
+        if not shards:
+            return 0
+
+        sub_dir = os.path.join(self.DONE_DIR, self.ARCHIVE_DIR)
+        os.makedirs(self.path(sub_dir), exist_ok=True)
+        # Nobody else writes the archive, so it can be read without the lock
+        existing = dict((self.archive_segment(name), name) for name in self.list_archives())
+        count = 0
+        for shard in shards:
+            shard_file = os.path.join(self.DONE_DIR, shard + ".yaml")
+            with self.lock:
+                shard_data = self.read_file(shard_file)
+            if shard_data is None:
+                continue
+            obj_pool = yaml.load(shard_data.decode('utf8'), Loader=yaml.SafeLoader) or {}
+            if shard in existing:
+                # Normally, nothing gets closed in the past; but a board
+                # could have been edited by hand, or restored from a backup.
+                merged = self.read_archive(existing[shard])
+                merged.update(obj_pool)
+                obj_pool = merged
+            archive_data = yaml.dump(obj_pool, default_flow_style=False,
+                allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+            compression = importlib.import_module(self.ARCHIVE_FORMATS[self.ARCHIVE_SUFFIX])
+            archive_data = compression.compress(archive_data)
+            ids_data = "".join(k + "\n" for k in obj_pool).encode('utf8')
+            name = shard + self.ARCHIVE_SUFFIX
+            ids_file_name = self.write_temp_file(ids_data, shard + ".", ".ids", sub_dir)
+            archive_file_name = self.write_temp_file(archive_data, shard + ".", self.ARCHIVE_SUFFIX, sub_dir)
+
+            with self.lock:
+                if self.read_file(shard_file) != shard_data:
+                    # Saved while we were compressing it
+                    os.remove(ids_file_name)
+                    os.remove(archive_file_name)
+                    continue
+                replace_file(self.archive_path(shard + ".ids"), ids_file_name)
+                replace_file(self.archive_path(name), archive_file_name)
+                if shard in existing and existing[shard] != name:
+                    os.remove(self.archive_path(existing[shard]))
+                sync_dir(self.archive_path())
+
+                # The shard can only go once the archive is safely on disk; if
+                # we crash in between, the tasks are just stored twice.
+                os.remove(self.path(shard_file))
+                self.shard_ids.pop(shard, None)
+                self.shard_ids[self.ARCHIVE_DIR + "/" + name] = set(obj_pool)
+                for (k, old_shard) in self.shard_of.items():
+                    if old_shard == shard:
+                        self.shard_of[k] = self.ARCHIVE_DIR + "/" + name
+                self.archived_tasks = None
+                self.archived_index = None
+            count += len(obj_pool)
+        if count:
+            sync_dir(self.path(self.DONE_DIR))
+        return count
+
+    def iter_completed_objects(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yields (ID, plain object) for every completed task stored on disk:
+        the shards first, then the archive, skipping the older copies of the
+        same task.  No Task objects are built, and only one shard is in memory
+        at a time, so this is how to go through a board of any size (e.g. to
+        export it).  Unlike `load_completed`, this knows nothing about the task
+        pool; the caller has to skip the tasks it has newer copies of.
+        """
+        seen: Set[str] = set()
+        for shard in self.list_shards():
+            with self.lock:
+                obj_pool = self.read_shard(shard)
+            for (k, v) in obj_pool.items():
+                if k not in seen:
+                    seen.add(k)
+                    yield k, v
+        for name in self.list_archives():
+            with self.lock:
+                obj_pool = self.read_archive(name)
+            for (k, v) in obj_pool.items():
+                if k not in seen:
+                    seen.add(k)
+                    yield k, v
+
+    def read_archived(self) -> Tuple[Dict[str, Tuple[Task, str]], TaskIndex]:
+        """
+        Returns the archived tasks that haven't got newer copies in the
+        shards (ID: the task and the name of its segment), and the index over
+        them.  The archive is only decompressed on the first call, and only
+        the segments that have such tasks according to their .ids files.
+        """
+        with self.lock:
+            if self.archived_tasks is None or self.archived_index is None:
+                archived_tasks: Dict[str, Tuple[Task, str]] = {}
+                shadowed: Set[str] = set()
+                for shard in self.list_shards():
+                    shadowed.update(self.read_shard_ids(shard))
+                for name in self.list_archives():
+                    # Newer segments come first, and the shards are newer
+                    # than any segment.
+                    if self.read_archive_ids(name) <= shadowed:
+                        continue
+                    for (k, v) in self.read_archive(name).items():
+                        if k not in shadowed:
+                            archived_tasks[k] = (Task.from_plain_object(k, v, self.epics_pool), name)
+                            shadowed.add(k)
+                index = TaskIndex()
+                for (task, _) in archived_tasks.values():
+                    index.update(task)
+                self.archived_tasks = archived_tasks
+                self.archived_index = index
+            return self.archived_tasks, self.archived_index
+
+    def find_archived(self, match: Callable[[Task], bool], tasks_pool: Dict[str, Task]) -> List[Task]:
+        """
+        Finds the archived tasks for which `match` (e.g. TaskFilter.match)
+        returns True, and adds them to `tasks_pool` so that they can be
+        displayed, edited or reopened.  Tasks that are already in the pool are
+        skipped.  Returns the tasks added, the most recently closed first.
+        """
+        archived_tasks, _ = self.read_archived()
+        found = []
+        with self.lock:
+            for (k, (task, name)) in archived_tasks.items():
+                if k not in tasks_pool and match(task):
+                    tasks_pool[k] = task
+                    self.shard_of[k] = self.ARCHIVE_DIR + "/" + name
+                    found.append(task)
+        found.sort(key=lambda task: task.close_date or task.creation_date, reverse=True)
+        return found
+
+    def search_archived(self, filter: TaskFilter, known: Container[str]) -> List[Task]:
+        """
+        Finds the archived tasks matching `filter`, except for those in
+        `known` (typically, the task pool, which already has them), using the
+        index over the archive.  Unlike `find_archived`, this leaves adding
+        the tasks to the pool to the caller, so that it can run in the
+        background while the pool is in use by another thread: `known` is
+        only checked for membership.  Returns the tasks found, the most
+        recently closed first.
+        """
+        archived_tasks, index = self.read_archived()
+        ids = index.find(filter)
+        found = [ archived_tasks[k][0] for k in (archived_tasks if ids is None else ids)
+            if k not in known and filter.match(archived_tasks[k][0]) ]
+        with self.lock:
+            for task in found:
+                self.shard_of[task.id] = self.ARCHIVE_DIR + "/" + archived_tasks[task.id][1]
+        found.sort(key=lambda task: task.close_date or task.creation_date, reverse=True)
+        return found
+
+    def save_snapshot(self, tasks_pool: Dict[str, Task], order: Sequence[str],
+        changed_ids: Iterable[str] = ()) -> None:
+        """
+        Rewrites tasks.yaml and active.txt entirely, updates the shards of
+        completed tasks, and drops the journal.  `changed_ids` lists the tasks
+        modified since the last save, same as in `save`: the completed ones
+        among them must go to their shards, since the journal won't have them.
+        """
+        import yaml
+        # TODO: keep a sequential list of IDs from the reading op, and use it
+        # to determine the sequence in which the Task objects should be
+        # written to the output file.
+        try:
+            os.mkdir(self.dir_name)
+        except FileExistsError:
+            # It's ok for the directory to already exist
+            pass
+
+        # The shards must be written first: until tasks.yaml is replaced,
+        # the journal remains valid and still has all the changes.
+        self.save_shards(tasks_pool, self.journaled_ids.union(changed_ids))
+
+        active_pool = dict((k, task) for (k, task) in tasks_pool.items() if task.status == TaskStatus.ACTIVE)
+        order = list(order)
+        tasks_data = yaml.dump(active_pool, default_flow_style=False,
+            allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+        active_data = "".join(task_id + "\n" for task_id in order).encode('utf8')
+
+        tasks_file_name = self.write_temp_file(tasks_data, "tasks.", ".yaml")
+        index_file_name = self.write_temp_file(active_data, "active.", ".txt")
+
+        # Note: we do not implement a full transaction-like rename here
+        # because the new files have been created successfully, so even
+        # in the worst scenario when something breaks in the middle, the
+        # user can manually rename them. A full rename (renaming the
+        # old files first) would help implement a clean recovery in case
+        # of errors, and would also help in case the old files are
+        # locked (on Windows). But it's too complicated for such a
+        # simple tool.
+        replace_file(self.path(self.TASKS_FILE), tasks_file_name)
+        replace_file(self.path(self.ACTIVE_FILE), index_file_name)
+        # The new snapshot (and the shards) must be on disk before the journal
+        # is gone
+        sync_dir(self.path(self.DONE_DIR))
+        sync_dir(self.dir_name)
+
+        self.snapshot_hash = self.hash_snapshot(tasks_data, active_data)
+        self.saved_order = order
+        self.write_cache(self.epics_pool, active_pool, order,
+            self.read_file(self.EPICS_FILE), tasks_data, active_data)
+        # The journal header no longer matches the snapshot, so even if we fail
+        # to delete the journal, it will be ignored on the next load.
+        self.journal_valid = False
+        self.journal_size = 0
+        self.journal_prefix = None
+        self.journaled_ids = set()
+        try:
+            os.remove(self.path(self.JOURNAL_FILE))
+        except FileNotFoundError:
+            pass
+
+    def write_temp_file(self, data: bytes, prefix: str, suffix: str, sub_dir: str = "") -> str:
+        """
+        Writes `data` to a new temporary file in the board directory (or in
+        its `sub_dir` subdirectory), and returns the name of that file.
+        """
+        return write_temp_file(os.path.join(self.dir_name, sub_dir), data, prefix, suffix)
@@ -0,0 +1,193 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import os
+from typing import Any, ClassVar, Dict, List, Optional
+
+from impl.board import BoardStorage, is_board_dir, no_alias_dumper, open_board_storage, replace_file, write_temp_file
+from impl.task import Task
+
+
+@dataclass
+class BoardInfo:
+    """What the catalog knows about a board without opening it."""
+    name: str
+    path: str
+    active_count: int = 0
+    done_count: int = 0
+    modified: Optional[datetime] = None
+    # Hash of the names, sizes and timestamps of the board files; changes
+    # whenever anything gets written to the board.
+    content_hash: str = ""
+    # The latest st_mtime_ns of the board directory and of the files and
+    # subdirectories where the board is written to; if it's changed, so might
+    # have the board.
+    mtime_ns: int = 0
+
+
+class BoardCatalog:
+    """
+    Keeps boards.yaml in the directory where the boards are, with a short
+    summary of each board (see BoardInfo).  The app uses it to list the boards
+    and show task counts without reading the boards themselves.
+
+    Entries are checked against the timestamps of the board directories, and
+    only the entries that don't match get rebuilt.  Similarly, the directory
+    is only scanned for new or deleted boards if its own timestamp has changed.
+    """
+
+    dir_name: str
+    boards: Dict[str, BoardInfo]
+    # st_mtime_ns of `dir_name` when it was last scanned for boards.  It's
+    # kept as the timestamp of boards.yaml itself (see `save`).
+    dir_mtime_ns: int = 0
+
+    CATALOG_FILE: ClassVar[str] = "boards.yaml"
+    # Must be incremented whenever the file format changes incompatibly
+    CATALOG_VERSION: ClassVar[int] = 2
+
+    def __init__(self, dir_name: str = ".") -> None:
+        self.dir_name = dir_name
+        self.boards = {}
+
+    @staticmethod
+    def board_mtime_ns(path: str) -> int:
+        # The board directory itself changes whenever a file gets replaced
+        # there, but some files are written in place, and the shards are in
+        # subdirectories.
+        mtime = 0
+        for name in ("", BoardStorage.DONE_DIR, "tasks", BoardStorage.JOURNAL_FILE, "board.sqlite", "board.sqlite-wal"):
+            try:
+                mtime = max(mtime, os.stat(os.path.join(path, name)).st_mtime_ns)
+            except FileNotFoundError:
+                pass
+        return mtime
+
+    @staticmethod
+    def hash_board_files(path: str) -> str:
+        import hashlib
+        h = hashlib.sha1()
+        for sub_dir in ("", BoardStorage.DONE_DIR, "tasks"):
+            try:
+                entries = sorted(os.scandir(os.path.join(path, sub_dir)), key=lambda entry: entry.name)
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_file() and entry.name != BoardStorage.CACHE_FILE:
+                    st = entry.stat()
+                    h.update(f"{sub_dir}/{entry.name}:{st.st_size}:{st.st_mtime_ns}\n".encode('utf8'))
+        return h.hexdigest()
+
+    def load(self) -> None:
+        import yaml
+        self.boards = {}
+        self.dir_mtime_ns = 0
+        try:
+            with open(os.path.join(self.dir_name, self.CATALOG_FILE), "r", encoding='utf8') as f:
+                obj = yaml.load(f, Loader=yaml.SafeLoader)
+                dir_mtime = os.fstat(f.fileno()).st_mtime_ns
+            if not isinstance(obj, dict) or obj.get("version") != self.CATALOG_VERSION:
+                return
+            self.dir_mtime_ns = dir_mtime
+            for (name, v) in obj["boards"].items():
+                self.boards[name] = BoardInfo(name=name, **v)
+        except FileNotFoundError:
+            pass
+        except (OSError, yaml.YAMLError, KeyError, TypeError, AttributeError):
+            # The catalog is rebuilt from the boards if it's broken
+            self.boards = {}
+            self.dir_mtime_ns = 0
+
+    def save(self) -> None:
+        """
+        Writes boards.yaml the same way as the board files: to a temporary
+        file that is then renamed over the old one, so that a crash can't
+        leave it half-written.
+        """
+        import yaml
+        catalog_file = os.path.join(self.dir_name, self.CATALOG_FILE)
+        boards: Dict[str, Any] = {}
+        for info in self.boards.values():
+            obj = asdict(info)
+            del obj["name"]
+            boards[info.name] = obj
+        obj_pool = { "version": self.CATALOG_VERSION, "boards": boards }
+        data = yaml.dump(obj_pool, default_flow_style=False,
+            allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+        try:
+            # Boards added or removed after the last scan must still be
+            # found on the next refresh
+            scanned = os.stat(self.dir_name).st_mtime_ns == self.dir_mtime_ns
+            replace_file(catalog_file, write_temp_file(self.dir_name, data, "boards.", ".yaml"))
+            if scanned:
+                # The rename has changed the timestamp of the directory; since
+                # we don't want that to look like a new board has appeared,
+                # the new timestamp is recorded as the timestamp of the file
+                # (which setting doesn't touch the directory).
+                self.dir_mtime_ns = os.stat(self.dir_name).st_mtime_ns
+                os.utime(catalog_file, ns=(self.dir_mtime_ns, self.dir_mtime_ns))
+        except OSError:
+            # It's only a cache; it gets rebuilt if it's missing
+            pass
+
+    def is_stale(self, info: BoardInfo) -> bool:
+        return self.board_mtime_ns(info.path) != info.mtime_ns
+
+    def refresh(self, rebuild_stale: bool = True) -> List[BoardInfo]:
+        """
+        Reads the catalog and brings it up to date.  Returns all the boards,
+        sorted by name.  If `rebuild_stale` is False, the boards that have
+        changed since they were cataloged are not read, and keep their old
+        counts; the caller is expected to `update` them once it has loaded
+        these boards anyway.
+        """
+        self.load()
+        modified = False
+        dir_mtime = os.stat(self.dir_name).st_mtime_ns
+        if dir_mtime != self.dir_mtime_ns:
+            found = set()
+            for f in os.scandir(self.dir_name):
+                if f.is_dir() and is_board_dir(f.path):
+                    found.add(f.name)
+                    if f.name not in self.boards:
+                        self.boards[f.name] = BoardInfo(f.name, f.path)
+            for name in [ name for name in self.boards if name not in found ]:
+                del self.boards[name]
+            self.dir_mtime_ns = dir_mtime
+            modified = True
+
+        if rebuild_stale:
+            for info in self.boards.values():
+                if self.is_stale(info):
+                    storage = open_board_storage(info.path)
+                    try:
+                        _, tasks_pool, _ = storage.load()
+                        self.update_info(info, storage, tasks_pool)
+                    finally:
+                        storage.close()
+                    modified = True
+
+        if modified:
+            self.save()
+        return sorted(self.boards.values(), key=lambda info: info.name)
+
+    def update(self, name: str, storage: BoardStorage, tasks_pool: Dict[str, Task]) -> BoardInfo:
+        """
+        Records the current state of a board, e.g. after it has been saved
+        or loaded.  `tasks_pool` is the pool of the board in memory.
+        """
+        info = self.boards.get(name)
+        if info is None:
+            info = BoardInfo(name, storage.dir_name)
+            self.boards[name] = info
+        self.update_info(info, storage, tasks_pool)
+        self.save()
+        return info
+
+    def update_info(self, info: BoardInfo, storage: BoardStorage, tasks_pool: Dict[str, Task]) -> None:
+        info.active_count, info.done_count = storage.count_tasks(tasks_pool)
+        info.mtime_ns = self.board_mtime_ns(info.path)
+        info.modified = datetime.fromtimestamp(info.mtime_ns / 1e9)
+        info.content_hash = self.hash_board_files(info.path)
@@ -0,0 +1,317 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+"""
+Command-line access to a board, for scripts and for machines without
+a display.  Run it as
+
+    python -m impl.cli [--board <board directory>] <command> ...
+
+where <command> is one of add, list, query, done, reopen, export (see
+--help for each of them).  By default, the first board found in the current
+directory is used, just like in the app.
+
+This module must never import wx (directly or through the ui package):
+that's what makes it start fast.
+"""
+import argparse
+from datetime import date
+import os
+import sys
+from typing import Any, Callable, Dict, List, Optional, Sequence, TextIO
+
+from impl.board import BoardStorage, is_board_dir, no_alias_dumper, open_board_storage
+from impl.exporter import EXPORT_FORMATS, iter_board_records
+from impl.search import rank_matches
+from impl.task import Epic, Task, TaskFilter, TaskStatus
+
+
+class CliError(Exception):
+    pass
+
+
+class Board:
+    """A board loaded for a single command, and saved back if it has changed."""
+
+    storage: BoardStorage
+    epics_pool: Dict[str, Epic]
+    tasks_pool: Dict[str, Task]
+    # IDs of the active tasks, in the order of priority
+    order: List[str]
+
+    def __init__(self, dir_name: str) -> None:
+        self.storage = open_board_storage(dir_name)
+        self.epics_pool, self.tasks_pool, self.order = self.storage.load()
+
+    def load_completed(self, archived: bool = False) -> None:
+        self.storage.load_completed(self.tasks_pool)
+        if archived:
+            self.storage.find_archived(lambda task: True, self.tasks_pool)
+
+    def find(self, task_id: str) -> Task:
+        """Finds a task by its ID, looking into the completed and archived tasks if necessary."""
+        task = self.tasks_pool.get(task_id)
+        if task is None:
+            self.storage.load_completed(self.tasks_pool)
+            task = self.tasks_pool.get(task_id)
+        if task is None:
+            self.storage.find_archived(lambda task: task.id == task_id, self.tasks_pool)
+            task = self.tasks_pool.get(task_id)
+        if task is None:
+            raise CliError(f"No such task: {task_id}")
+        return task
+
+    def active_tasks(self) -> List[Task]:
+        return [ self.tasks_pool[k] for k in self.order if k in self.tasks_pool ]
+
+    def completed_tasks(self) -> List[Task]:
+        completed = [ task for task in self.tasks_pool.values() if task.status != TaskStatus.ACTIVE ]
+        completed.sort(key=lambda task: task.close_date or task.creation_date, reverse=True)
+        return completed
+
+    def save(self) -> None:
+        """
+        Writes the changes the same way the app does, i.e. through the journal
+        or by replacing the files with fully written (and fsynced) copies,
+        so that an interrupted command never leaves a broken board behind.
+        """
+        changed_ids = [ k for (k, task) in self.tasks_pool.items() if task.dirty ]
+        self.storage.save(self.tasks_pool, self.order, changed_ids)
+
+    def close(self) -> None:
+        self.storage.close()
+
+
+def find_board_dir(dir_name: str = ".") -> str:
+    """Returns the first board in `dir_name` (sorted by name), the same one the app shows first."""
+    names = sorted(entry.name for entry in os.scandir(dir_name) if entry.is_dir() and is_board_dir(entry.path))
+    if not names:
+        raise CliError(f"No boards found in {os.path.abspath(dir_name)}")
+    return os.path.join(dir_name, names[0])
+
+
+def format_task(task: Task) -> str:
+    parts = [ task.id ]
+    if task.status != TaskStatus.ACTIVE:
+        parts.append(f"[{task.status.value}]")
+    if task.deadline is not None:
+        parts.append(f"({task.deadline.isoformat()})")
+    parts.append(task.summary)
+    if task.epic is not None:
+        parts.append(f"e:{task.epic.id}")
+    parts.extend("l:" + label for label in task.labels)
+    return " ".join(parts)
+
+
+def print_tasks(tasks: Sequence[Task], out: TextIO) -> None:
+    for task in tasks:
+        out.write(format_task(task) + "\n")
+
+
+# Each command returns True if it has modified the board
+
+def cmd_add(board: Board, args: argparse.Namespace, out: TextIO) -> bool:
+    # The app might have created a task in the same 1/100 of a second
+    task = Task(id=Task.id_allocator.allocate(board.tasks_pool))
+    task.set_full_desc(args.summary if args.desc is None else args.summary + "\n" + args.desc)
+    if args.label:
+        task.set_labels(args.label)
+    if args.epic is not None:
+        epic = board.epics_pool.get(args.epic)
+        if epic is None:
+            raise CliError(f"No such epic: {args.epic}")
+        task.set_epic(epic)
+    if args.deadline is not None:
+        task.set_deadline(args.deadline)
+    board.tasks_pool[task.id] = task
+    if args.bottom:
+        board.order.append(task.id)
+    else:
+        board.order.insert(0, task.id)
+    out.write(task.id + "\n")
+    return True
+
+
+def cmd_list(board: Board, args: argparse.Namespace, out: TextIO) -> bool:
+    if args.done:
+        board.load_completed(args.archived)
+        tasks = board.completed_tasks()
+    else:
+        tasks = board.active_tasks()
+    if args.overdue:
+        today = date.today()
+        tasks = [ task for task in tasks if task.deadline is not None and task.deadline < today ]
+    print_tasks(tasks, out)
+    return False
+
+
+def cmd_query(board: Board, args: argparse.Namespace, out: TextIO) -> bool:
+    filter = TaskFilter(" ".join(args.query))
+    if not args.active:
+        board.load_completed()
+    board.storage.prefilter(filter)
+    tasks = [ task for task in board.active_tasks() if filter.match(task) ]
+    if not args.active:
+        tasks += [ task for task in board.completed_tasks() if filter.match(task) ]
+        tasks += board.storage.find_archived(filter.match, board.tasks_pool)
+    if filter.ranked:
+        # Best matches first
+        tasks = [ tasks[pos] for (_, pos) in rank_matches(filter, tasks, args.limit) ]
+    for task in tasks:
+        out.write(format_task(task) + "\n")
+        # Tells where the terms have been found if that's not obvious
+        for i in filter.find_comments(task):
+            comment = task.comments[i]
+            out.write(f"    comment {comment.date.isoformat(' ', 'minutes')}: {comment.text.splitlines()[0] if comment.text else ''}\n")
+    return False
+
+
+def cmd_done(board: Board, args: argparse.Namespace, out: TextIO) -> bool:
+    modified = False
+    for task_id in args.ids:
+        task = board.find(task_id)
+        if task.status != TaskStatus.ACTIVE:
+            raise CliError(f"Task {task_id} has already been closed")
+        task.set_status(TaskStatus.CANCELLED if args.cancel else TaskStatus.DONE)
+        # A task missing from the active list is still active; it just won't
+        # be written to the list again
+        if task.id in board.order:
+            board.order.remove(task.id)
+        modified = True
+    return modified
+
+
+def cmd_reopen(board: Board, args: argparse.Namespace, out: TextIO) -> bool:
+    modified = False
+    for task_id in args.ids:
+        task = board.find(task_id)
+        if task.status == TaskStatus.ACTIVE:
+            raise CliError(f"Task {task_id} is already active")
+        # Same as ReopenTask in the app: the task goes to the top of the list
+        # (and out of the archive, if it's been there).
+        task.set_status(TaskStatus.ACTIVE)
+        board.order.insert(0, task.id)
+        modified = True
+    return modified
+
+
+def cmd_export(board: Board, args: argparse.Namespace, out: TextIO) -> bool:
+    filter = TaskFilter(" ".join(args.query)) if args.query else TaskFilter()
+    board.storage.prefilter(filter)
+    if args.format in EXPORT_FORMATS:
+        # Streamed: the completed tasks are read from disk one shard at
+        # a time, and go straight to the output.
+        records = iter_board_records(board.storage, board.epics_pool, board.tasks_pool, board.order,
+            filter, completed=args.done)
+        # The csv module does its own line endings
+        write_export(args.output, out, lambda f: EXPORT_FORMATS[args.format](records, f),
+            newline="" if args.format == "csv" else None)
+        return False
+
+    tasks = [ task for task in board.active_tasks() if filter.match(task) ]
+    if args.done:
+        board.load_completed(args.archived)
+        tasks += [ task for task in board.completed_tasks() if filter.match(task) ]
+    if args.format == "txt":
+        # Same format as the app imports: one summary per line
+        write_export(args.output, out, lambda f: f.writelines(task.summary + "\n" for task in tasks))
+    else:
+        import yaml
+        write_export(args.output, out, lambda f: yaml.dump(dict((task.id, task) for task in tasks), f,
+            default_flow_style=False, allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()))
+    return False
+
+
+def write_export(file_name: Optional[str], out: TextIO, write: Callable[[TextIO], Any], newline: Optional[str] = None) -> None:
+    """
+    Calls `write` on `out` or on the file `file_name`.  The file is written
+    under a temporary name first, so that a failed export doesn't destroy
+    the previous one.
+    """
+    if file_name is None:
+        write(out)
+        return
+    tmp_name = file_name + ".tmp"
+    try:
+        with open(tmp_name, "w", encoding='utf8', newline=newline) as f:
+            write(f)
+        os.replace(tmp_name, file_name)
+    finally:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m impl.cli", description="Work with a WhaddaDoo board without the GUI.")
+    parser.add_argument("-b", "--board", help="board directory (default: the first board in the current directory)")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    p = commands.add_parser("add", help="add a task to the top of the active list")
+    p.add_argument("summary")
+    p.add_argument("-d", "--desc", help="the rest of the description")
+    p.add_argument("-l", "--label", action="append", help="a label (can be repeated)")
+    p.add_argument("-e", "--epic", help="epic ID")
+    p.add_argument("--deadline", type=date.fromisoformat, help="YYYY-MM-DD")
+    p.add_argument("--bottom", action="store_true", help="add to the bottom of the list instead")
+    p.set_defaults(func=cmd_add)
+
+    p = commands.add_parser("list", help="list active (or completed) tasks")
+    p.add_argument("--done", action="store_true", help="list completed tasks instead")
+    p.add_argument("--archived", action="store_true", help="with --done, include the archived tasks")
+    p.add_argument("--overdue", action="store_true", help="only the tasks past their deadline")
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser("query", help="search for tasks, using the same syntax as the search box")
+    p.add_argument("query", nargs="+")
+    p.add_argument("--active", action="store_true", help="only search active tasks")
+    p.add_argument("-n", "--limit", type=int, default=20,
+        help="how many tasks to show for a ranked query (one starting with ~); default: 20")
+    p.set_defaults(func=cmd_query)
+
+    p = commands.add_parser("done", help="mark tasks as done")
+    p.add_argument("ids", nargs="+", metavar="id")
+    p.add_argument("--cancel", action="store_true", help="mark as cancelled instead")
+    p.set_defaults(func=cmd_done)
+
+    p = commands.add_parser("reopen", help="reopen completed tasks")
+    p.add_argument("ids", nargs="+", metavar="id")
+    p.set_defaults(func=cmd_reopen)
+
+    p = commands.add_parser("export", help="write tasks to stdout or to a file")
+    p.add_argument("-f", "--format", choices=("txt", "yaml") + tuple(EXPORT_FORMATS), default="yaml")
+    p.add_argument("-o", "--output", help="output file (default: stdout)")
+    p.add_argument("-q", "--query", nargs="+", help="only export the tasks matching this search query")
+    p.add_argument("--done", action="store_true", help="include completed tasks")
+    p.add_argument("--archived", action="store_true",
+        help="with --done, include the archived tasks (always included in jsonl, csv and md)")
+    p.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None, out: TextIO = sys.stdout) -> int:
+    args = make_parser().parse_args(argv)
+    try:
+        board = Board(args.board if args.board is not None else find_board_dir())
+        try:
+            if args.func(board, args, out):
+                board.save()
+        finally:
+            board.close()
+    except (CliError, OSError) as e:
+        sys.stderr.write(f"error: {e}\n")
+        return 1
+    except Exception as e:
+        # yaml is only imported if the board had to be parsed (or exported),
+        # so a YAML error can't happen unless it's there
+        yaml = sys.modules.get("yaml")
+        if yaml is None or not isinstance(e, yaml.YAMLError):
+            raise
+        sys.stderr.write(f"error: {e}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import csv
+from datetime import date, datetime
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TextIO
+
+from impl.board import BoardStorage
+from impl.task import Epic, Task, TaskFilter, TaskStatus
+
+
+# Every exported task is a flat record with these fields; dates are in the
+# ISO format, and comments are a list of { "date", "text" } records.
+RECORD_FIELDS = ("id", "status", "summary", "description", "epic", "epic_name", "labels",
+    "created", "closed", "deadline", "comments")
+
+
+def format_date(value: Any) -> Optional[str]:
+    """Converts a date (either parsed by YAML or not) to the ISO format."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(" ", "seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def record_from_task(task: Task) -> Dict[str, Any]:
+    return {
+        "id": task.id,
+        "status": task.status.value,
+        "summary": task.summary,
+        "description": task.desc,
+        "epic": task.epic.id if task.epic is not None else None,
+        "epic_name": task.epic.name if task.epic is not None else None,
+        "labels": list(task.labels),
+        "created": format_date(task.creation_date),
+        "closed": format_date(task.close_date),
+        "deadline": format_date(task.deadline),
+        "comments": [ { "date": format_date(c.date), "text": c.text } for c in task.comments ],
+    }
+
+
+def record_from_plain_object(task_id: str, obj: Dict[str, Any], epics_pool: Dict[str, Epic]) -> Dict[str, Any]:
+    """Same as `record_from_task`, for a task as it's stored on disk (see Task.from_plain_object)."""
+    lines = str(obj.get("desc", "")).split("\n")
+    epic = epics_pool.get(obj["epic"]) if obj.get("epic") is not None else None
+    labels = obj.get("labels")
+    return {
+        "id": task_id,
+        "status": obj.get("status", TaskStatus.ACTIVE.value),
+        "summary": lines[0],
+        "description": "\n".join(lines[1:]),
+        "epic": obj.get("epic"),
+        "epic_name": epic.name if epic is not None else None,
+        "labels": sorted(labels.split()) if isinstance(labels, str) else [],
+        "created": format_date(obj.get("created")),
+        "closed": format_date(obj.get("closed")),
+        "deadline": format_date(obj.get("deadline")),
+        "comments": [ { "date": format_date(c.get("date")), "text": c.get("text", "") }
+            for c in (obj.get("comments") or []) if isinstance(c, dict) ],
+    }
+
+
+def iter_board_records(storage: BoardStorage, epics_pool: Dict[str, Epic], tasks_pool: Dict[str, Task],
+    order: Iterable[str], filter: Optional[TaskFilter] = None, completed: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Walks a loaded board and yields a record for every task matching `filter`:
+    the active tasks in the order of priority, then the completed ones.
+    Completed tasks that are not in `tasks_pool` (that is, most of them) are
+    read shard by shard (including the archive) and filtered as stored,
+    without building Task objects; so the memory used doesn't depend on how
+    many tasks have been completed.
+    """
+    if filter is None:
+        filter = TaskFilter()
+    for k in order:
+        task = tasks_pool.get(k)
+        if task is not None and filter.match(task):
+            yield record_from_task(task)
+    if not completed:
+        return
+    # The pool has the newest copies of the tasks it holds
+    for task in tasks_pool.values():
+        if task.status != TaskStatus.ACTIVE and filter.match(task):
+            yield record_from_task(task)
+    for (k, obj) in storage.iter_completed_objects():
+        if k not in tasks_pool and filter.match_plain_object(k, obj):
+            yield record_from_plain_object(k, obj, epics_pool)
+
+
+def write_jsonl(records: Iterable[Dict[str, Any]], f: TextIO) -> int:
+    count = 0
+    for record in records:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(records: Iterable[Dict[str, Any]], f: TextIO) -> int:
+    writer = csv.writer(f)
+    writer.writerow(RECORD_FIELDS)
+    count = 0
+    for record in records:
+        row = dict(record)
+        row["labels"] = " ".join(record["labels"])
+        # One cell for all comments, one comment per paragraph
+        row["comments"] = "\n\n".join(f"{c['date']}: {c['text']}" for c in record["comments"])
+        writer.writerow([ row[name] if row[name] is not None else "" for name in RECORD_FIELDS ])
+        count += 1
+    return count
+
+
+def write_markdown(records: Iterable[Dict[str, Any]], f: TextIO) -> int:
+    count = 0
+    for record in records:
+        f.write(f"## {record['summary']}\n\n")
+        details = [ f"ID: {record['id']}", f"Status: {record['status']}", f"Created: {record['created']}" ]
+        if record["closed"] is not None:
+            details.append(f"Closed: {record['closed']}")
+        if record["deadline"] is not None:
+            details.append(f"Deadline: {record['deadline']}")
+        if record["epic"] is not None:
+            details.append(f"Epic: {record['epic_name'] or record['epic']}")
+        if record["labels"]:
+            details.append("Labels: " + ", ".join(record["labels"]))
+        f.write("".join(f"- {line}\n" for line in details) + "\n")
+        if record["description"]:
+            f.write(record["description"] + "\n\n")
+        for c in record["comments"]:
+            f.write(f"> **{c['date']}**  \n> " + c["text"].replace("\n", "  \n> ") + "\n\n")
+        count += 1
+    return count
+
+
+# format name: writer; every writer returns the number of records written
+EXPORT_FORMATS: Dict[str, Callable[[Iterable[Dict[str, Any]], TextIO], int]] = {
+    "jsonl": write_jsonl,
+    "csv": write_csv,
+    "md": write_markdown,
+}
@@ -0,0 +1,75 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+"""
+Typo-tolerant word matching for the ranked search (see TaskFilter.ranked).
+"""
+from typing import List, Set
+
+
+def max_typos(term: str) -> int:
+    """How many typos are forgiven in a search term; none in short terms, where any typo makes another word."""
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+def ngrams(word: str, whole: bool = True) -> Set[str]:
+    """
+    The bigrams of `word`, including the ones at its edges (only at the
+    start unless `whole`, so that they're found in longer words, too).
+    Each typo (a wrong, missing, extra or swapped letter) spoils at most 3
+    of them, which is what TaskIndex uses to find the words similar to
+    a term without comparing the term to every word.
+    """
+    padded = f" {word} " if whole else f" {word}"
+    return set(padded[i:i + 2] for i in range(len(padded) - 1))
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    The number of typos (letters replaced, inserted, deleted, or two
+    adjacent letters swapped) between `a` and `b`; or limit + 1 if there
+    are more than `limit` of them, which is found out without computing
+    the whole thing.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            d = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d = min(d, before[j - 2] + 1)
+            row[j] = d
+        # The distance can only grow from here
+        if min(row) > limit:
+            return limit + 1
+        before, prev = prev, row
+    return min(prev[-1], limit + 1)
+
+
+def similarity(term: str, word: str) -> float:
+    """
+    How well `word` matches the search term `term`, from 0 (not at all) to
+    1 (the same word).  Like in the normal search, the term can be the start
+    of the word, which scores by how much of the word it covers.  Either
+    way, up to max_typos(term) typos are forgiven, at a cost.
+    """
+    if word == term:
+        return 1.0
+    covered = 0.5 + 0.5 * len(term) / len(word)
+    if word.startswith(term):
+        return covered
+    limit = max_typos(term)
+    if limit == 0:
+        return 0.0
+    typos = edit_distance(term, word, limit)
+    if typos <= limit:
+        return 1.0 - typos / len(term)
+    # The start of the word, give or take a few letters
+    typos = min((edit_distance(term, word[:n], limit) for n in range(len(term) - limit, len(term) + limit + 1)
+        if n < len(word)), default=limit + 1)
+    return (1.0 - typos / len(term)) * covered if typos <= limit else 0.0
@@ -0,0 +1,91 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import codecs
+import os
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+from impl.task import Task
+
+
+class PlainTextImporter:
+    """
+    Turns plain text into tasks, a piece at a time, so that a huge file
+    never has to be in memory as a whole.  Two formats are supported:
+
+    - one task per line (blank lines are ignored);
+    - paragraphs (`paragraphs` = True): tasks are separated by blank lines;
+      the first line of a paragraph is the summary, and the following lines
+      go to the description.
+
+    Feed the text with `feed()`, then call `finish()`; both return the tasks
+    that have been completed by then.  The IDs are allocated one batch at
+    a time, and are guaranteed not to clash with `tasks_pool`.  The tasks are
+    not added to the pool though; that's up to the caller.
+    """
+
+    tasks_pool: Dict[str, Task]
+    paragraphs: bool
+    # The end of the text fed so far that doesn't make a full line yet
+    tail: str
+    # Lines of the paragraph being read
+    lines: List[str]
+
+    def __init__(self, tasks_pool: Dict[str, Task], paragraphs: bool = False) -> None:
+        self.tasks_pool = tasks_pool
+        self.paragraphs = paragraphs
+        self.tail = ""
+        self.lines = []
+
+    def feed(self, text: str) -> List[Task]:
+        lines = (self.tail + text).split("\n")
+        self.tail = lines.pop()
+        return self.make_tasks(self.parse_lines(lines))
+
+    def finish(self) -> List[Task]:
+        entries = self.parse_lines([ self.tail, "" ])
+        self.tail = ""
+        return self.make_tasks(entries)
+
+    def parse_lines(self, lines: List[str]) -> List[Tuple[str, str]]:
+        """Returns (summary, description) for each task completed by `lines`."""
+        entries = []
+        for line in lines:
+            line = line.strip()
+            if not self.paragraphs:
+                if line:
+                    entries.append((line, ""))
+            elif line:
+                self.lines.append(line)
+            elif self.lines:
+                entries.append((self.lines[0], "\n".join(self.lines[1:])))
+                self.lines = []
+        return entries
+
+    def make_tasks(self, entries: List[Tuple[str, str]]) -> List[Task]:
+        # All the IDs of a batch are allocated at once
+        ids = Task.id_allocator.reserve(len(entries), self.tasks_pool)
+        return [ Task(summary, desc, task_id) for ((summary, desc), task_id) in zip(entries, ids) ]
+
+
+def import_plain_text_file(f: BinaryIO, tasks_pool: Dict[str, Task], paragraphs: bool = False,
+    chunk_size: int = 256 * 1024) -> Iterator[Tuple[List[Task], float]]:
+    """
+    Reads tasks from a UTF-8 text file (see PlainTextImporter) a chunk at
+    a time.  Yields the tasks read from each chunk along with the fraction of
+    the file read so far, so that the caller can show progress and stop at
+    any moment.
+    """
+    size = os.fstat(f.fileno()).st_size
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    importer = PlainTextImporter(tasks_pool, paragraphs)
+    done = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        done += len(chunk)
+        # Windows line breaks are taken care of by strip() in the importer
+        tasks = importer.feed(decoder.decode(chunk))
+        yield tasks, (done / size if size else 1.0)
+    yield importer.feed(decoder.decode(b"", final=True)) + importer.finish(), 1.0
@@ -0,0 +1,120 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import date
+import heapq
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from impl.task import Task, TaskComment, TaskFilter, TaskSearchDoc, TaskStatus
+
+
+# What TaskFilter.match_fields needs to know about a task: ID, epic ID, search
+# document, comments, status, and the creation, close and deadline dates.
+# The document is immutable, and comments are only ever appended (which
+# touches the task, making the snapshot stale anyway), so the entry can be
+# read on another thread while the task is being edited.
+SearchEntry = Tuple[str, Optional[str], TaskSearchDoc, Sequence[TaskComment], TaskStatus,
+    Optional[date], Optional[date], Optional[date]]
+
+
+def make_search_entry(task: Task) -> SearchEntry:
+    return (task.id, task.epic.id if task.epic is not None else None, task.search_doc(), task.comments,
+        task.status, task.creation_date, task.close_date, task.deadline)
+
+
+class SearchJob:
+    """A search running in the background (see run_search); one job can cover several lists."""
+
+    filter: TaskFilter
+    # Set from the UI thread when a newer query comes in
+    cancelled: bool = False
+
+    def __init__(self, filter: TaskFilter) -> None:
+        self.filter = filter
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+def run_search(job: SearchJob, snapshot: Sequence[Optional[SearchEntry]], positions: Sequence[int],
+    publish: Callable[[List[int], int, bool], None], first_chunk: int = 256, max_chunk: int = 8192) -> None:
+    """
+    Checks the entries of `snapshot` at `positions` (in ascending order)
+    against the filter of `job`, and reports the results one chunk at a time
+    through publish(matched, upto, done): the matching positions found in
+    the chunk, and the position in `snapshot` up to which everything has been
+    checked.  None entries (placeholders) always match.
+
+    The first chunk is small, so that the first screenful of results shows
+    up quickly; the following ones grow, so that the receiving side isn't
+    flooded with updates.  Stops as soon as the job gets cancelled.
+    """
+    filter = job.filter
+    chunk = first_chunk
+    start = 0
+    while True:
+        if job.cancelled:
+            return
+        part = positions[start:start + chunk]
+        matched = [ pos for pos in part if filter.always_pass or snapshot[pos] is None
+            or filter.match_fields(*snapshot[pos]) ]     # type: ignore[misc]
+        start += len(part)
+        done = start >= len(positions)
+        publish(matched, len(snapshot) if done else part[-1] + 1, done)
+        if done:
+            return
+        chunk = min(chunk * 2, max_chunk)
+
+
+def rank_matches(filter: TaskFilter, tasks: Sequence[Optional[Task]], limit: int) -> List[Tuple[float, int]]:
+    """
+    Returns (score, position) for the `limit` tasks that match `filter` best
+    (see TaskFilter.score), best first; equal scores keep the order of
+    `tasks`.  None entries are skipped.  The best tasks are kept in a heap
+    as the tasks are checked, so nothing but them ever gets sorted.
+    """
+    best: List[Tuple[float, int]] = []
+    for (pos, task) in enumerate(tasks):
+        if task is not None:
+            keep_best(best, filter.score(task), pos, limit)
+    return sorted_best(best)
+
+
+def keep_best(best: List[Tuple[float, int]], score: float, pos: int, limit: int) -> None:
+    """Adds a score to the heap of the `limit` best scores (see rank_matches), if it's good enough."""
+    # The worst of the best goes first; an earlier position wins a tie
+    if score <= 0:
+        return
+    if len(best) < limit:
+        heapq.heappush(best, (score, -pos))
+    elif (score, -pos) > best[0]:
+        heapq.heapreplace(best, (score, -pos))
+
+
+def sorted_best(best: List[Tuple[float, int]]) -> List[Tuple[float, int]]:
+    return [ (score, -neg_pos) for (score, neg_pos) in sorted(best, reverse=True) ]
+
+
+def run_ranked_search(job: SearchJob, snapshots: Sequence[Sequence[Optional[SearchEntry]]], limit: int,
+    publish: Callable[[List[List[Tuple[float, int]]]], None], chunk: int = 4096) -> None:
+    """
+    Same as rank_matches, but for the entries of several lists at once (see
+    make_search_entry), so that a ranked search can run in the background
+    like run_search.  Reports the results through publish(rankings), one
+    list of (score, position) per snapshot, once they are all ranked.
+    Checks whether the job has been cancelled every `chunk` entries, and
+    stops if it has.
+    """
+    filter = job.filter
+    rankings = []
+    for snapshot in snapshots:
+        best: List[Tuple[float, int]] = []
+        for start in range(0, len(snapshot), chunk):
+            if job.cancelled:
+                return
+            for pos in range(start, min(start + chunk, len(snapshot))):
+                entry = snapshot[pos]
+                if entry is not None:
+                    keep_best(best, filter.score_fields(*entry), pos, limit)     # type: ignore[misc]
+        rankings.append(sorted_best(best))
+    publish(rankings)
@@ -0,0 +1,269 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import os
+import shutil
+import sys
+from typing import Any, ClassVar, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from impl.board import BoardStorage, FileKey, no_alias_dumper, replace_file
+from impl.task import Epic, Task, TaskStatus
+
+
+class ShardedBoardStorage(BoardStorage):
+    """
+    Reads and writes a board where the active tasks are spread over a number
+    of small files instead of a single tasks.yaml:
+
+    - tasks/XX.yaml - the active tasks whose ID ends with XX;
+    - epics.yaml, active.txt, done/YYYY-MM.yaml - same as in BoardStorage;
+    - board.cache - the parsed task files, so that only the files that have
+      changed since the cache was written need to be parsed on load.
+
+    There's no journal here: a save rewrites only the files that hold
+    the tasks that have changed (and active.txt if the order has changed),
+    so the cost of a save depends on the size of the change rather than on
+    the size of the board.
+    """
+
+    TASKS_DIR: ClassVar[str] = "tasks"
+    # Task IDs are timestamps, so their last digits are the ones that spread
+    # the tasks evenly.  Two base-36 digits give at most 1296 files.
+    BUCKET_DIGITS: ClassVar[int] = 2
+
+    @classmethod
+    def bucket_of(cls, task_id: str) -> str:
+        return task_id[-cls.BUCKET_DIGITS:]
+
+    def bucket_file(self, bucket: str) -> str:
+        return os.path.join(self.TASKS_DIR, bucket + ".yaml")
+
+    def list_buckets(self) -> List[str]:
+        try:
+            names = os.listdir(self.path(self.TASKS_DIR))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".yaml"))
+
+    def read_bucket(self, bucket: str) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        """Reads a task file as plain objects; also returns the raw file contents."""
+        import yaml
+        data = self.read_file(self.bucket_file(bucket))
+        if data is None:
+            return {}, None
+        obj_pool = yaml.load(data.decode('utf8'), Loader=yaml.SafeLoader)
+        # TODO: verify that obj_pool is a dict
+        return (obj_pool if obj_pool is not None else {}), data
+
+    def write_bucket(self, bucket: str, obj_pool: Dict[str, Any]) -> None:
+        import yaml
+        file_name = self.path(self.bucket_file(bucket))
+        if not obj_pool:
+            try:
+                os.remove(file_name)
+            except FileNotFoundError:
+                pass
+            return
+        bucket_data = yaml.dump(obj_pool, default_flow_style=False,
+            allow_unicode=True, sort_keys=False, Dumper=no_alias_dumper()).encode('utf8')
+        replace_file(file_name, self.write_temp_file(bucket_data, bucket + ".", ".yaml", self.TASKS_DIR))
+
+    def write_order(self, order: List[str]) -> None:
+        active_data = "".join(task_id + "\n" for task_id in order).encode('utf8')
+        replace_file(self.path(self.ACTIVE_FILE), self.write_temp_file(active_data, "active.", ".txt"))
+        self.saved_order = order
+
+    def load(self) -> Tuple[Dict[str, Epic], Dict[str, Task], List[str]]:
+        with self.lock:
+            epics_data = self.read_file(self.EPICS_FILE)
+            # TODO: handle exceptions
+            with open(self.path(self.ACTIVE_FILE), "rb") as f:
+                active_data = f.read()
+
+            epics_pool: Optional[Dict[str, Epic]] = None
+            cached: Dict[str, Dict[str, Task]] = {}
+            keys: Dict[str, FileKey] = {}
+            cache = self.load_bucket_cache()
+            if cache is not None and self.is_file_unchanged(self.EPICS_FILE, cache[0].get(self.EPICS_FILE)):
+                # Tasks refer to epics, so the cached tasks can only be used
+                # along with the cached epics.
+                keys, epics_pool, cached = cache
+            if epics_pool is None:
+                epics_pool = self.load_epics(epics_data)
+                keys = { self.EPICS_FILE: self.file_key(self.EPICS_FILE, epics_data) }
+                cached = {}
+            self.epics_pool = epics_pool
+
+            buckets: Dict[str, Dict[str, Task]] = {}
+            new_keys = { self.EPICS_FILE: keys[self.EPICS_FILE] }
+            parsed = False
+            for bucket in self.list_buckets():
+                file_name = self.bucket_file(bucket)
+                if bucket in cached and self.is_file_unchanged(file_name, keys.get(file_name)):
+                    buckets[bucket] = cached[bucket]
+                    new_keys[file_name] = keys[file_name]
+                    continue
+                obj_pool, data = self.read_bucket(bucket)
+                buckets[bucket] = dict((k, Task.from_plain_object(k, v, epics_pool)) for (k, v) in obj_pool.items())
+                new_keys[file_name] = self.file_key(file_name, data)
+                parsed = True
+
+            if parsed or len(buckets) != len(cached):
+                self.write_bucket_cache(new_keys, epics_pool, buckets)
+
+            tasks_pool: Dict[str, Task] = {}
+            for bucket_pool in buckets.values():
+                tasks_pool.update(bucket_pool)
+            order = [ line.strip() for line in active_data.decode('utf8').splitlines() ]
+            order = [ task_id for task_id in order if task_id ]
+            self.saved_order = list(order)
+            # If a save has been interrupted between writing the task files
+            # and active.txt (see append_changes), the new tasks are missing
+            # from the order.  They go to the end rather than get lost; the
+            # next save writes them to active.txt.
+            listed = set(order)
+            order += [ k for (k, task) in tasks_pool.items() if task.status == TaskStatus.ACTIVE and k not in listed ]
+            self.remember_files()
+
+            return epics_pool, tasks_pool, order
+
+    def watched_files(self) -> List[str]:
+        return [ self.ACTIVE_FILE ] + [ self.bucket_file(bucket) for bucket in self.list_buckets() ]
+
+    def load_bucket_cache(self) -> Optional[Tuple[Dict[str, FileKey], Dict[str, Epic], Dict[str, Dict[str, Task]]]]:
+        """
+        Reads the parsed task files from board.cache.  Unlike BoardStorage,
+        the cache is used even if some of the files have changed since it was
+        written; it's up to the caller to check every file.
+        """
+        import pickle
+        try:
+            with open(self.path(self.CACHE_FILE), "rb") as f:
+                header = pickle.load(f)
+                if not isinstance(header, dict) or header.get("version") != self.CACHE_VERSION \
+                    or header.get("layout") != "sharded":
+                    return None
+                epics_pool, buckets = pickle.load(f)
+                return header["keys"], epics_pool, buckets
+
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError, ValueError):
+            return None
+
+    def write_bucket_cache(self, keys: Dict[str, FileKey], epics_pool: Dict[str, Epic],
+        buckets: Dict[str, Dict[str, Task]]) -> None:
+
+        import pickle
+        import tempfile
+        try:
+            header = {
+                "version": self.CACHE_VERSION,
+                "layout": "sharded",
+                "keys": keys,
+            }
+            with tempfile.NamedTemporaryFile(mode="wb", dir=self.dir_name, delete=False,
+                prefix="board.", suffix=".cache") as f:
+
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump((epics_pool, buckets), f, pickle.HIGHEST_PROTOCOL)
+                cache_file_name = f.name
+            replace_file(self.path(self.CACHE_FILE), cache_file_name)
+        except OSError:
+            pass
+
+    def needs_snapshot(self) -> bool:
+        # Every save only writes what has changed
+        return False
+
+    def append_changes(self, tasks_pool: Dict[str, Task], order: Sequence[str], changed_ids: Iterable[str]) -> None:
+        changed = set(k for k in changed_ids if k in tasks_pool)
+        # Completed tasks go to the month shards, just like in the YAML layout
+        self.save_shards(dict((k, tasks_pool[k]) for k in changed), changed)
+
+        # `tasks_pool` may only have the changed tasks; those that have left
+        # the active list without a change (i.e. have been deleted) have to
+        # go from their files too.  Otherwise load() would bring them back.
+        order = list(order)
+        deleted = set(self.saved_order).difference(order).difference(tasks_pool)
+        by_bucket: Dict[str, List[str]] = {}
+        for k in changed | deleted:
+            by_bucket.setdefault(self.bucket_of(k), []).append(k)
+        for (bucket, ids) in sorted(by_bucket.items()):
+            obj_pool, _ = self.read_bucket(bucket)
+            for k in ids:
+                if k in tasks_pool and tasks_pool[k].status == TaskStatus.ACTIVE:
+                    obj_pool[k] = tasks_pool[k]
+                else:
+                    obj_pool.pop(k, None)
+            # Removed if it's empty now
+            self.write_bucket(bucket, obj_pool)
+
+        # Written last: if we're interrupted before that, load() still finds
+        # the new tasks in their files
+        if order != self.saved_order:
+            self.write_order(order)
+
+    def save_snapshot(self, tasks_pool: Dict[str, Task], order: Sequence[str],
+        changed_ids: Iterable[str] = ()) -> None:
+        """Writes the entire board, e.g. when converting from another layout."""
+        os.makedirs(self.path(self.TASKS_DIR), exist_ok=True)
+        self.save_shards(tasks_pool, set(tasks_pool))
+
+        by_bucket: Dict[str, Dict[str, Task]] = {}
+        for (k, task) in tasks_pool.items():
+            if task.status == TaskStatus.ACTIVE:
+                by_bucket.setdefault(self.bucket_of(k), {})[k] = task
+        for bucket in set(self.list_buckets()) | set(by_bucket):
+            self.write_bucket(bucket, by_bucket.get(bucket, {}))
+
+        self.write_order(list(order))
+
+
+def yaml_to_sharded(dir_name: str) -> None:
+    """
+    Converts a YAML board (including any changes still in its journal) to
+    the sharded layout.  tasks.yaml is renamed to tasks.yaml.bak, and
+    the journal is removed since it's been applied.
+    """
+    import yaml
+    source = BoardStorage(dir_name)
+    epics_pool, tasks_pool, order = source.load()
+    source.load_completed(tasks_pool)
+    target = ShardedBoardStorage(dir_name)
+    target.epics_pool = epics_pool
+    target.save_snapshot(tasks_pool, order)
+
+    replace_file(source.path(BoardStorage.TASKS_FILE + ".bak"), source.path(BoardStorage.TASKS_FILE))
+    try:
+        os.remove(source.path(BoardStorage.JOURNAL_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def sharded_to_yaml(dir_name: str) -> None:
+    """
+    Converts a sharded board back to the YAML layout.  The task files are
+    moved to tasks.bak so that tasks.yaml gets used again.
+    """
+    source = ShardedBoardStorage(dir_name)
+    epics_pool, tasks_pool, order = source.load()
+    source.load_completed(tasks_pool)
+    target = BoardStorage(dir_name)
+    target.epics_pool = epics_pool
+    target.save_snapshot(tasks_pool, order)
+
+    backup_name = source.path(ShardedBoardStorage.TASKS_DIR + ".bak")
+    shutil.rmtree(backup_name, ignore_errors=True)
+    os.rename(source.path(ShardedBoardStorage.TASKS_DIR), backup_name)
+
+
+if __name__ == "__main__":
+    # Usage: python -m impl.sharded_board (to-sharded|to-yaml) <board directory>
+    if len(sys.argv) != 3 or sys.argv[1] not in ("to-sharded", "to-yaml"):
+        print("Usage: python -m impl.sharded_board (to-sharded|to-yaml) <board directory>")
+        sys.exit(2)
+    if sys.argv[1] == "to-sharded":
+        yaml_to_sharded(sys.argv[2])
+    else:
+        sharded_to_yaml(sys.argv[2])
@@ -0,0 +1,421 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import date, datetime
+import os
+import sqlite3
+import sys
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from impl.board import BoardStorage, diff_order
+from impl.task import Epic, Task, TaskComment, TaskFilter, TaskStatus
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS epics (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    description TEXT NOT NULL,
+    epic TEXT COLLATE NOCASE,
+    deadline TEXT,
+    created TEXT NOT NULL,
+    closed TEXT,
+    -- Sort key of the task in the active list; NULL if the task is not there.
+    position REAL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (task_id, seq)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    task_id TEXT NOT NULL,
+    label TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (task_id, label)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS tasks_epic ON tasks (epic);
+CREATE INDEX IF NOT EXISTS tasks_deadline ON tasks (deadline);
+CREATE INDEX IF NOT EXISTS tasks_closed ON tasks (closed);
+CREATE INDEX IF NOT EXISTS tasks_position ON tasks (position);
+CREATE INDEX IF NOT EXISTS labels_label ON labels (label);
+"""
+
+
+def assign_positions(old_order: Sequence[str], new_order: Sequence[str],
+    positions: Dict[str, float]) -> Dict[str, float]:
+    """
+    Computes sort keys for the tasks in `new_order`, given the keys assigned
+    to `old_order` (in `positions`).  Tasks that didn't move relative to their
+    neighbors keep their keys; all other tasks get keys in between.  Returns
+    the keys that need to be written, i.e. only those that have changed.
+
+    This way, moving a task to the top of a 10k-item list updates a single row
+    rather than renumbering the entire list.
+    """
+    # Positions in `old_order` that are touched by the edits; everything else
+    # stays in place and keeps its key.
+    moved: Set[int] = set()
+    for start, end, ids in diff_order(old_order, new_order):
+        moved.update(range(start, end))
+    kept = set(task_id for i, task_id in enumerate(old_order) if i not in moved)
+
+    changed: Dict[str, float] = {}
+    run: List[str] = []
+    low = 0.0
+    for task_id in list(new_order) + [None]:    # type: ignore[list-item]   # None marks the end of the list
+        if task_id is not None and task_id not in kept:
+            run.append(task_id)
+            continue
+        if run:
+            high = positions[task_id] if task_id is not None else low + len(run) + 1
+            step = (high - low) / (len(run) + 1)
+            if step < 1e-6:
+                # We've split this gap too many times - time to renumber the
+                # entire list.
+                return dict((task_id, float(i + 1)) for i, task_id in enumerate(new_order))
+            for i, run_id in enumerate(run):
+                changed[run_id] = low + step * (i + 1)
+            run = []
+        if task_id is not None:
+            low = positions[task_id]
+
+    return changed
+
+
+class SqliteBoardStorage(BoardStorage):
+    """
+    An alternative board storage, keeping the entire board in a single SQLite
+    database (board.sqlite).  Unlike the YAML layout, every saved change is
+    a handful of single-row updates, and filters by epic or label can be
+    answered by the database indexes (see `prefilter`).
+
+    If a board directory contains both board.sqlite and the YAML files, the
+    database takes precedence.  Use `yaml_to_sqlite` and `sqlite_to_yaml` to
+    convert existing boards.
+    """
+
+    conn: Optional[sqlite3.Connection] = None
+    # Sort keys of the active tasks, as stored in the database
+    positions: Dict[str, float]
+
+    DB_FILE: ClassVar[str] = "board.sqlite"
+
+    def __init__(self, dir_name: str) -> None:
+        super().__init__(dir_name)
+        self.positions = {}
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Returns the connection, opening it if needed.  The connection is
+        shared with the background save thread, so the caller must hold
+        `lock` for as long as it uses the connection and its cursors.
+        """
+        with self.lock:
+            if self.conn is None:
+                try:
+                    os.mkdir(self.dir_name)
+                except FileExistsError:
+                    # It's ok for the directory to already exist
+                    pass
+                self.conn = sqlite3.connect(self.path(self.DB_FILE), check_same_thread=False)
+                self.conn.executescript(_SCHEMA)
+            return self.conn
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def load(self) -> Tuple[Dict[str, Epic], Dict[str, Task], List[str]]:
+        """
+        Reads the epics and the active tasks; completed tasks are read later
+        by `load_completed`.
+        """
+        with self.lock:
+            conn = self.connect()
+            epics_pool: Dict[str, Epic] = {}
+            for epic_id, name in conn.execute("SELECT id, name FROM epics"):
+                epics_pool[epic_id] = Epic(epic_id, name)
+            self.epics_pool = epics_pool
+
+            tasks_pool: Dict[str, Task] = {}
+            self.positions = {}
+            self.load_tasks(conn, "status = 'active'", tasks_pool)
+
+            order = sorted(self.positions, key=lambda task_id: self.positions[task_id])
+            self.saved_order = list(order)
+            return epics_pool, tasks_pool, order
+
+    def load_completed(self, tasks_pool: Dict[str, Task]) -> List[Task]:
+        with self.lock:
+            if self.completed_loaded:
+                return []
+            completed = self.load_tasks(self.connect(), "status <> 'active'", tasks_pool)
+            self.completed_loaded = True
+        completed.sort(key=lambda task: task.close_date or task.creation_date, reverse=True)
+        return completed
+
+    def watched_files(self) -> List[str]:
+        # SQLite takes care of concurrent access on its own
+        return []
+
+    def count_tasks(self, tasks_pool: Dict[str, Task]) -> Tuple[int, int]:
+        with self.lock:
+            active = sum(1 for task in tasks_pool.values() if task.status == TaskStatus.ACTIVE)
+            done = len(tasks_pool) - active
+            if not self.completed_loaded:
+                rows = self.connect().execute("SELECT id FROM tasks WHERE status <> 'active'")
+                done += sum(1 for (task_id,) in rows if task_id not in tasks_pool)
+            return active, done
+
+    def iter_completed_objects(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # The three tables are read side by side, ordered by task ID, so that
+        # only one task at a time is in memory.  A separate connection keeps
+        # the cursors away from the writes made through the main one.
+        conn = sqlite3.connect(self.path(self.DB_FILE))
+        try:
+            condition = "task_id IN (SELECT id FROM tasks WHERE status <> 'active')"
+            comments = conn.execute("SELECT task_id, date, text FROM comments WHERE " + condition
+                + " ORDER BY task_id, seq")
+            labels = conn.execute("SELECT task_id, label FROM labels WHERE " + condition
+                + " ORDER BY task_id, label")
+            next_comment = next(comments, None)
+            next_label = next(labels, None)
+            rows = conn.execute("SELECT id, status, summary, description, epic, deadline, created, closed "
+                "FROM tasks WHERE status <> 'active' ORDER BY id")
+            for task_id, status, summary, desc, epic, deadline, created, closed in rows:
+                obj: Dict[str, Any] = { "status": status, "created": created }
+                if closed is not None:
+                    obj["closed"] = closed
+                if deadline is not None:
+                    obj["deadline"] = deadline
+                task_labels = []
+                while next_label is not None and next_label[0] <= task_id:
+                    if next_label[0] == task_id:
+                        task_labels.append(next_label[1])
+                    next_label = next(labels, None)
+                if task_labels:
+                    obj["labels"] = " ".join(task_labels)
+                if epic is not None:
+                    obj["epic"] = epic
+                obj["desc"] = summary + ("\n" + desc if desc else "")
+                task_comments = []
+                while next_comment is not None and next_comment[0] <= task_id:
+                    if next_comment[0] == task_id:
+                        task_comments.append({ "date": next_comment[1], "text": next_comment[2] })
+                    next_comment = next(comments, None)
+                if task_comments:
+                    obj["comments"] = task_comments
+                yield task_id, obj
+        finally:
+            conn.close()
+
+    def load_tasks(self, conn: sqlite3.Connection, condition: str, tasks_pool: Dict[str, Task]) -> List[Task]:
+        """
+        Reads the tasks matching the SQL `condition` into `tasks_pool`, and
+        returns them.  Tasks already in the pool are left intact.  Must be
+        called with `lock` held, like everything that takes `conn`.
+        """
+        loaded: Dict[str, Task] = {}
+        rows = conn.execute("SELECT id, status, summary, description, epic, deadline, created, closed, position "
+            "FROM tasks WHERE " + condition)
+        for task_id, status, summary, desc, epic, deadline, created, closed, position in rows:
+            if task_id in tasks_pool:
+                continue
+            task = Task(summary, desc, task_id)
+            task.status = TaskStatus(status)
+            task.epic = self.epics_pool.get(epic) if epic is not None else None
+            task.deadline = date.fromisoformat(deadline) if deadline is not None else None
+            task.creation_date = datetime.fromisoformat(created)
+            task.close_date = datetime.fromisoformat(closed) if closed is not None else None
+            loaded[task_id] = task
+            if position is not None:
+                self.positions[task_id] = position
+
+        rows = conn.execute("SELECT task_id, date, text FROM comments "
+            "WHERE task_id IN (SELECT id FROM tasks WHERE " + condition + ") ORDER BY task_id, seq")
+        for task_id, comment_date, text in rows:
+            if task_id in loaded:
+                loaded[task_id].comments.append(TaskComment(text, datetime.fromisoformat(comment_date)))
+
+        rows = conn.execute("SELECT task_id, label FROM labels "
+            "WHERE task_id IN (SELECT id FROM tasks WHERE " + condition + ")")
+        for task_id, label in rows:
+            if task_id in loaded:
+                loaded[task_id].labels.append(label)
+        for task in loaded.values():
+            task.labels.sort()
+            task.mark_saved()
+
+        tasks_pool.update(loaded)
+        return list(loaded.values())
+
+    def write_task(self, conn: sqlite3.Connection, task: Task) -> None:
+        values = {
+            "id": task.id,
+            "status": task.status.value,
+            "summary": task.summary,
+            "desc": task.desc,
+            "epic": task.epic.id if task.epic is not None else None,
+            "deadline": task.deadline.isoformat() if task.deadline is not None else None,
+            "created": task.creation_date.isoformat(" ", "seconds"),
+            "closed": task.close_date.isoformat(" ", "seconds") if task.close_date is not None else None,
+        }
+        # Not using REPLACE or UPSERT here: REPLACE would reset the position,
+        # and UPSERT requires SQLite 3.24.
+        cur = conn.execute("UPDATE tasks SET status = :status, summary = :summary, description = :desc, "
+            "epic = :epic, deadline = :deadline, created = :created, closed = :closed WHERE id = :id", values)
+        if cur.rowcount == 0:
+            conn.execute("INSERT INTO tasks (id, status, summary, description, epic, deadline, created, closed) "
+                "VALUES (:id, :status, :summary, :desc, :epic, :deadline, :created, :closed)", values)
+
+        conn.execute("DELETE FROM comments WHERE task_id = ?", (task.id,))
+        conn.executemany("INSERT INTO comments (task_id, seq, date, text) VALUES (?, ?, ?, ?)",
+            [ (task.id, i, c.date.isoformat(" ", "seconds"), c.text) for i, c in enumerate(task.comments) ])
+        conn.execute("DELETE FROM labels WHERE task_id = ?", (task.id,))
+        conn.executemany("INSERT OR IGNORE INTO labels (task_id, label) VALUES (?, ?)",
+            [ (task.id, label) for label in task.labels ])
+
+    def write_order(self, conn: sqlite3.Connection, order: Sequence[str]) -> None:
+        order = list(order)
+        if order == self.saved_order:
+            return
+        changed = assign_positions(self.saved_order, order, self.positions)
+        removed = set(self.saved_order).difference(order)
+        conn.executemany("UPDATE tasks SET position = NULL WHERE id = ?", [ (task_id,) for task_id in removed ])
+        conn.executemany("UPDATE tasks SET position = ? WHERE id = ?",
+            [ (position, task_id) for task_id, position in changed.items() ])
+        for task_id in removed:
+            del self.positions[task_id]
+        self.positions.update(changed)
+        self.saved_order = order
+
+    def write_epics(self, conn: sqlite3.Connection) -> None:
+        conn.executemany("INSERT OR REPLACE INTO epics (id, name) VALUES (?, ?)",
+            [ (epic.id, epic.name) for epic in self.epics_pool.values() ])
+
+    def save_epics(self) -> None:
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                self.write_epics(conn)
+
+    def needs_snapshot(self) -> bool:
+        # Every change goes straight to the database
+        return False
+
+    def append_changes(self, tasks_pool: Dict[str, Task], order: Sequence[str], changed_ids: Iterable[str]) -> None:
+        # `tasks_pool` may only have the changed tasks; the changed ones that
+        # aren't there, and those that have left the active list without
+        # a change, have been deleted.  Otherwise they would stay active in
+        # the database, and load() would bring them back.
+        changed = set(changed_ids)
+        deleted = changed.union(set(self.saved_order).difference(order)).difference(tasks_pool)
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                for task_id in sorted(changed):
+                    if task_id in tasks_pool:
+                        self.write_task(conn, tasks_pool[task_id])
+                for table, column in (("tasks", "id"), ("comments", "task_id"), ("labels", "task_id")):
+                    conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [ (task_id,) for task_id in deleted ])
+                self.write_order(conn, order)
+
+    def save_snapshot(self, tasks_pool: Dict[str, Task], order: Sequence[str],
+        changed_ids: Iterable[str] = ()) -> None:
+        """Writes the entire board, e.g. when converting from YAML."""
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                self.write_epics(conn)
+                for task in tasks_pool.values():
+                    self.write_task(conn, task)
+                self.write_order(conn, order)
+
+    def prefilter(self, filter: TaskFilter, unsaved_ids: Iterable[str] = ()) -> None:
+        """
+        Narrows down the set of tasks `filter` needs to check, using the
+        database indexes for epic and label terms.  `unsaved_ids` must list
+        the tasks modified since the last save: the database doesn't know
+        about those changes yet, so they are always passed on to the filter.
+        """
+        if filter.always_pass or (filter.epic == "" and not filter.labels):
+            return
+
+        conditions = []
+        params: List[Any] = []
+        if filter.epic != "":
+            conditions.append("epic = ?")
+            params.append(filter.epic)
+        for label in filter.labels:
+            conditions.append("id IN (SELECT task_id FROM labels WHERE label = ?)")
+            params.append(label)
+
+        with self.lock:
+            rows = self.connect().execute("SELECT id FROM tasks WHERE " + " AND ".join(conditions), params)
+            filter.candidates = set(task_id for (task_id,) in rows)
+        filter.candidates.update(unsaved_ids)
+
+
+def yaml_to_sqlite(dir_name: str) -> None:
+    """
+    Copies a YAML board (including any changes still in its journal) into
+    board.sqlite in the same directory.  The YAML files are left intact, but
+    from now on the board will be loaded from the database.
+    """
+    source = BoardStorage(dir_name)
+    epics_pool, tasks_pool, order = source.load()
+    source.load_completed(tasks_pool)
+    # The database has no archive; archived tasks go along with the rest
+    source.find_archived(lambda task: True, tasks_pool)
+    target = SqliteBoardStorage(dir_name)
+    target.epics_pool = epics_pool
+    try:
+        target.save_snapshot(tasks_pool, order)
+    finally:
+        target.close()
+
+
+def sqlite_to_yaml(dir_name: str) -> None:
+    """
+    Writes a board stored in board.sqlite back to the YAML files, and renames
+    the database to board.sqlite.bak so that the YAML files get used again.
+    """
+    source = SqliteBoardStorage(dir_name)
+    try:
+        epics_pool, tasks_pool, order = source.load()
+        source.load_completed(tasks_pool)
+    finally:
+        source.close()
+
+    target = BoardStorage(dir_name)
+    target.epics_pool = epics_pool
+    target.save_snapshot(tasks_pool, order)
+    target.save_epics()
+
+    backup_name = source.path(SqliteBoardStorage.DB_FILE + ".bak")
+    try:
+        os.remove(backup_name)
+    except FileNotFoundError:
+        pass
+    os.rename(source.path(SqliteBoardStorage.DB_FILE), backup_name)
+
+
+if __name__ == "__main__":
+    # Usage: python -m impl.sqlite_board (to-sqlite|to-yaml) <board directory>
+    if len(sys.argv) != 3 or sys.argv[1] not in ("to-sqlite", "to-yaml"):
+        print("Usage: python -m impl.sqlite_board (to-sqlite|to-yaml) <board directory>")
+        sys.exit(2)
+    if sys.argv[1] == "to-sqlite":
+        yaml_to_sqlite(sys.argv[2])
+    else:
+        sqlite_to_yaml(sys.argv[2])
@@ -0,0 +1,96 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from contextlib import contextmanager
+import sys
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Taken as early as possible: this module is the first thing the app imports,
+# so everything else it imports counts towards startup.
+_START = time.perf_counter()
+
+
+class StartupProfile:
+    """
+    Records a timeline of the app startup: when each phase has started and
+    how long it took, in milliseconds since this module was imported.  Only
+    the first run of each phase is recorded, so that it's safe to wrap code
+    that also runs later on (e.g. loading a board).
+
+    When disabled, `phase` does nothing but yield, so it can stay in place
+    permanently.
+    """
+
+    enabled: bool
+    file_name: Optional[str]
+    # (name, start, end), in seconds since _START
+    phases: List[Tuple[str, float, float]]
+
+    OPTION = "--startup-profile"
+    DEFAULT_FILE = "WhaddaDoo_startup.log"
+
+    def __init__(self, enabled: bool = False, file_name: Optional[str] = None) -> None:
+        self.enabled = enabled
+        self.file_name = file_name
+        self.phases = []
+
+    @classmethod
+    def from_argv(cls, argv: Sequence[str]) -> "StartupProfile":
+        """
+        Enables the profile if `argv` has --startup-profile[=<file name>].
+        The app has no console on Windows, so the timeline goes to a file
+        (DEFAULT_FILE in the current directory) unless the file name is "-",
+        which means stderr.
+        """
+        for arg in argv[1:]:
+            if arg == cls.OPTION:
+                return StartupProfile(True, cls.DEFAULT_FILE)
+            if arg.startswith(cls.OPTION + "="):
+                file_name = arg[len(cls.OPTION) + 1:]
+                return StartupProfile(True, file_name if file_name != "-" else None)
+        return StartupProfile()
+
+    @staticmethod
+    def now() -> float:
+        return time.perf_counter() - _START
+
+    def is_recorded(self, name: str) -> bool:
+        return any(phase[0] == name for phase in self.phases)
+
+    def record(self, name: str, start: float, end: Optional[float] = None) -> None:
+        if self.enabled and not self.is_recorded(name):
+            self.phases.append((name, start, self.now() if end is None else end))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled or self.is_recorded(name):
+            yield
+            return
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def format(self) -> str:
+        lines = [ f"{'phase':<32} {'start, ms':>10} {'took, ms':>10}" ]
+        for (name, start, end) in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"{name:<32} {start * 1000:>10.1f} {(end - start) * 1000:>10.1f}")
+        lines.append(f"{'total':<32} {'':>10} {self.now() * 1000:>10.1f}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> None:
+        """Writes the timeline; does nothing if the profile is disabled."""
+        if not self.enabled:
+            return
+        text = self.format()
+        if self.file_name is None:
+            sys.stderr.write(text)
+            return
+        try:
+            with open(self.file_name, "a", encoding='utf8') as f:
+                f.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(text)
+        except OSError:
+            pass
@@ -1,13 +1,22 @@
 # Copyright © 2022 Vladimir Ein. All rights reserved.
 # License: http://opensource.org/licenses/MIT
 # 
-from dataclasses import dataclass
+from bisect import bisect_left
+from collections import deque
+import copy
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from enum import Enum
+import re
 import shlex
+import threading
 import time
-from typing import Any, Dict, List, Optional
-from yaml import Dumper, Node
+from typing import TYPE_CHECKING, Any, ClassVar, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from impl.fuzzy import similarity
+
+if TYPE_CHECKING:
+    from yaml import Dumper, Node
 
 
 class TaskStatus(Enum):
@@ -16,7 +25,7 @@ class TaskStatus(Enum):
     CANCELLED = "cancelled"
 
     @staticmethod
-    def yaml_representer(dumper: Dumper, data: "TaskStatus") -> Node:
+    def yaml_representer(dumper: "Dumper", data: "TaskStatus") -> "Node":
         return dumper.represent_str(data.value)
 
 
@@ -32,6 +41,18 @@ class Epic:
     name: str = ""
     # TODO: add a field for user-defined color (which we'll be using for labels
     # in the status cell)
+    # See Task.version
+    version: int = field(default=0, compare=False, repr=False)
+    saved_version: int = field(default=0, compare=False, repr=False)
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.saved_version
+
+    def set_name(self, name: str) -> None:
+        if self.name != name:
+            self.name = name
+            self.version += 1
 
     @staticmethod
     def from_plain_object(id: str, obj: Dict) -> "Epic":
@@ -47,13 +68,42 @@ class Epic:
 class TaskComment:
     date: datetime
     text: str = ""
+    # The text the cache was made for, the text in lower case, and its
+    # words (sorted and unique); see search_text().  Not stored on disk.
+    _search_cache: Optional[Tuple[str, str, List[str]]] = None
 
     def __init__(self, text_: str, date_: Optional[datetime] = None):
         self.text = text_
         self.date = date_ if date_ is not None else datetime.now()
 
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state.pop("_search_cache", None)
+        return state
+
+    def search_text(self) -> Tuple[str, List[str]]:
+        """
+        Returns the text of the comment prepared for search (see TaskFilter):
+        in lower case, and split into sorted unique words.  Tasks can have
+        hundreds of comments, so this is only done once per comment.
+        """
+        cache = self._search_cache
+        if cache is None or cache[0] is not self.text:
+            lcase_text = self.text.lower()
+            cache = self._search_cache = (self.text, lcase_text, sorted(set(lcase_text.split())))
+        return cache[1], cache[2]
+
+    def has_word_prefix(self, prefix: str) -> bool:
+        """Tells whether the comment has a word starting with `prefix` (in lower case)."""
+        words = self.search_text()[1]
+        pos = bisect_left(words, prefix)
+        return pos < len(words) and words[pos].startswith(prefix)
+
+    def contains(self, phrase: str) -> bool:
+        return phrase in self.search_text()[0]
+
     @staticmethod
-    def yaml_representer(dumper: Dumper, data: "TaskComment") -> Node:
+    def yaml_representer(dumper: "Dumper", data: "TaskComment") -> "Node":
         filtered = {
             "date": data.date,
             "text": data.text
@@ -65,8 +115,99 @@ _ID_BASE_TIMESTAMP = datetime(2022, 1, 1).timestamp()
 _ID_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
 
 
+def format_id(num_id: int) -> str:
+    """Converts a numeric task ID to its text form, see Task.set_numeric_id()."""
+    # Surprisingly enough, Python (as of 3.8) doesn't have a built-in
+    # to convert an integer to a base-36 string.
+    # For negative `num_id` (e.g. a dead battery in the system clock :) ),
+    # the code below will produce a "36's complement" number, but we have to
+    # restrict its length. Let's max it at 7 characters, which should be
+    # sufficient to span the next 24 years. Yes, the IDs will wrap-around
+    # every 24 years or so, but the chances of a clash with a 24-year-old
+    # task are negligibly low.
+    text_id = ""
+    while (num_id != 0 or text_id == "") and len(text_id) < 7:
+        text_id = _ID_DIGITS[num_id % 36] + text_id
+        num_id //= 36
+    return text_id
+
+
+class TaskIdAllocator:
+    """
+    Hands out task IDs based off the current time (in 1/100 of a second),
+    the same as they've always been, but never hands out the same ID twice:
+    if tasks are created faster than 100 per second, the IDs simply run ahead
+    of the clock for a while.  If given a task pool, it also skips the IDs
+    that are already taken there (e.g. by a task created by another instance
+    of the app in the same 1/100 of a second).
+
+    There's one allocator per process (see `Task.id_allocator`); it's safe
+    to use it from multiple threads.
+    """
+
+    # The last numeric ID handed out
+    last_id: int
+    lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def clock() -> int:
+        return int((time.time() - _ID_BASE_TIMESTAMP) * 100)
+
+    def allocate(self, pool: Optional[Dict[str, Any]] = None) -> str:
+        """Returns a new ID, not present in `pool` if it's given."""
+        return self.reserve(1, pool)[0]
+
+    def reserve(self, count: int, pool: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        Returns `count` new IDs at once, e.g. for an import.  The IDs are
+        consecutive unless some of them are taken in `pool`.
+        """
+        ids: List[str] = []
+        with self.lock:
+            num_id = max(self.clock(), self.last_id + 1)
+            while len(ids) < count:
+                text_id = format_id(num_id)
+                if pool is None or text_id not in pool:
+                    ids.append(text_id)
+                num_id += 1
+            self.last_id = num_id - 1
+        return ids
+
+
+@dataclass(frozen=True)
+class TaskSearchDoc:
+    """What TaskFilter looks at in a task, prepared for search."""
+    # Summary and description, in lower case
+    text: str
+    # The words of `text`, sorted and unique, so that words starting with
+    # a search term can be found by bisection
+    words: Tuple[str, ...]
+    # Labels in lower case
+    labels: Set[str]
+    # The words of the summary (the first line of `text`), unique; the
+    # ranked search values them above the rest
+    summary_words: Tuple[str, ...]
+
+    @staticmethod
+    def build(text: str, labels: Sequence[str]) -> "TaskSearchDoc":
+        lcase_text = text.lower()
+        return TaskSearchDoc(lcase_text, tuple(sorted(set(lcase_text.split()))),
+            set(label.lower() for label in labels), tuple(set(lcase_text.split("\n", 1)[0].split())))
+
+    def has_word_prefix(self, prefix: str) -> bool:
+        pos = bisect_left(self.words, prefix)
+        return pos < len(self.words) and self.words[pos].startswith(prefix)
+
+
 class Task:
 
+    # Shared by all tasks, so that the IDs are unique within the process
+    id_allocator: ClassVar[TaskIdAllocator] = TaskIdAllocator()
+
     id: str = ""
     status: TaskStatus = TaskStatus.ACTIVE
 
@@ -86,25 +227,84 @@ class Task:
     close_date: Optional[datetime] = None
     # TODO: think if we need the 'reopened' flag
 
-    def __init__(self, summary: str = "", desc: str = "") -> None:
-        self.gen_id()
+    # Incremented on every change made through the set_* methods (or touch()).
+    # The task needs to be saved while `version` differs from `saved_version`;
+    # a new task is dirty until it's saved for the first time.  Neither field
+    # is stored on disk.
+    version: int = 1
+    saved_version: int = 0
+    # The number of edits made to all tasks so far; lets cached search
+    # results tell whether they might be stale.
+    edit_count: ClassVar[int] = 0
+    # The latest edits, as (edit_count right after the edit, task), so that
+    # a search index can catch up with them without checking every task
+    # (see TaskIndex.catch_up).  The oldest ones fall off.
+    recent_edits: ClassVar[Deque[Tuple[int, "Task"]]] = deque(maxlen=4096)
+    # Built on the first search, and dropped whenever the summary, the
+    # description or the labels change; see search_doc().  Not stored on disk.
+    _search_doc: Optional[TaskSearchDoc] = None
+
+    def __init__(self, summary: str = "", desc: str = "", id: Optional[str] = None) -> None:
+        # Tasks read from disk already have an ID; we don't want them to use
+        # up the IDs of the allocator.
+        if id is None:
+            self.gen_id()
+        else:
+            self.id = id
         self.creation_date = datetime.now()
         self.comments = []
         self.labels = []
         self.summary = summary
         self.desc = desc
 
-    def gen_id(self) -> str:
+    def __getstate__(self) -> Dict[str, Any]:
+        # Tasks are pickled for the board cache, which only holds what's
+        # already on disk, so the unpickled tasks must not look modified.
+        state = self.__dict__.copy()
+        state.pop("version", None)
+        state.pop("saved_version", None)
+        state.pop("_search_doc", None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.saved_version = self.version
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.saved_version
+
+    def search_doc(self) -> TaskSearchDoc:
+        doc = self._search_doc
+        if doc is None:
+            doc = self._search_doc = TaskSearchDoc.build(self.summary + "\n" + self.desc, self.labels)
+        return doc
+
+    def touch(self) -> None:
+        """Marks the task as modified."""
+        self.version += 1
+        Task.edit_count += 1
+        Task.recent_edits.append((Task.edit_count, self))
+
+    def mark_saved(self, version: Optional[int] = None) -> None:
+        """
+        Records that `version` of the task (by default, the current one) has
+        been written to disk.  If the task has changed since that version was
+        taken, it remains dirty.
+        """
+        self.saved_version = self.version if version is None else version
+
+    def gen_id(self, pool: Optional[Dict[str, "Task"]] = None) -> str:
         """
-        Generates an ID for this task based off the current date and time.
-        Since the tasks are typically created manually, timestamp-based IDs
-        are going to be sufficiently unique; in case of automated procedures,
-        however, we'll need to improve this process.
+        Generates an ID for this task based off the current date and time
+        (see TaskIdAllocator).  If `pool` is given, the ID is guaranteed not
+        to be taken there; a new task should get its final ID this way right
+        before it's added to the pool.
 
         Returns the generated id (and assigns it to Task.id, too).
         """
-        ts = int((time.time() - _ID_BASE_TIMESTAMP) * 100)
-        return self.set_numeric_id(ts)
+        self.id = Task.id_allocator.allocate(pool)
+        return self.id
 
     def set_numeric_id(self, num_id: int) -> str:
         """
@@ -115,22 +315,47 @@ class Task:
         since the tasks created by the user are supposed to have timestamp-based
         IDs, generated by the Task object internally.
         """
-        # Surprisingly enough, Python (as of 3.8) doesn't have a built-in
-        # to convert an integer to a base-36 string.
-        # For negative `ts` (e.g. a dead battery in the system clock :) ),
-        # the code below will produce a "36's complement" number, but we have to
-        # restrict its length. Let's max it at 7 characters, which should be
-        # sufficient to span the next 24 years. Yes, the IDs will wrap-around
-        # every 24 years or so, but the chances of a clash with a 24-year-old
-        # task are negligibly low.
-        text_id = ""
-        while (num_id != 0 or text_id == "") and len(text_id) < 7:
-            text_id = _ID_DIGITS[num_id % 36] + text_id
-            num_id //= 36
-
-        self.id = text_id
-
-        return text_id
+        self.id = format_id(num_id)
+        return self.id
+
+    def snapshot(self) -> "Task":
+        """
+        Returns a copy of this task that can be serialized on another thread
+        while the original task is being edited.  Epics and comments are
+        shared with the original since they never change after creation.
+        """
+        task = Task.__new__(Task)
+        task.__dict__.update(self.__dict__)
+        task.comments = list(self.comments)
+        task.labels = list(self.labels)
+        return task
+
+    def has_same_contents(self, other: "Task") -> bool:
+        """Compares everything that gets saved to disk (except for the ID)."""
+        return self.status == other.status and self.summary == other.summary \
+            and self.desc == other.desc and self.deadline == other.deadline \
+            and (self.epic.id if self.epic else None) == (other.epic.id if other.epic else None) \
+            and self.labels == other.labels and self.creation_date == other.creation_date \
+            and self.close_date == other.close_date \
+            and [ (c.date, c.text) for c in self.comments ] == [ (c.date, c.text) for c in other.comments ]
+
+    def assign(self, other: "Task", epics: Dict[str, Epic]) -> None:
+        """
+        Copies the contents of `other` into this task, e.g. to apply a change
+        made outside of the app without replacing the Task object that the UI
+        is holding.  Epics are looked up in `epics` by ID.
+        """
+        self.status = other.status
+        self.summary = other.summary
+        self.desc = other.desc
+        self.deadline = other.deadline
+        self.epic = epics.get(other.epic.id) if other.epic is not None else None
+        self.labels = list(other.labels)
+        self.creation_date = other.creation_date
+        self.close_date = other.close_date
+        self.comments = list(other.comments)
+        self._search_doc = None
+        self.touch()
 
     def get_full_desc(self) -> str:
         return self.summary + ("\n" + self.desc if self.desc else "")
@@ -139,12 +364,44 @@ class Task:
     # a tuple might be more useful.
     def set_full_desc(self, desc: str) -> None:
         paragraphs = desc.split("\n")
-        self.summary = paragraphs[0]
-        self.desc = "\n".join(paragraphs[1:])
+        self.set_summary(paragraphs[0])
+        self.set_desc("\n".join(paragraphs[1:]))
+
+    def set_summary(self, summary: str) -> None:
+        if self.summary != summary:
+            self.summary = summary
+            self._search_doc = None
+            self.touch()
+
+    def set_desc(self, desc: str) -> None:
+        if self.desc != desc:
+            self.desc = desc
+            self._search_doc = None
+            self.touch()
+
+    def set_labels(self, labels: List[str]) -> None:
+        if self.labels != labels:
+            self.labels = labels
+            self._search_doc = None
+            self.touch()
+
+    def set_deadline(self, deadline: Optional[date]) -> None:
+        if self.deadline != deadline:
+            self.deadline = deadline
+            self.touch()
+
+    def set_epic(self, epic: Optional[Epic]) -> None:
+        if self.epic is not epic:
+            self.epic = epic
+            self.touch()
+
+    def add_comment(self, comment: TaskComment) -> None:
+        self.comments.append(comment)
+        self.touch()
 
 
     @staticmethod
-    def yaml_representer(dumper: Dumper, data: "Task") -> Node:
+    def yaml_representer(dumper: "Dumper", data: "Task") -> "Node":
         # Note: the order of keywords *does matter*. They will be written
         # to YAML in this order.
         filtered = {
@@ -192,8 +449,7 @@ class Task:
         Since Task can reference Epic objects, this method requires an epic pool
         to be populated beforehand, and passed to it in the epics parameter.
         """
-        task = Task()
-        task.id = id
+        task = Task(id=id)
         # TODO: validate the object and throw an exception (which?) if it's 
         # missing required fields. Or are all the fields optional?
         # TODO: this certainly can be beautified somehow. Also, it should
@@ -203,7 +459,10 @@ class Task:
             # caller? Then probably all other similar exceptions, too?
             task.status = TaskStatus(obj["status"])
         if "desc" in obj:
-            task.set_full_desc(obj["desc"])
+            # Not through set_full_desc(): a task read from disk hasn't been
+            # edited, and must not make the cached search results look stale
+            # (see `edit_count`).
+            task.summary, _, task.desc = obj["desc"].partition("\n")
         if "epic" in obj:
             task.epic = epics[obj["epic"]]
         if "comments" in obj:
@@ -230,6 +489,8 @@ class Task:
             d = Task.date_from_yaml(obj["deadline"])
             if d is not None:
                 task.deadline = d
+        # This is what we've got on disk
+        task.mark_saved()
         return task
     
     def set_status(self, new_status: TaskStatus) -> None:
@@ -243,28 +504,82 @@ class Task:
                 self.close_date = datetime.now()
 
             self.status = new_status
+            self.touch()
 
 
 class TaskFilter:
+    query: str
     always_pass: bool
     # Words are stored in lower case in order to perform case-insensitive search
     words: List[str]
     exact_phrases: List[str]
     epic: str = ""
     labels: List[str]
-
-    def __init__(self, query: str = "") -> None:
+    # Terms that must be found in the comments (c:word or c:"some phrase")
+    comment_words: List[str]
+    comment_phrases: List[str]
+    # If set, the task status must be one of these (status:done)
+    statuses: Optional[Set[TaskStatus]] = None
+    # Date field ("created", "closed" or "deadline"): the range of dates it
+    # must fall into, as date ordinals [first, end).  See parse_date_range.
+    date_ranges: Dict[str, Tuple[int, int]]
+    # Ranked search (the query starts with "~"): the words (not the phrases)
+    # forgive typos, and a task only needs one of them to match; `score`
+    # tells how well it matches.  See impl.fuzzy.
+    ranked: bool = False
+    # (term, word): impl.fuzzy.similarity, for the ranked search
+    similarities: Dict[Tuple[str, str], float]
+    # If set, only the tasks with these IDs can match the filter.  This is
+    # filled in by the board storage (or an index) when it can find the
+    # matching tasks faster than checking every task; the rest of the filter
+    # is still checked on these tasks.
+    candidates: Optional[Set[str]] = None
+
+    # Date keywords: whether the dates are mostly ahead of us (deadlines)
+    # rather than behind (everything else); that's where "<7d" looks.
+    DATE_KEYWORDS: ClassVar[Dict[str, bool]] = { "created": False, "closed": False, "deadline": True }
+    STATUS_VALUES: ClassVar[Dict[str, Set[TaskStatus]]] = {
+        "active": { TaskStatus.ACTIVE },
+        "done": { TaskStatus.DONE },
+        "cancelled": { TaskStatus.CANCELLED },
+        "closed": { TaskStatus.DONE, TaskStatus.CANCELLED },
+    }
+    # Open ends of date ranges
+    FIRST_DAY: ClassVar[int] = 0
+    END_DAY: ClassVar[int] = date.max.toordinal() + 1
+    # How much a word found in each part of the task is worth in the ranked search
+    SUMMARY_WEIGHT: ClassVar[float] = 2.0
+    DESC_WEIGHT: ClassVar[float] = 1.0
+    COMMENT_WEIGHT: ClassVar[float] = 0.5
+
+    def __init__(self, query: str = "", today: Optional[date] = None) -> None:
+        self.query = query
         self.always_pass = (query == "")
         # Query syntax:
         #   epic:<epicname> or e:epicname
         #   label:<labelname> or l:labelname
-        # maybe 'created'/'closed'? what about status?
+        #   comments:<word> or c:<word>, c:"<phrase>" - only search the comments
+        #   status:<active|done|cancelled|closed> or s:<...>
+        #   created:<dates>, closed:<dates>, deadline:<dates> - see
+        #       parse_date_range for what <dates> can be
+        #   ~ at the very start - ranked search (see `ranked`)
+        # Other words and phrases are looked for in the description and in
+        # the comments.
         # Quoted parts should be exact matches and should not be tied to word
         # boundaries.
         self.words = []
         self.exact_phrases = []
         self.labels = []
-        for word in shlex.split(query.lower(), posix=False):
+        self.comment_words = []
+        self.comment_phrases = []
+        self.date_ranges = {}
+        self.similarities = {}
+        if today is None:
+            today = date.today()
+        if query.startswith("~"):
+            self.ranked = True
+            query = query[1:]
+        for word in self.split_query(query.lower()):
             if word[0] == '"':
                 # All quoted parts should give an exact match (except they're
                 # still case-insensitive), but are not necessarily tied to 
@@ -282,41 +597,306 @@ class TaskFilter:
                         elif keyword == "l" or keyword == "label":
                             self.labels.append(value)
                             handled = True
+                        elif keyword == "c" or keyword == "comments":
+                            if value[0] == '"':
+                                self.comment_phrases.append(value[1:-1])
+                            else:
+                                self.comment_words.append(value)
+                            handled = True
+                        elif (keyword == "s" or keyword == "status") and value in self.STATUS_VALUES:
+                            statuses = self.STATUS_VALUES[value]
+                            self.statuses = statuses if self.statuses is None else self.statuses & statuses
+                            handled = True
+                        elif keyword in self.DATE_KEYWORDS:
+                            date_range = self.parse_date_range(value, self.DATE_KEYWORDS[keyword], today)
+                            if date_range is not None:
+                                # Several terms on the same field narrow it down
+                                first, end = self.date_ranges.get(keyword, (self.FIRST_DAY, self.END_DAY))
+                                self.date_ranges[keyword] = (max(first, date_range[0]), min(end, date_range[1]))
+                                handled = True
                 # If not a known keyword, just add the word to the search list
                 if not handled:
                     self.words.append(word)
 
-    def _text_match(self, text: str) -> bool:
-        lcase_text = text.lower()
+    @classmethod
+    def parse_date_range(cls, value: str, ahead: bool, today: date) -> Optional[Tuple[int, int]]:
+        """
+        Turns the value of a date term into a range of date ordinals
+        [first, end), or returns None if it doesn't look like a date.  The
+        value is a period, optionally preceded by a comparison (>, >=, <, <=);
+        or two periods separated with "..", either of which can be omitted.
+        A period is one of:
+
+        - a day, a month or a year: 2024-01-31, 2024-01, 2024;
+        - today, yesterday, tomorrow;
+        - last-week, last-month, last-year: that many days up to today
+          (including today);
+        - next-week, next-month: that many days starting with today;
+        - overdue: anything before today.
+
+        The value can also be a number of days, weeks, months (of 30 days) or
+        years (of 365 days) away from today: 7d, 2w, 3m, 1y.  It counts
+        forwards if `ahead`, and backwards otherwise, so that `deadline:<7d`
+        is due in less than a week (or overdue already), and `created:<7d`
+        has been created less than a week ago.  Without a comparison, it
+        means "<=".
+        """
+        if ".." in value:
+            start, finish = value.split("..", 1)
+            first = cls.parse_period(start, today) if start != "" else (cls.FIRST_DAY, cls.FIRST_DAY)
+            last = cls.parse_period(finish, today) if finish != "" else (cls.END_DAY, cls.END_DAY)
+            if first is None or last is None:
+                return None
+            return (first[0], last[1])
+
+        op = ""
+        for prefix in (">=", "<=", ">", "<"):
+            if value.startswith(prefix):
+                op = prefix
+                value = value[len(prefix):]
+                break
+
+        m = re.fullmatch(r"(\d+)([dwmy])", value)
+        if m is not None:
+            days = int(m.group(1)) * { "d": 1, "w": 7, "m": 30, "y": 365 }[m.group(2)]
+            now = today.toordinal()
+            # The near side of the distance includes today and everything
+            # beyond it
+            if ahead:
+                return { "<": (cls.FIRST_DAY, now + days), "<=": (cls.FIRST_DAY, now + days + 1),
+                    ">": (now + days + 1, cls.END_DAY), ">=": (now + days, cls.END_DAY) }[op or "<="]
+            return { "<": (now - days + 1, cls.END_DAY), "<=": (now - days, cls.END_DAY),
+                ">": (cls.FIRST_DAY, now - days), ">=": (cls.FIRST_DAY, now - days + 1) }[op or "<="]
+
+        period = cls.parse_period(value, today)
+        if period is None:
+            return None
+        first, end = period
+        return { "": (first, end), ">": (end, cls.END_DAY), ">=": (first, cls.END_DAY),
+            "<": (cls.FIRST_DAY, first), "<=": (cls.FIRST_DAY, end) }[op]
+
+    @classmethod
+    def parse_period(cls, value: str, today: date) -> Optional[Tuple[int, int]]:
+        """Returns the date ordinals [first, end) of a period (see parse_date_range)."""
+        now = today.toordinal()
+        named = {
+            "today": (now, now + 1),
+            "yesterday": (now - 1, now),
+            "tomorrow": (now + 1, now + 2),
+            "last-week": (now - 6, now + 1),
+            "last-month": (now - 29, now + 1),
+            "last-year": (now - 364, now + 1),
+            "next-week": (now, now + 7),
+            "next-month": (now, now + 30),
+            "overdue": (cls.FIRST_DAY, now),
+        }
+        if value in named:
+            return named[value]
+        m = re.fullmatch(r"(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?", value)
+        if m is None:
+            return None
+        year = int(m.group(1))
+        try:
+            if m.group(3) is not None:
+                day = date(year, int(m.group(2)), int(m.group(3))).toordinal()
+                return (day, day + 1)
+            if m.group(2) is not None:
+                month = int(m.group(2))
+                end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+                return (date(year, month, 1).toordinal(), end.toordinal())
+            return (date(year, 1, 1).toordinal(), date(year + 1, 1, 1).toordinal())
+        except ValueError:
+            # Not a valid date (or beyond year 9999)
+            return None
+
+    @staticmethod
+    def split_query(query: str) -> List[str]:
+        # In non-POSIX mode, shlex only recognizes quotes at the start of
+        # a word, so a keyword with a quoted value (c:"some phrase") comes out
+        # in pieces; these are glued back (with single spaces in between).
+        parts: List[str] = []
+        for word in shlex.split(query, posix=False):
+            if parts and parts[-1][0] != '"' and ':"' in parts[-1] and parts[-1].count('"') % 2 == 1:
+                parts[-1] += " " + word
+            else:
+                parts.append(word)
+        return parts
+
+    def without_candidates(self) -> "TaskFilter":
+        """
+        Returns the filter without `candidates` (a copy, unless there are
+        none), for checking the tasks that `candidates` have been found
+        without, e.g. those added to a list after the search.
+        """
+        if self.candidates is None:
+            return self
+        filter = copy.copy(self)
+        filter.candidates = None
+        return filter
+
+    def refines(self, other: "TaskFilter") -> bool:
+        """
+        Tells whether this filter is at least as strict as `other`, i.e.
+        every task that matches this filter also matches `other`: e.g. the
+        user has typed one more letter or one more term.  Then only the tasks
+        found by `other` need to be checked.  Candidates are not compared:
+        they never exclude a task that matches the rest of the filter.
+        """
+        if other.always_pass:
+            return True
+        if self.always_pass:
+            return False
+        # In the ranked search, any word can make a match, and typing on
+        # changes what's similar to the word; so the words must stay the same.
+        if (self.ranked or other.ranked) and (self.ranked != other.ranked or self.words != other.words):
+            return False
+        if other.epic != "" and other.epic != self.epic:
+            return False
+        if any(label not in self.labels for label in other.labels):
+            return False
+        if other.statuses is not None and (self.statuses is None or not self.statuses <= other.statuses):
+            return False
+        for (field, (first, end)) in other.date_ranges.items():
+            date_range = self.date_ranges.get(field)
+            if date_range is None or date_range[0] < first or date_range[1] > end:
+                return False
+        # A longer prefix of a word matches fewer tasks
+        if any(all(not w.startswith(word) for w in self.words) for word in other.words):
+            return False
+        if any(all(phrase not in p for p in self.exact_phrases) for phrase in other.exact_phrases):
+            return False
+        if any(all(not w.startswith(word) for w in self.comment_words) for word in other.comment_words):
+            return False
+        if any(all(phrase not in p for p in self.comment_phrases) for phrase in other.comment_phrases):
+            return False
+        return True
+
+    def _text_match(self, doc: TaskSearchDoc, comments: Sequence[TaskComment] = ()) -> bool:
+        # The comments are only looked into if the description doesn't have
+        # the term, which keeps tasks with lots of comments from slowing down
+        # the search (and each comment is converted to lowercase only once,
+        # see TaskComment.search_text).
         for phrase in self.exact_phrases:
-            if phrase not in lcase_text:
+            if phrase not in doc.text and not any(c.contains(phrase) for c in comments):
+                return False
+
+        if self.ranked:
+            if self.words and self._rank_score(doc, comments) == 0:
                 return False
+        else:
+            for word in self.words:
+                if not doc.has_word_prefix(word) and not any(c.has_word_prefix(word) for c in comments):
+                    return False
 
-        text_words = lcase_text.split()
-        for word in self.words:
-            # TODO: if search becomes too slow, optimize this piece.  Str.lower()
-            # is considered inefficient in this case. We can convert the starting
-            # portion to lowercase, using len(word) as the limit (but only when
-            # exact_phrases are empty and therefore text doesn't need an early
-            # conversion to lowercase).
-            # Hmm.. actually, we need to convert to lowercase right after split(),
-            # and use max of word lengths as the limit.
-            if all(not t.startswith(word) for t in text_words):
+        for phrase in self.comment_phrases:
+            if not any(c.contains(phrase) for c in comments):
+                return False
+        for word in self.comment_words:
+            if not any(c.has_word_prefix(word) for c in comments):
                 return False
 
         return True
 
+    def _similarity(self, term: str, word: str) -> float:
+        key = (term, word)
+        value = self.similarities.get(key)
+        if value is None:
+            value = self.similarities[key] = similarity(term, word)
+        return value
+
+    def _rank_score(self, doc: TaskSearchDoc, comments: Sequence[TaskComment] = ()) -> float:
+        # Each word of the query adds the best similarity among the words of
+        # the task, weighted by where that word is; the description and the
+        # comments are only looked into if they can improve on what's found.
+        total = 0.0
+        for term in self.words:
+            best = self.SUMMARY_WEIGHT * max((self._similarity(term, w) for w in doc.summary_words), default=0.0)
+            if best < self.DESC_WEIGHT:
+                best = max(best, self.DESC_WEIGHT * max((self._similarity(term, w) for w in doc.words), default=0.0))
+            if best < self.COMMENT_WEIGHT:
+                for c in comments:
+                    best = max(best, self.COMMENT_WEIGHT * max((self._similarity(term, w) for w in c.search_text()[1]),
+                        default=0.0))
+            total += best
+        return total
+
+    def score(self, task: Task) -> float:
+        """
+        How well `task` matches the filter, for putting the best matches
+        first (see impl.search.rank_matches); 0 if it doesn't match at all.
+        Only the ranked search tells good matches from poor ones; otherwise,
+        every match scores 1.
+        """
+        return self.score_fields(task.id, task.epic.id if task.epic is not None else None, task.search_doc(),
+            task.comments, task.status, task.creation_date, task.close_date, task.deadline)
+
+    def score_fields(self, task_id: str, epic_id: Optional[str], doc: TaskSearchDoc,
+        comments: Sequence[TaskComment] = (), status: TaskStatus = TaskStatus.ACTIVE,
+        created: Optional[date] = None, closed: Optional[date] = None, deadline: Optional[date] = None) -> float:
+        """Same as `score`, but for the fields of a task, the same as `match_fields`."""
+        if not self.always_pass and not self.match_fields(task_id, epic_id, doc, comments, status, created, closed,
+            deadline):
+            return 0.0
+        if not self.ranked or not self.words:
+            return 1.0
+        return self._rank_score(doc, comments)
+
     def match(self, task: Task) -> bool:
         if self.always_pass:
             return True
+        return self.match_fields(task.id, task.epic.id if task.epic is not None else None, task.search_doc(),
+            task.comments, task.status, task.creation_date, task.close_date, task.deadline)
+
+    def match_plain_object(self, task_id: str, obj: Dict[str, Any]) -> bool:
+        """
+        Same as `match`, but for a task as it's stored in YAML (see
+        Task.from_plain_object), so that stored tasks can be filtered without
+        building Task objects.
+        """
+        if self.always_pass:
+            return True
+        labels = obj.get("labels")
+        doc = TaskSearchDoc.build(str(obj.get("desc", "")), labels.split() if isinstance(labels, str) else [])
+        comments = [ TaskComment(str(c.get("text", "")), Task.datetime_from_yaml(c.get("date")))
+            for c in (obj.get("comments") or []) if isinstance(c, dict) ]
+        return self.match_fields(task_id, obj.get("epic"), doc, comments,
+            TaskStatus(obj.get("status", TaskStatus.ACTIVE.value)), Task.datetime_from_yaml(obj.get("created")),
+            Task.datetime_from_yaml(obj.get("closed")), Task.date_from_yaml(obj.get("deadline")))
+
+    def match_fields(self, task_id: str, epic_id: Optional[str], doc: TaskSearchDoc,
+        comments: Sequence[TaskComment] = (), status: TaskStatus = TaskStatus.ACTIVE,
+        created: Optional[date] = None, closed: Optional[date] = None, deadline: Optional[date] = None) -> bool:
+        if self.candidates is not None and task_id not in self.candidates:
+            return False
+
+        if self.statuses is not None and status not in self.statuses:
+            return False
+
+        # A task without the date never falls into a range.  Datetimes are
+        # compared by their date.
+        for (field, value) in (("created", created), ("closed", closed), ("deadline", deadline)):
+            date_range = self.date_ranges.get(field)
+            if date_range is not None and (value is None or not date_range[0] <= value.toordinal() < date_range[1]):
+                return False
 
         # If filtering by epic, we'll remove tasks that don't belong to an epic
-        if self.epic != "" and (task.epic is None or task.epic.id.lower() != self.epic):
+        if self.epic != "" and (epic_id is None or epic_id.lower() != self.epic):
             return False
 
         for label in self.labels:
-            if label not in [ task_label.lower() for task_label in task.labels ]:
+            if label not in doc.labels:
                 return False
         
-        # TODO: search in comments, too
-        return self._text_match(task.summary + "\n" + task.desc)
+        return self._text_match(doc, comments)
+
+    def find_comments(self, task: Task) -> List[int]:
+        """
+        Returns the positions of the comments of `task` that contain any of
+        the search terms, to show the user why the task has been found.
+        """
+        if self.always_pass:
+            return []
+        words = self.words + self.comment_words
+        phrases = self.exact_phrases + self.comment_phrases
+        return [ i for (i, c) in enumerate(task.comments)
+            if any(c.has_word_prefix(word) for word in words) or any(c.contains(phrase) for phrase in phrases) ]
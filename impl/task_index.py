@@ -0,0 +1,344 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from impl.fuzzy import max_typos, ngrams, similarity
+from impl.task import Task, TaskFilter, TaskStatus
+
+
+class TaskIndex:
+    """
+    An inverted index over the tasks of a board, used to find the tasks
+    matching a TaskFilter without checking every task: the IDs of the tasks
+    containing each word (in lower case, the same way `TaskFilter` splits
+    the text) in the description or in the comments, having each label,
+    belonging to each epic, and having each status.
+
+    The words are also kept in a sorted list, so that the words starting
+    with a search term (all search terms are prefixes) are found by
+    bisection; and the bigrams of the words are indexed, too, so that the
+    ranked search finds the words similar to a term (see impl.fuzzy) without
+    comparing it to every word.  The dates (creation, close and deadline) are
+    kept sorted as well, which makes date ranges cheap to look up no matter
+    how much history the board has.
+
+    The index is kept up to date by `catch_up`, which reindexes the tasks
+    edited since the last time (see Task.recent_edits) and indexes the ones
+    added to the pool (see `add`).  Tasks removed from the pool must be
+    passed to `remove`.  The first time, or if there have been too many edits
+    in between, the whole pool is checked by `refresh`.
+    """
+
+    # word: IDs of the tasks containing it
+    words: Dict[str, Set[str]]
+    # All keys of `words`, sorted
+    sorted_words: List[str]
+    # bigram: the keys of `words` having it
+    ngrams: Dict[str, Set[str]]
+    # label/epic ID in lower case: IDs of the tasks
+    labels: Dict[str, Set[str]]
+    epics: Dict[str, Set[str]]
+    statuses: Dict[TaskStatus, Set[str]]
+    # Date fields, in the same order as in the index entries (see task_keys)
+    DATE_FIELDS = ("created", "closed", "deadline")
+    # Date field: (date ordinal, task ID) for every task having that date, sorted
+    dates: Dict[str, List[Tuple[int, str]]]
+    # ID: (the task object, its version, and the keys it's been indexed under:
+    # words, labels, epic, status, date ordinals)
+    indexed: Dict[str, Tuple[Task, int, Set[str], Set[str], Optional[str], TaskStatus, Tuple[Optional[int], ...]]]
+    # Tasks added to the pool and not indexed yet; see `add`
+    pending: Dict[str, Task]
+    # Task.edit_count as of the last catch_up; -1 if the index has never
+    # been filled
+    edit_count: int = -1
+    # IDs of the tasks that have been edited or added since they were last
+    # saved, and maybe some that have been saved since; the app uses it to
+    # find the unsaved tasks without checking every task.
+    edited: Set[str]
+
+    def __init__(self) -> None:
+        self.words = {}
+        self.sorted_words = []
+        self.ngrams = {}
+        self.labels = {}
+        self.epics = {}
+        self.statuses = {}
+        self.dates = dict((field, []) for field in self.DATE_FIELDS)
+        self.indexed = {}
+        self.pending = {}
+        self.edited = set()
+
+    @staticmethod
+    def task_keys(task: Task) -> Tuple[Set[str], Set[str], Optional[str], TaskStatus, Tuple[Optional[int], ...]]:
+        doc = task.search_doc()
+        words = set(doc.words)
+        for comment in task.comments:
+            words.update(comment.search_text()[1])
+        labels = set(doc.labels)
+        epic = task.epic.id.lower() if task.epic is not None else None
+        days = tuple(d.toordinal() if d is not None else None
+            for d in (task.creation_date, task.close_date, task.deadline))
+        return words, labels, epic, task.status, days
+
+    def update(self, task: Task) -> None:
+        """Indexes a new task, or updates the entries of a task that's been changed."""
+        if task.dirty:
+            self.edited.add(task.id)
+        entry = self.indexed.get(task.id)
+        if entry is not None and entry[0] is task and entry[1] == task.version:
+            return
+        words, labels, epic, status, days = self.task_keys(task)
+        if entry is not None:
+            old_words, old_labels, old_epic, old_status, old_days = entry[2:]
+        else:
+            old_words, old_labels, old_epic, old_status, old_days = set(), set(), None, None, (None,) * len(days)
+        # Only the keys that have actually changed are touched; most edits
+        # change a couple of words, if any.
+        for word in old_words - words:
+            self._remove_word(word, task.id)
+        for word in words - old_words:
+            self._add_word(word, task.id)
+        for label in old_labels - labels:
+            self._remove_key(self.labels, label, task.id)
+        for label in labels - old_labels:
+            self.labels.setdefault(label, set()).add(task.id)
+        if epic != old_epic:
+            if old_epic is not None:
+                self._remove_key(self.epics, old_epic, task.id)
+            if epic is not None:
+                self.epics.setdefault(epic, set()).add(task.id)
+        if status != old_status:
+            if old_status is not None:
+                self._remove_key(self.statuses, old_status, task.id)
+            self.statuses.setdefault(status, set()).add(task.id)
+        for (field, day, old_day) in zip(self.DATE_FIELDS, days, old_days):
+            if day != old_day:
+                if old_day is not None:
+                    self._remove_date(field, old_day, task.id)
+                if day is not None:
+                    insort(self.dates[field], (day, task.id))
+        self.indexed[task.id] = (task, task.version, words, labels, epic, status, days)
+
+    def add(self, task: Task) -> None:
+        """Notes a task that's been added to the pool; it's indexed on the next catch_up."""
+        self.pending[task.id] = task
+
+    def remove(self, task_id: str) -> None:
+        self.pending.pop(task_id, None)
+        self.edited.discard(task_id)
+        entry = self.indexed.pop(task_id, None)
+        if entry is None:
+            return
+        for word in entry[2]:
+            self._remove_word(word, task_id)
+        for label in entry[3]:
+            self._remove_key(self.labels, label, task_id)
+        if entry[4] is not None:
+            self._remove_key(self.epics, entry[4], task_id)
+        self._remove_key(self.statuses, entry[5], task_id)
+        for (field, day) in zip(self.DATE_FIELDS, entry[6]):
+            if day is not None:
+                self._remove_date(field, day, task_id)
+
+    def refresh(self, tasks_pool: Dict[str, Task]) -> None:
+        """
+        Brings the index in line with `tasks_pool`: indexes the tasks that
+        are new or have changed, and drops the ones that are gone.  Every
+        edit goes through Task.touch(), so unchanged tasks cost a version
+        check each.
+        """
+        self.edit_count = Task.edit_count
+        self.pending = {}
+        for task in tasks_pool.values():
+            self.update(task)
+        if len(self.indexed) > len(tasks_pool):
+            for task_id in [ k for k in self.indexed if k not in tasks_pool ]:
+                self.remove(task_id)
+
+    def catch_up(self, tasks_pool: Dict[str, Task]) -> None:
+        """
+        Indexes the tasks added to `tasks_pool` since the last call, and
+        reindexes the ones edited since then, taking them from
+        Task.recent_edits; only falls back to `refresh` if some of the edits
+        have already fallen off it, or if the index has missed a change to
+        the pool.  Edits are expected to be made on the same thread.
+        """
+        edits = list(Task.recent_edits)
+        if self.edit_count < 0 or (edits and edits[0][0] > self.edit_count + 1):
+            self.refresh(tasks_pool)
+            return
+        for task in self.pending.values():
+            if tasks_pool.get(task.id) is task:
+                self.update(task)
+        self.pending = {}
+        # Most of the edits are to the tasks of the pool; the rest belong to
+        # other boards, or to tasks that have been loaded or removed since.
+        for (count, task) in reversed(edits):
+            if count <= self.edit_count:
+                break
+            if tasks_pool.get(task.id) is task:
+                self.update(task)
+        if edits:
+            self.edit_count = max(self.edit_count, edits[-1][0])
+        if len(self.indexed) != len(tasks_pool):
+            self.refresh(tasks_pool)
+
+    def _add_word(self, word: str, task_id: str) -> None:
+        ids = self.words.get(word)
+        if ids is None:
+            ids = self.words[word] = set()
+            insort(self.sorted_words, word)
+            for gram in ngrams(word):
+                self.ngrams.setdefault(gram, set()).add(word)
+        ids.add(task_id)
+
+    def _remove_word(self, word: str, task_id: str) -> None:
+        ids = self.words[word]
+        ids.discard(task_id)
+        if not ids:
+            del self.words[word]
+            del self.sorted_words[bisect_left(self.sorted_words, word)]
+            for gram in ngrams(word):
+                self._remove_key(self.ngrams, gram, word)
+
+    @staticmethod
+    def _remove_key(postings: Dict, key: Any, item: str) -> None:
+        items = postings[key]
+        items.discard(item)
+        if not items:
+            del postings[key]
+
+    def _remove_date(self, field: str, day: int, task_id: str) -> None:
+        keys = self.dates[field]
+        del keys[bisect_left(keys, (day, task_id))]
+
+    def find_prefix(self, prefix: str) -> Set[str]:
+        """Returns the IDs of the tasks that have a word starting with `prefix`."""
+        found: Set[str] = set()
+        pos = bisect_left(self.sorted_words, prefix)
+        while pos < len(self.sorted_words) and self.sorted_words[pos].startswith(prefix):
+            found |= self.words[self.sorted_words[pos]]
+            pos += 1
+        return found
+
+    def find_similar_words(self, term: str) -> List[str]:
+        """
+        Returns the indexed words that the ranked search takes for `term`
+        despite typos (see impl.fuzzy.similarity).  Words starting with the
+        term itself are not necessarily included; see find_prefix.
+        """
+        limit = max_typos(term)
+        if limit == 0:
+            return []
+        # The word, or its start, has these bigrams, except for the ones
+        # spoiled by typos (at most 3 per typo); so the words sharing fewer
+        # bigrams with the term can't be similar enough.
+        grams = ngrams(term, whole=False)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for word in self.ngrams.get(gram, ()):
+                shared[word] = shared.get(word, 0) + 1
+        least = len(grams) - 3 * limit
+        return [ word for (word, count) in shared.items()
+            if count >= least and len(word) >= len(term) - limit and similarity(term, word) > 0 ]
+
+    def find_similar(self, term: str) -> Set[str]:
+        """Returns the IDs of the tasks having a word that the ranked search takes for `term` (see impl.fuzzy.similarity)."""
+        found = self.find_prefix(term)
+        for word in self.find_similar_words(term):
+            found |= self.words[word]
+        return found
+
+    def find_phrase(self, phrase: str) -> Optional[Set[str]]:
+        """
+        Narrows down the tasks that can contain `phrase`, or returns None if
+        the index can't tell.  A phrase can start in the middle of a word, but
+        every word after a space in it must begin a word of the task, and
+        the words in the middle must be present as a whole.  The phrase itself
+        still has to be checked on the tasks found.
+        """
+        parts = phrase.split()
+        if len(parts) < 2:
+            return None
+        ids = self.find_prefix(parts[-1])
+        for word in parts[1:-1]:
+            ids &= self.words.get(word, set())
+        return ids
+
+    def find_dates(self, field: str, first: int, end: int) -> Tuple[int, int]:
+        """Returns the slice of dates[field] that falls into the range of date ordinals [first, end)."""
+        keys = self.dates[field]
+        return bisect_left(keys, (first,)), bisect_left(keys, (end,))
+
+    def find(self, filter: TaskFilter) -> Optional[Set[str]]:
+        """
+        Returns the IDs of the indexed tasks that can match `filter`, or None
+        if the filter doesn't narrow anything down.  Words, labels, epics,
+        statuses and dates are answered by the index alone; exact phrases
+        only partially, so `filter.match` must still be checked on the result.
+        """
+        if filter.always_pass:
+            return None
+        # Smaller sets go first so that the intersection shrinks early
+        sets: List[Set[str]] = []
+        if filter.epic != "":
+            sets.append(self.epics.get(filter.epic, set()))
+        sets.extend(self.labels.get(label, set()) for label in filter.labels)
+        if filter.statuses is not None:
+            sets.append(set().union(*(self.statuses.get(status, set()) for status in filter.statuses)))
+        # Comment terms are looked up as any other words: the index doesn't
+        # tell where a word comes from, so the filter has to check that.
+        sets.extend(self.find_prefix(word) for word in filter.comment_words)
+        if not filter.ranked:
+            sets.extend(self.find_prefix(word) for word in filter.words)
+        elif filter.words:
+            # Any of the words will do
+            sets.append(set().union(*(self.find_similar(word) for word in filter.words)))
+        for phrase in filter.exact_phrases + filter.comment_phrases:
+            ids = self.find_phrase(phrase)
+            if ids is not None:
+                sets.append(ids)
+        # Date ranges are only turned into sets if that's where the smallest
+        # set comes from; otherwise, the tasks found by everything else are
+        # checked against the dates they've been indexed with.
+        # (size, field index, first, end, slice of dates[field])
+        ranges = []
+        for (field, (first, end)) in filter.date_ranges.items():
+            lo, hi = self.find_dates(field, first, end)
+            ranges.append((hi - lo, self.DATE_FIELDS.index(field), first, end, lo, hi))
+        if not sets and not ranges:
+            return None
+        sets.sort(key=len)
+        ranges.sort()
+        if ranges and (not sets or ranges[0][0] < len(sets[0])):
+            (_, i, _, _, lo, hi) = ranges.pop(0)
+            found = set(task_id for (_, task_id) in self.dates[self.DATE_FIELDS[i]][lo:hi])
+        else:
+            found = set(sets.pop(0))
+        for ids in sets:
+            if not found:
+                break
+            found &= ids
+        for (_, i, first, end, _, _) in ranges:
+            found = set(task_id for task_id in found if self._day_in_range(task_id, i, first, end))
+        return found
+
+    def _day_in_range(self, task_id: str, field_index: int, first: int, end: int) -> bool:
+        day = self.indexed[task_id][6][field_index]
+        return day is not None and first <= day < end
+
+    def narrow(self, filter: TaskFilter, tasks_pool: Dict[str, Task]) -> None:
+        """
+        Catches up with the changes to `tasks_pool` and sets
+        `filter.candidates` to the tasks that can match `filter` (keeping
+        whatever the storage has already put there).  Only tasks in the pool
+        are indexed, so the filter must not be used on any other tasks
+        afterwards.
+        """
+        self.catch_up(tasks_pool)
+        found = self.find(filter)
+        if found is None:
+            return
+        filter.candidates = found if filter.candidates is None else filter.candidates & found
@@ -0,0 +1,212 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from dataclasses import dataclass, field
+from enum import Enum
+import os
+import sys
+from typing import Dict, List, Optional, Sequence
+
+from impl.board import BoardStorage
+from impl.task import Epic, Task, TaskComment, TaskStatus
+
+
+class _Inotify:
+    """A minimal non-blocking wrapper around the Linux inotify API."""
+    fd: int
+
+    # From <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+
+    @staticmethod
+    def create(dir_names: Sequence[str]) -> Optional["_Inotify"]:
+        """Starts watching `dir_names`; returns None if inotify is not available."""
+        if not sys.platform.startswith("linux"):
+            return None
+        # Not imported at the module level since the watcher is only
+        # created once a board is shown
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(_Inotify.IN_NONBLOCK | _Inotify.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        mask = _Inotify.IN_MODIFY | _Inotify.IN_CLOSE_WRITE | _Inotify.IN_MOVED_FROM \
+            | _Inotify.IN_MOVED_TO | _Inotify.IN_CREATE | _Inotify.IN_DELETE
+        for dir_name in dir_names:
+            if libc.inotify_add_watch(fd, os.fsencode(dir_name), mask) < 0:
+                os.close(fd)
+                return None
+        return _Inotify(fd)
+
+    def has_events(self) -> bool:
+        """Reads all pending events, and tells whether there were any."""
+        found = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            # We don't care what exactly has happened; the storage will
+            # compare the files against what it has written.
+            found = True
+        return found
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class BoardWatcher:
+    """
+    Detects changes made to the board files outside of the app.  It's meant
+    to be polled on a timer: with inotify (Linux), a poll is just a read()
+    that returns nothing most of the time; elsewhere, it compares the sizes
+    and timestamps of the board files against what the storage has left
+    there.  Either way, the storage has the final say, so that our own saves
+    are not reported.
+    """
+
+    storage: BoardStorage
+    inotify: Optional[_Inotify] = None
+    # If inotify has reported an event that we couldn't confirm yet (e.g.
+    # a save was in progress)
+    pending: bool = False
+
+    def __init__(self, storage: BoardStorage) -> None:
+        self.storage = storage
+        dir_names = set(os.path.dirname(storage.path(name)) for name in storage.watched_files())
+        if dir_names:
+            self.inotify = _Inotify.create([ d for d in dir_names if os.path.isdir(d) ])
+
+    def check(self) -> bool:
+        """Tells whether the board has been changed by someone else since the last check."""
+        if not self.storage.watched_files():
+            return False
+        if self.inotify is not None:
+            if self.inotify.has_events():
+                self.pending = True
+            if not self.pending:
+                return False
+            self.pending = False
+        # Not waiting for a save in progress: we're on the UI thread.  The
+        # files will be looked at again on the next check.
+        changed = self.storage.has_external_changes(wait=False)
+        if changed is None:
+            self.pending = True
+            return False
+        return changed
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+class ConflictPolicy(Enum):
+    # Our version wins; theirs will be overwritten on the next save
+    KEEP_MINE = "mine"
+    # Their version wins; our unsaved edits to the task are lost
+    KEEP_THEIRS = "theirs"
+    # Our version wins, but their description is added to the task as
+    # a comment, so that nothing gets lost
+    KEEP_BOTH = "both"
+
+
+@dataclass
+class MergeResult:
+    added: List[Task] = field(default_factory=list)
+    removed: List[Task] = field(default_factory=list)
+    updated: List[Task] = field(default_factory=list)
+    # Tasks modified both by us (and not saved yet) and by someone else
+    conflicts: List[Task] = field(default_factory=list)
+    # The new order of active tasks
+    order: List[str] = field(default_factory=list)
+
+
+def merge_external_changes(tasks_pool: Dict[str, Task], epics_pool: Dict[str, Epic], local_order: Sequence[str],
+    base_order: Sequence[str], disk_pool: Dict[str, Task], disk_order: Sequence[str],
+    policy: ConflictPolicy = ConflictPolicy.KEEP_BOTH, closed_pool: Optional[Dict[str, Task]] = None) -> MergeResult:
+    """
+    Applies the board as it is on disk (`disk_pool`, `disk_order`) to the
+    board in memory (`tasks_pool` and `local_order`, the IDs of active tasks),
+    touching only the tasks that differ.  Tasks in the pool are updated in
+    place.
+
+    A task that has no unsaved changes simply takes the version from disk.
+    If it has, that's a conflict, resolved according to `policy`.  Similarly,
+    the order from disk is only taken if the local order is still
+    `base_order`, i.e. the order we've last saved or loaded.
+
+    Completed tasks that haven't been loaded yet are not in `disk_pool`, so
+    only active tasks can be detected as removed.  An active task that has
+    been closed on disk is in `disk_pool` while its change is in the journal;
+    once a snapshot has moved it to the shards, it must be found there (see
+    BoardStorage.find_completed) and passed in `closed_pool`, or else it's
+    taken for removed.
+    """
+    if closed_pool is None:
+        closed_pool = {}
+    result = MergeResult()
+    for (k, disk_task) in list(disk_pool.items()) + list(closed_pool.items()):
+        if disk_task.epic is not None and disk_task.epic.id not in epics_pool:
+            epics_pool[disk_task.epic.id] = disk_task.epic
+
+        task = tasks_pool.get(k)
+        if task is None:
+            task = disk_task
+            task.epic = epics_pool.get(task.epic.id) if task.epic is not None else None
+            tasks_pool[k] = task
+            result.added.append(task)
+        elif task.has_same_contents(disk_task):
+            continue
+        elif not task.dirty or policy == ConflictPolicy.KEEP_THEIRS:
+            if task.dirty:
+                result.conflicts.append(task)
+            task.assign(disk_task, epics_pool)
+            task.mark_saved()
+            result.updated.append(task)
+        else:
+            result.conflicts.append(task)
+            if policy == ConflictPolicy.KEEP_BOTH:
+                task.add_comment(TaskComment("Changed outside of WhaddaDoo:\n" + disk_task.get_full_desc()))
+                result.updated.append(task)
+
+    for (k, task) in list(tasks_pool.items()):
+        # Unsaved tasks are not on disk yet; nor are their removals, so these
+        # are kept.
+        if k not in disk_pool and k not in closed_pool and task.status == TaskStatus.ACTIVE and not task.dirty:
+            del tasks_pool[k]
+            result.removed.append(task)
+
+    active_ids = set(k for (k, task) in tasks_pool.items() if task.status == TaskStatus.ACTIVE)
+    if list(local_order) == list(base_order) or policy == ConflictPolicy.KEEP_THEIRS:
+        order = [ k for k in disk_order if k in active_ids ]
+        # Tasks created here and not saved yet go to the top, the same way
+        # they are added.
+        listed = set(order)
+        new_ids = [ k for k in local_order if k in active_ids and k not in listed ]
+        order = new_ids + order
+    else:
+        order = [ k for k in local_order if k in active_ids ]
+    listed = set(order)
+    # Tasks added (or reopened) on disk and missing from the order above
+    order = [ k for k in disk_order if k in active_ids and k not in listed ] + order
+    listed = set(order)
+    order = order + [ k for k in tasks_pool if k in active_ids and k not in listed ]
+    result.order = order
+    return result
@@ -0,0 +1,67 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import date, datetime
+import os
+
+from impl.board import BoardStorage
+from impl.task import Task, TaskFilter, TaskStatus
+
+
+def make_board(dir_name: str) -> BoardStorage:
+    storage = BoardStorage(dir_name)
+    tasks_pool = {}
+    for (i, (summary, closed)) in enumerate([ ("Buy apples", datetime(2020, 1, 5)), ("Buy pears", datetime(2020, 1, 9)),
+        ("Eat apples", datetime(2020, 2, 3)), ("Recent apples", datetime.now()) ]):
+        task = Task(summary, "", f"d{i}")
+        task.status = TaskStatus.DONE
+        task.close_date = closed
+        tasks_pool[task.id] = task
+    tasks_pool["t0"] = Task("Active apples", "", "t0")
+    storage.save_snapshot(tasks_pool, [ "t0" ])
+    storage.load()
+    return storage
+
+
+def test_archive_completed(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    assert storage.archive_completed(date(2020, 3, 1)) == 3
+    assert storage.list_shards() == [ datetime.now().strftime("%Y-%m") ]
+    assert storage.list_archives() == [ "2020-02.yaml.xz", "2020-01.yaml.xz" ]
+    assert os.path.exists(storage.archive_path("2020-01.ids"))
+    # Nothing more to archive
+    assert storage.archive_completed(date(2020, 3, 1)) == 0
+
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, _ = storage.load()
+    assert storage.count_tasks(tasks_pool) == (1, 4)
+    assert [ task.id for task in storage.load_completed(tasks_pool) ] == [ "d3" ]
+    found = storage.find_archived(lambda task: "apples" in task.summary, tasks_pool)
+    assert [ task.id for task in found ] == [ "d2", "d0" ]
+    assert tasks_pool["d0"].summary == "Buy apples"
+
+
+def test_search_archived(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    storage.archive_completed(date(2020, 3, 1))
+
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, _ = storage.load()
+    storage.load_completed(tasks_pool)
+    assert [ task.id for task in storage.search_archived(TaskFilter("apples"), tasks_pool) ] == [ "d2", "d0" ]
+    assert [ task.id for task in storage.search_archived(TaskFilter("apples"), { "d2" }) ] == [ "d0" ]
+    # The pool is left alone
+    assert "d0" not in tasks_pool
+
+    # A task edited after being pulled from the archive is stored in the
+    # shards again, and its archived copy is no longer found
+    task = storage.find_archived(lambda task: task.id == "d0", tasks_pool)[0]
+    task.set_summary("Buy plums")
+    storage.save_snapshot(tasks_pool, [ "t0" ], [ "d0" ])
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, _ = storage.load()
+    assert [ task.id for task in storage.search_archived(TaskFilter("apples"), tasks_pool) ] == [ "d2" ]
+    storage.load_completed(tasks_pool)
+    assert tasks_pool["d0"].summary == "Buy plums"
@@ -0,0 +1,71 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import os
+import shutil
+
+from impl.board import BoardStorage
+from impl.catalog import BoardCatalog
+from impl.task import Task, TaskStatus
+
+
+def make_board(dir_name: str, active: int, done: int) -> None:
+    tasks_pool = dict((f"t{i}", Task(f"Task {i}", "", f"t{i}")) for i in range(active + done))
+    for i in range(active, active + done):
+        tasks_pool[f"t{i}"].set_status(TaskStatus.DONE)
+    BoardStorage(dir_name).save_snapshot(tasks_pool, [ f"t{i}" for i in range(active) ])
+
+
+def test_catalog_counts_and_new_boards(tmp_path) -> None:
+    make_board(str(tmp_path / "work"), 2, 1)
+    infos = BoardCatalog(str(tmp_path)).refresh()
+    assert [ (info.name, info.active_count, info.done_count) for info in infos ] == [ ("work", 2, 1) ]
+
+    make_board(str(tmp_path / "home"), 1, 0)
+    infos = BoardCatalog(str(tmp_path)).refresh()
+    assert [ (info.name, info.active_count) for info in infos ] == [ ("home", 1), ("work", 2) ]
+
+
+def test_catalog_save_is_atomic(tmp_path) -> None:
+    make_board(str(tmp_path / "work"), 1, 0)
+    catalog = BoardCatalog(str(tmp_path))
+    catalog.refresh()
+    # Only the catalog itself and the board; no temporary files are left
+    assert sorted(os.listdir(tmp_path)) == [ "boards.yaml", "work" ]
+
+    # Our own rename of boards.yaml doesn't look like a change to the list of boards
+    reloaded = BoardCatalog(str(tmp_path))
+    reloaded.load()
+    assert reloaded.dir_mtime_ns == os.stat(tmp_path).st_mtime_ns
+    assert list(reloaded.boards) == [ "work" ]
+
+    # A broken catalog is rebuilt rather than trusted
+    with open(tmp_path / "boards.yaml", "w") as f:
+        f.write("version: [")
+    assert [ info.name for info in BoardCatalog(str(tmp_path)).refresh() ] == [ "work" ]
+
+
+def test_catalog_notices_changed_boards(tmp_path) -> None:
+    make_board(str(tmp_path / "work"), 2, 1)
+    make_board(str(tmp_path / "home"), 1, 0)
+    info = BoardCatalog(str(tmp_path)).refresh()[1]
+    content_hash = info.content_hash
+
+    # Someone else has written to the board
+    make_board(str(tmp_path / "work"), 3, 2)
+    mtime_ns = info.mtime_ns + 10**9
+    os.utime(tmp_path / "work", ns=(mtime_ns, mtime_ns))
+    catalog = BoardCatalog(str(tmp_path))
+    # The stale board can be left for the caller to update
+    assert [ (info.active_count, info.done_count) for info in catalog.refresh(rebuild_stale=False) ] == \
+        [ (1, 0), (2, 1) ]
+    storage = BoardStorage(str(tmp_path / "work"))
+    _, tasks_pool, _ = storage.load()
+    info = catalog.update("work", storage, tasks_pool)
+    assert (info.active_count, info.done_count) == (3, 2)
+    assert info.content_hash != content_hash
+    assert not catalog.is_stale(info)
+
+    # Boards removed from the directory leave the catalog
+    shutil.rmtree(tmp_path / "home")
+    assert [ info.name for info in BoardCatalog(str(tmp_path)).refresh() ] == [ "work" ]
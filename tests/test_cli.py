@@ -0,0 +1,57 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import io
+from typing import List, Tuple
+
+from impl import cli
+from impl.board import BoardStorage
+from impl.task import Task, TaskStatus
+
+
+def make_board(dir_name: str) -> None:
+    storage = BoardStorage(dir_name)
+    tasks_pool = dict((f"t{i}", Task(f"Task {i}", "", f"t{i}")) for i in range(3))
+    storage.save_snapshot(tasks_pool, list(tasks_pool))
+
+
+def run(dir_name: str, *args: str) -> Tuple[int, List[str]]:
+    out = io.StringIO()
+    result = cli.main([ "-b", dir_name ] + list(args), out)
+    return result, out.getvalue().splitlines()
+
+
+def test_cli_add_allocates_one_id(tmp_path, monkeypatch) -> None:
+    dir_name = str(tmp_path)
+    make_board(dir_name)
+    allocated = []
+    allocate = Task.id_allocator.allocate
+    monkeypatch.setattr(Task.id_allocator, "allocate", lambda *args: allocated.append(allocate(*args)) or allocated[-1])
+
+    assert run(dir_name, "add", "New task", "-l", "home") == (0, allocated)
+    assert len(allocated) == 1
+    result, lines = run(dir_name, "list")
+    assert result == 0
+    assert lines[0] == f"{allocated[0]} New task l:home"
+    assert [ line.split()[0] for line in lines[1:] ] == [ "t0", "t1", "t2" ]
+
+
+def test_cli_done_and_reopen(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    make_board(dir_name)
+    assert run(dir_name, "done", "t1") == (0, [])
+    assert run(dir_name, "list", "--done") == (0, [ "t1 [done] Task 1" ])
+    assert run(dir_name, "done", "t1")[0] == 1
+    assert run(dir_name, "reopen", "t1") == (0, [])
+    assert [ line.split()[0] for line in run(dir_name, "list")[1] ] == [ "t1", "t0", "t2" ]
+    assert run(dir_name, "done", "t9")[0] == 1
+
+
+def test_cli_done_task_missing_from_order(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    make_board(dir_name)
+    board = cli.Board(dir_name)
+    board.order.remove("t1")
+    cli.cmd_done(board, cli.make_parser().parse_args([ "done", "t1" ]), io.StringIO())
+    assert board.tasks_pool["t1"].status == TaskStatus.DONE
+    board.close()
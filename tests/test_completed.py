@@ -0,0 +1,54 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import datetime
+
+from impl.board import BoardStorage
+from impl.task import Task, TaskStatus
+
+
+def make_board(dir_name: str) -> None:
+    storage = BoardStorage(dir_name)
+    tasks_pool = {}
+    for (i, closed) in enumerate([ datetime(2020, 1, 5), datetime(2020, 2, 3), datetime(2020, 1, 9) ]):
+        task = Task(f"Done {i}", "", f"d{i}")
+        task.status = TaskStatus.DONE
+        task.close_date = closed
+        tasks_pool[task.id] = task
+    tasks_pool["t0"] = Task("Active", "", "t0")
+    storage.save_snapshot(tasks_pool, [ "t0" ])
+
+
+def test_completed_tasks_load_lazily(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    make_board(dir_name)
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, order = storage.load()
+    assert list(tasks_pool) == [ "t0" ]
+    assert order == [ "t0" ]
+    assert sorted(storage.list_shards()) == [ "2020-01", "2020-02" ]
+    # The completed tasks are counted without being loaded
+    assert storage.count_tasks(tasks_pool) == (1, 3)
+
+    completed = storage.load_completed(tasks_pool)
+    # The most recently closed first
+    assert [ task.id for task in completed ] == [ "d1", "d2", "d0" ]
+    assert sorted(tasks_pool) == [ "d0", "d1", "d2", "t0" ]
+    assert not any(task.dirty for task in completed)
+    assert storage.count_tasks(tasks_pool) == (1, 3)
+    # Only loaded once
+    assert storage.load_completed(tasks_pool) == []
+
+
+def test_load_completed_keeps_newer_copies(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    make_board(dir_name)
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, _ = storage.load()
+    # E.g. a task reopened and changed outside of the app, and reloaded
+    # before the completed tasks are
+    reopened = Task("Done 0, reopened", "", "d0")
+    tasks_pool["d0"] = reopened
+    completed = storage.load_completed(tasks_pool)
+    assert [ task.id for task in completed ] == [ "d1", "d2" ]
+    assert tasks_pool["d0"] is reopened
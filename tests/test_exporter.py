@@ -0,0 +1,75 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import csv
+from datetime import date, datetime
+import io
+import json
+from typing import Dict, Tuple
+
+from impl.board import BoardStorage
+from impl.exporter import iter_board_records, record_from_task, write_csv, write_jsonl, write_markdown
+from impl.task import Epic, Task, TaskComment, TaskFilter, TaskStatus
+
+
+def make_tasks() -> Tuple[Epic, Dict[str, Task]]:
+    epic = Epic("home", "Home")
+    active = Task("Fix the sink", "Kitchen\nASAP", "t0")
+    active.set_epic(epic)
+    active.set_labels([ "plumbing" ])
+    active.deadline = date(2030, 5, 1)
+    active.add_comment(TaskComment("Called the plumber", datetime(2020, 3, 1, 10, 0)))
+    done = Task("Paint the fence", "", "d0")
+    done.set_labels([ "garden" ])
+    done.status = TaskStatus.DONE
+    done.close_date = datetime(2020, 1, 5, 12, 30)
+    return epic, { "t0": active, "d0": done }
+
+
+def test_export_completed_without_loading(tmp_path, monkeypatch) -> None:
+    dir_name = str(tmp_path)
+    epic, tasks = make_tasks()
+    storage = BoardStorage(dir_name)
+    storage.epics_pool = { epic.id: epic }
+    storage.save_snapshot(tasks, [ "t0" ])
+
+    storage = BoardStorage(dir_name)
+    epics_pool, tasks_pool, order = storage.load()
+    assert list(tasks_pool) == [ "t0" ]
+    # Stored tasks are exported as they are, without building Task objects
+    monkeypatch.setattr(Task, "from_plain_object", None)
+    records = list(iter_board_records(storage, epics_pool, tasks_pool, order))
+    assert records == [ record_from_task(tasks["t0"]), record_from_task(tasks["d0"]) ]
+    assert records[0]["epic_name"] == "Home"
+    assert records[0]["comments"] == [ { "date": "2020-03-01 10:00:00", "text": "Called the plumber" } ]
+    assert records[1]["closed"] == "2020-01-05 12:30:00"
+
+    # Filters apply to the stored tasks, too
+    records = list(iter_board_records(storage, epics_pool, tasks_pool, order, TaskFilter("l:garden")))
+    assert [ record["id"] for record in records ] == [ "d0" ]
+    assert list(iter_board_records(storage, epics_pool, tasks_pool, order, completed=False)) == \
+        [ record_from_task(tasks["t0"]) ]
+
+
+def test_export_formats() -> None:
+    _, tasks = make_tasks()
+    records = [ record_from_task(task) for task in tasks.values() ]
+
+    f = io.StringIO()
+    assert write_jsonl(records, f) == 2
+    assert [ json.loads(line) for line in f.getvalue().splitlines() ] == records
+
+    f = io.StringIO()
+    assert write_csv(records, f) == 2
+    rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+    assert [ row["id"] for row in rows ] == [ "t0", "d0" ]
+    assert rows[0]["description"] == "Kitchen\nASAP"
+    assert rows[0]["comments"] == "2020-03-01 10:00:00: Called the plumber"
+    assert rows[1]["epic"] == ""
+
+    f = io.StringIO()
+    assert write_markdown(records, f) == 2
+    text = f.getvalue()
+    assert text.startswith("## Fix the sink\n\n- ID: t0\n")
+    assert "- Epic: Home\n- Labels: plumbing\n" in text
+    assert "> **2020-03-01 10:00:00**  \n> Called the plumber\n" in text
@@ -0,0 +1,36 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from impl.fuzzy import edit_distance, max_typos, ngrams, similarity
+
+
+def test_edit_distance() -> None:
+    assert edit_distance("plumber", "plumber", 2) == 0
+    assert edit_distance("plumber", "plumbr", 2) == 1
+    assert edit_distance("plumber", "plubmer", 2) == 1     # swapped letters
+    assert edit_distance("plumber", "plamper", 2) == 2
+    assert edit_distance("plumber", "number", 2) == 2
+    # Anything beyond the limit is limit + 1
+    assert edit_distance("plumber", "garden", 2) == 3
+    assert edit_distance("plumber", "plum", 1) == 2
+    assert edit_distance("", "abc", 5) == 3
+
+
+def test_similarity() -> None:
+    assert max_typos("cat") == 0 and max_typos("plumb") == 1 and max_typos("plumbing") == 2
+    assert similarity("plumber", "plumber") == 1.0
+    # A prefix scores by how much of the word it covers
+    assert similarity("plumb", "plumber") == 0.5 + 0.5 * 5 / 7
+    assert similarity("plumbr", "plumber") == 1.0 - 1 / 6
+    # A typo in the start of a longer word costs both ways
+    assert 0 < similarity("plmub", "plumbing") < similarity("plumb", "plumbing")
+    # Short terms forgive no typos
+    assert similarity("cat", "cut") == 0.0
+    assert similarity("plumber", "garden") == 0.0
+
+
+def test_ngrams_survive_typos() -> None:
+    # Each typo spoils at most 3 bigrams, which is what TaskIndex relies on
+    term = ngrams("plumber", whole=False)
+    for typo in ("plumbre", "plmber", "plumbeer", "plunber"):
+        assert len(term - ngrams(typo)) <= 3
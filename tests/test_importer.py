@@ -0,0 +1,43 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from typing import List, Tuple
+
+from impl.importer import PlainTextImporter, import_plain_text_file
+from impl.task import Task
+
+
+def summaries(tasks: List[Task]) -> List[Tuple[str, str]]:
+    return [ (task.summary, task.desc) for task in tasks ]
+
+
+def test_importer_lines_split_across_pieces() -> None:
+    importer = PlainTextImporter({})
+    assert summaries(importer.feed("Buy milk\nCall")) == [ ("Buy milk", "") ]
+    assert summaries(importer.feed(" mom\n\n  Fix bike  ")) == [ ("Call mom", "") ]
+    assert summaries(importer.finish()) == [ ("Fix bike", "") ]
+
+
+def test_importer_paragraphs() -> None:
+    importer = PlainTextImporter({}, paragraphs=True)
+    tasks = importer.feed("Trip\nBook hotel\nPack\n\n\nTaxes\n")
+    assert summaries(tasks) == [ ("Trip", "Book hotel\nPack") ]
+    # The last paragraph doesn't need a blank line after it
+    assert summaries(importer.finish()) == [ ("Taxes", "") ]
+
+
+def test_import_plain_text_file(tmp_path) -> None:
+    path = tmp_path / "tasks.txt"
+    path.write_bytes("\ufeffCafé\r\nNaïve plan\r\n\r\nÜber task".encode("utf-8"))
+    pool = dict((task_id, Task("", "", task_id)) for task_id in Task.id_allocator.reserve(3))
+    with open(path, "rb") as f:
+        # Chunks this small cut right through the characters and the line breaks
+        batches = list(import_plain_text_file(f, pool, chunk_size=3))
+    tasks = [ task for (batch, _) in batches for task in batch ]
+    assert summaries(tasks) == [ ("Café", ""), ("Naïve plan", ""), ("Über task", "") ]
+    progress = [ done for (_, done) in batches ]
+    assert progress == sorted(progress) and progress[-1] == 1.0
+    ids = [ task.id for task in tasks ]
+    assert len(set(ids)) == 3 and not set(ids) & set(pool)
+    # Importing doesn't add the tasks to the pool
+    assert len(pool) == 3
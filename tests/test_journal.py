@@ -0,0 +1,110 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import os
+from typing import Dict, List, Tuple
+
+from impl.board import BoardStorage
+from impl.task import Task, TaskStatus
+
+
+def make_board(dir_name: str) -> BoardStorage:
+    storage = BoardStorage(dir_name)
+    tasks_pool = dict((f"t{i}", Task(f"Task {i}", "Some description", f"t{i}")) for i in range(5))
+    storage.save_snapshot(tasks_pool, list(tasks_pool))
+    storage.load()
+    return storage
+
+
+def board_state(dir_name: str) -> Tuple[Dict[str, Tuple[str, str, TaskStatus]], List[str]]:
+    _, tasks_pool, order = BoardStorage(dir_name).load()
+    return dict((k, (task.summary, task.desc, task.status)) for (k, task) in tasks_pool.items()), order
+
+
+def test_journal_cut_at_every_offset(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    _, tasks_pool, order = storage.load()
+    tasks_pool["t1"].set_summary("First change")
+    storage.log_changes(tasks_pool, order, ["t1"])
+    good_size = os.path.getsize(storage.path(storage.JOURNAL_FILE))
+    before = board_state(dir_name)
+
+    # The last append has both kinds of entries
+    tasks_pool["t2"].set_full_desc("Second change\nwith a longer description")
+    tasks_pool["t3"].set_status(TaskStatus.DONE)
+    order = [ "t4", "t0", "t1", "t2" ]
+    storage.log_changes(tasks_pool, order, ["t2", "t3"])
+    after = board_state(dir_name)
+    with open(storage.path(storage.JOURNAL_FILE), "rb") as f:
+        data = f.read()
+
+    for size in range(good_size, len(data) + 1):
+        with open(storage.path(storage.JOURNAL_FILE), "wb") as f:
+            f.write(data[:size])
+        state = board_state(dir_name)
+        if size == len(data):
+            assert state == after
+        else:
+            # The entries of the last append are either all there or not at
+            # all, except that an entry is never applied in part
+            tasks, cut_order = state
+            assert tasks["t1"][0] == "First change"
+            assert tasks["t2"][0] in ("Task 2", "Second change")
+            assert tasks["t2"][1] in ("Some description", "with a longer description")
+            assert cut_order in (before[1], order)
+
+
+def test_journal_restart_keeps_replayed_entries(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    _, tasks_pool, order = storage.load()
+    tasks_pool["t1"].set_summary("Kept")
+    storage.log_changes(tasks_pool, order, ["t1"])
+    with open(storage.path(storage.JOURNAL_FILE), "ab") as f:
+        f.write(b"--- {op: put, id: t2, task: {status: ")
+
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, order = storage.load()
+    assert tasks_pool["t1"].summary == "Kept"
+    assert not storage.journal_valid
+    tasks_pool["t3"].set_summary("Added")
+    storage.log_changes(tasks_pool, order, ["t3"])
+
+    tasks, _ = board_state(dir_name)
+    assert tasks["t1"][0] == "Kept"
+    assert tasks["t3"][0] == "Added"
+
+
+def test_journal_bad_entries_stop_replay(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    _, tasks_pool, order = storage.load()
+    tasks_pool["t1"].set_summary("Kept")
+    storage.log_changes(tasks_pool, order, ["t1"])
+    path = storage.path(storage.JOURNAL_FILE)
+    with open(path, "rb") as f:
+        data = f.read()
+    for bad in (b"--- {op: put, id: t2}\n...\n", b"--- {op: order, edits: [[0, 1]]}\n...\n",
+        b"--- {op: put, task: {desc: x}}\n...\n", b"--- {op: what}\n...\n", b"--- [1, 2]\n...\n"):
+        with open(path, "wb") as f:
+            f.write(data + bad + b"--- {op: put, id: t3, task: {desc: Never}}\n...\n")
+        storage = BoardStorage(dir_name)
+        _, tasks_pool, _ = storage.load()
+        assert tasks_pool["t1"].summary == "Kept"
+        assert tasks_pool["t3"].summary == "Task 3"
+        assert not storage.journal_valid
+
+
+def test_journal_order_edits_out_of_range(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    _, tasks_pool, order = storage.load()
+    storage.log_changes(tasks_pool, order[1:], [])
+    path = storage.path(storage.JOURNAL_FILE)
+    with open(path, "ab") as f:
+        f.write(b"--- {op: order, edits: [[3, 9, [t0]]]}\n...\n")
+    storage = BoardStorage(dir_name)
+    _, _, order = storage.load()
+    assert order == [ "t1", "t2", "t3", "t4" ]
+    assert not storage.journal_valid
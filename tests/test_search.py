@@ -0,0 +1,56 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from typing import List, Optional, Tuple
+
+from impl.search import SearchJob, make_search_entry, rank_matches, run_ranked_search, run_search
+from impl.task import Task, TaskFilter
+
+
+def make_tasks() -> List[Optional[Task]]:
+    tasks: List[Optional[Task]] = [ Task(summary, "", f"t{i}") for (i, summary) in enumerate([
+        "Call the plumber", "Plan the garden", "Buy plums", "Fix the plumbing", "Water the plants" ]) ]
+    # A placeholder
+    tasks.insert(2, None)
+    return tasks
+
+
+def test_run_search_reports_chunks() -> None:
+    tasks = make_tasks()
+    snapshot = [ make_search_entry(task) if task is not None else None for task in tasks ]
+    job = SearchJob(TaskFilter("plum"))
+    chunks: List[Tuple[List[int], int, bool]] = []
+    run_search(job, snapshot, range(len(snapshot)), lambda *args: chunks.append(args), first_chunk=2, max_chunk=3)
+    # Placeholders always match
+    assert chunks == [ ([ 0 ], 2, False), ([ 2, 3, 4 ], 5, False), ([], 6, True) ]
+
+
+def test_run_ranked_search() -> None:
+    tasks = make_tasks()
+    snapshot = [ make_search_entry(task) if task is not None else None for task in tasks ]
+    filter = TaskFilter("~plumb")
+    results: List[List[List[Tuple[float, int]]]] = []
+    run_ranked_search(SearchJob(filter), [ snapshot, snapshot[:3] ], 2, results.append, chunk=2)
+    assert results == [ [ rank_matches(filter, tasks, 2), rank_matches(filter, tasks[:3], 2) ] ]
+    # Equally good matches keep their order
+    assert [ pos for (_, pos) in results[0][0] ] == [ 0, 4 ]
+
+    # A cancelled job reports nothing
+    job = SearchJob(filter)
+    job.cancel()
+    run_ranked_search(job, [ snapshot ], 2, results.append)
+    assert len(results) == 1
+
+
+def test_rank_matches() -> None:
+    tasks = make_tasks()
+    tasks.append(Task("Pick flowers", "Ask the plumber first", "t5"))
+    # Typos are forgiven; a word in the summary counts more than one in the
+    # description; tasks that don't match are left out
+    ranked = rank_matches(TaskFilter("~plumbr"), tasks, 10)
+    assert [ pos for (_, pos) in ranked ] == [ 0, 4, 6 ]
+    assert ranked[0][0] > ranked[1][0] > ranked[2][0] > 0
+    # Only the best ones are kept
+    ranked = rank_matches(TaskFilter("~plumb"), tasks, 2)
+    assert [ pos for (_, pos) in ranked ] == [ 0, 4 ]
+    assert len(rank_matches(TaskFilter("~plumb"), tasks, 10)) == 4
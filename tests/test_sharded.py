@@ -0,0 +1,67 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+import os
+
+from impl.board import BoardStorage
+from impl.sharded_board import ShardedBoardStorage
+from impl.task import Task, TaskStatus
+
+
+def make_board(dir_name: str) -> ShardedBoardStorage:
+    storage = ShardedBoardStorage(dir_name)
+    tasks_pool = dict((f"t{i}", Task(f"Task {i}", "", f"t{i}")) for i in range(3))
+    storage.save_snapshot(tasks_pool, list(tasks_pool))
+    storage.load()
+    return storage
+
+
+def test_sharded_task_missing_from_order(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    with open(storage.path(storage.ACTIVE_FILE), "rb") as f:
+        active_data = f.read()
+    task = Task("New task", "", "n9")
+    storage.save({ task.id: task }, [ "n9", "t0", "t1", "t2" ], [ task.id ])
+    # As if we've been interrupted before active.txt was written
+    with open(storage.path(storage.ACTIVE_FILE), "wb") as f:
+        f.write(active_data)
+
+    storage = ShardedBoardStorage(dir_name)
+    _, tasks_pool, order = storage.load()
+    assert order == [ "t0", "t1", "t2", "n9" ]
+    storage.save({}, order, [])
+    assert ShardedBoardStorage(dir_name).load()[2] == order
+
+
+def test_sharded_deleted_task_removes_bucket(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    assert os.path.exists(storage.path(storage.bucket_file("t1")))
+    storage.save({}, [ "t0", "t2" ], [])
+
+    assert not os.path.exists(storage.path(storage.bucket_file("t1")))
+    _, tasks_pool, order = ShardedBoardStorage(dir_name).load()
+    assert sorted(tasks_pool) == [ "t0", "t2" ]
+    assert order == [ "t0", "t2" ]
+
+
+def test_full_save_rewrites_edited_completed_task(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = BoardStorage(dir_name)
+    tasks_pool = { "t0": Task("to close", "", "t0"), "t1": Task("Task 1", "", "t1") }
+    tasks_pool["t0"].set_status(TaskStatus.DONE)
+    storage.save_snapshot(tasks_pool, [ "t1" ])
+
+    # The completed task comes from its month shard, and is edited without
+    # going through the journal
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, order = storage.load()
+    storage.load_completed(tasks_pool)
+    tasks_pool["t0"].set_summary("EDITED")
+    storage.write_changes(tasks_pool, order, [ "t0" ], True)
+
+    storage = BoardStorage(dir_name)
+    _, tasks_pool, _ = storage.load()
+    storage.load_completed(tasks_pool)
+    assert tasks_pool["t0"].summary == "EDITED"
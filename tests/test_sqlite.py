@@ -0,0 +1,72 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from impl.sqlite_board import SqliteBoardStorage, assign_positions
+from impl.task import Task, TaskFilter
+
+
+def make_board(dir_name: str) -> SqliteBoardStorage:
+    storage = SqliteBoardStorage(dir_name)
+    tasks_pool = dict((k, Task(f"Task {k}", "", k)) for k in ("a", "b", "c"))
+    tasks_pool["b"].set_labels([ "x" ])
+    storage.save_snapshot(tasks_pool, list(tasks_pool))
+    storage.close()
+    storage = SqliteBoardStorage(dir_name)
+    storage.load()
+    return storage
+
+
+def test_sqlite_deleted_task_stays_deleted(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    # Neither in the pool nor in the changed IDs, like the app saves it
+    storage.save({}, [ "a", "c" ], [])
+    storage.close()
+
+    storage = SqliteBoardStorage(dir_name)
+    _, tasks_pool, order = storage.load()
+    assert sorted(tasks_pool) == [ "a", "c" ]
+    assert order == [ "a", "c" ]
+    assert storage.connect().execute("SELECT COUNT(*) FROM labels").fetchone() == (0,)
+    storage.close()
+
+
+def test_assign_positions_moves_one_task() -> None:
+    old_order = [ "a", "b", "c", "d" ]
+    positions = { "a": 1.0, "b": 2.0, "c": 3.0, "d": 4.0 }
+    # Only the moved task gets a new key
+    changed = assign_positions(old_order, [ "d", "a", "b", "c" ], positions)
+    assert list(changed) == [ "d" ]
+    assert changed["d"] < positions["a"]
+    changed = assign_positions(old_order, [ "a", "c", "e", "b", "d" ], positions)
+    new_positions = dict(positions, **changed)
+    assert sorted(new_positions, key=new_positions.__getitem__) == [ "a", "c", "e", "b", "d" ]
+    assert "a" not in changed and "d" not in changed
+
+    # A gap that has been split too many times renumbers the whole list
+    positions = { "a": 1.0, "b": 1.0 + 1e-7 }
+    assert assign_positions([ "a", "b" ], [ "a", "c", "b" ], positions) == { "a": 1.0, "c": 2.0, "b": 3.0 }
+
+
+def test_sqlite_reorder_survives_reload(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    storage = make_board(dir_name)
+    storage.save({}, [ "c", "a", "b" ], [])
+    storage.close()
+
+    storage = SqliteBoardStorage(dir_name)
+    _, _, order = storage.load()
+    assert order == [ "c", "a", "b" ]
+    storage.close()
+
+
+def test_sqlite_prefilter(tmp_path) -> None:
+    storage = make_board(str(tmp_path))
+    filter = TaskFilter("l:x")
+    storage.prefilter(filter, [ "c" ])
+    # Unsaved tasks are passed on: the database may not have their labels yet
+    assert filter.candidates == { "b", "c" }
+    filter = TaskFilter("task")
+    storage.prefilter(filter, [ "c" ])
+    assert filter.candidates is None
+    storage.close()
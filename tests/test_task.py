@@ -0,0 +1,95 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import date, datetime
+import threading
+from typing import List
+
+from impl.task import Task, TaskFilter, TaskIdAllocator, TaskStatus, format_id
+
+
+def test_from_plain_object_is_not_an_edit() -> None:
+    edit_count = Task.edit_count
+    task = Task.from_plain_object("t1", { "desc": "Summary\nFirst line\nSecond line", "labels": "b a" }, {})
+    assert Task.edit_count == edit_count
+    assert task.summary == "Summary"
+    assert task.desc == "First line\nSecond line"
+    assert not task.dirty
+
+
+def test_without_candidates() -> None:
+    filter = TaskFilter("report")
+    filter.candidates = { "t1" }
+    task = Task("Weekly report", "", "t2")
+    assert not filter.match(task)
+    assert filter.without_candidates().match(task)
+    assert filter.candidates == { "t1" }
+
+
+def test_id_allocator_never_repeats() -> None:
+    allocator = TaskIdAllocator()
+    ids = [ allocator.allocate() for _ in range(1000) ] + allocator.reserve(1000)
+    assert len(set(ids)) == len(ids)
+    # Faster than the clock, the IDs run ahead of it
+    assert ids == sorted(ids, key=lambda text_id: int(text_id, 36))
+
+    # The IDs taken in the pool are skipped
+    allocator = TaskIdAllocator()
+    allocator.clock = lambda: 100     # type: ignore[assignment]
+    pool = { format_id(101): None, format_id(103): None }
+    assert allocator.reserve(3, pool) == [ format_id(100), format_id(102), format_id(104) ]
+    assert allocator.allocate(pool) == format_id(105)
+
+
+def test_id_allocator_threads() -> None:
+    allocator = TaskIdAllocator()
+    results: List[List[str]] = []
+    threads = [ threading.Thread(target=lambda: results.append(allocator.reserve(500))) for _ in range(4) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [ text_id for block in results for text_id in block ]
+    assert len(ids) == 2000
+    assert len(set(ids)) == 2000
+
+
+def test_parse_date_range() -> None:
+    today = date(2024, 3, 15)
+    now = today.toordinal()
+    parse = TaskFilter.parse_date_range
+    day = date(2024, 1, 31).toordinal()
+    assert parse("2024-01-31", False, today) == (day, day + 1)
+    assert parse("2024-01", False, today) == (date(2024, 1, 1).toordinal(), date(2024, 2, 1).toordinal())
+    assert parse("2024-12", False, today) == (date(2024, 12, 1).toordinal(), date(2025, 1, 1).toordinal())
+    assert parse(">2024-01-31", False, today) == (day + 1, TaskFilter.END_DAY)
+    assert parse("<=2024-01-31", False, today) == (TaskFilter.FIRST_DAY, day + 1)
+    assert parse("2024-01-31..2024-02", False, today) == (day, date(2024, 3, 1).toordinal())
+    assert parse("..yesterday", False, today) == (TaskFilter.FIRST_DAY, now)
+    assert parse("last-week", False, today) == (now - 6, now + 1)
+    # Distances count backwards, unless the dates are mostly ahead (deadlines)
+    assert parse("<7d", False, today) == (now - 6, TaskFilter.END_DAY)
+    assert parse("<7d", True, today) == (TaskFilter.FIRST_DAY, now + 7)
+    assert parse("2w", True, today) == (TaskFilter.FIRST_DAY, now + 15)
+    for value in ("soon", "2024-02-30", "2024-13", "1x", "2024..soon"):
+        assert parse(value, False, today) is None
+
+
+def test_date_and_status_terms() -> None:
+    today = date(2024, 3, 15)
+    task = Task("Weekly report", "", "t1")
+    task.creation_date = datetime(2024, 3, 10, 23, 59)
+    task.deadline = date(2024, 3, 20)
+    assert TaskFilter("created:2024-03-10", today).match(task)
+    assert TaskFilter("report created:last-week deadline:<7d s:active", today).match(task)
+    assert not TaskFilter("deadline:<3d", today).match(task)
+    # Several terms on the same field narrow it down
+    assert not TaskFilter("created:>2024-03-01 created:<2024-03-10", today).match(task)
+    # A task without the date never matches
+    assert not TaskFilter("closed:2024", today).match(task)
+    assert not TaskFilter("status:closed", today).match(task)
+    task.status = TaskStatus.DONE
+    task.close_date = datetime(2024, 3, 14, 9, 0)
+    assert TaskFilter("s:closed closed:yesterday", today).match(task)
+    # Words that aren't dates are searched for as text
+    assert TaskFilter("created:soon", today).words == [ "created:soon" ]
@@ -0,0 +1,87 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from datetime import datetime
+from typing import Dict
+
+from impl.task import Task, TaskFilter
+from impl.task_index import TaskIndex
+
+
+def make_pool() -> Dict[str, Task]:
+    tasks = [ Task("Call the plumber", "about the kitchen sink", "t1"), Task("Plan the garden", "", "t2"),
+        Task("Fix the kitchen sink", "", "t3") ]
+    tasks[1].set_labels([ "home" ])
+    tasks[2].creation_date = datetime(2024, 1, 15)
+    for task in tasks:
+        task.mark_saved()
+    return dict((task.id, task) for task in tasks)
+
+
+def test_find() -> None:
+    pool = make_pool()
+    index = TaskIndex()
+    index.refresh(pool)
+    assert index.find(TaskFilter("")) is None
+    assert index.find(TaskFilter("plum")) == { "t1" }
+    assert index.find(TaskFilter("kitchen sink")) == { "t1", "t3" }
+    assert index.find(TaskFilter("l:home")) == { "t2" }
+    assert index.find(TaskFilter("created:2024-01")) == { "t3" }
+    assert index.find(TaskFilter("kitchen created:<2024-01-15")) == set()
+    # Typos are forgiven by the ranked search, and any word will do
+    assert index.find(TaskFilter("~gardne plumber")) == { "t1", "t2" }
+
+
+def test_find_phrase() -> None:
+    pool = make_pool()
+    index = TaskIndex()
+    index.refresh(pool)
+    # A single word can be anywhere, even in the middle of a word
+    assert index.find_phrase("itche") is None
+    # The words after a space must begin a word, and the middle ones be whole
+    assert index.find_phrase("en si") == { "t1", "t3" }
+    assert index.find_phrase("the kitchen si") == { "t1", "t3" }
+    assert index.find_phrase("the kitch sink") == set()
+    assert index.find(TaskFilter('"x the p"')) == { "t1", "t2" }
+
+
+def test_catch_up_follows_edits() -> None:
+    pool = make_pool()
+    index = TaskIndex()
+    index.catch_up(pool)
+    assert index.find(TaskFilter("plumber")) == { "t1" }
+    assert index.edited == set()
+
+    pool["t2"].set_summary("Call the gardener")
+    new_task = Task("Buy a plumber's wrench", "", "t4")
+    pool[new_task.id] = new_task
+    index.add(new_task)
+    # Tasks that haven't been edited are not looked at again
+    pool["t3"].summary = "Not indexed"
+    index.catch_up(pool)
+    assert index.find(TaskFilter("call")) == { "t1", "t2" }
+    assert index.find(TaskFilter("plumber")) == { "t1", "t4" }
+    assert index.find(TaskFilter("indexed")) == set()
+    assert index.edited == { "t2", "t4" }
+
+    del pool["t1"]
+    index.remove("t1")
+    index.catch_up(pool)
+    assert index.find(TaskFilter("plumber")) == { "t4" }
+
+
+def test_catch_up_falls_back_to_refresh() -> None:
+    pool = make_pool()
+    index = TaskIndex()
+    index.catch_up(pool)
+    # This edit falls off Task.recent_edits
+    pool["t2"].set_desc("weeds")
+    for i in range(Task.recent_edits.maxlen or 0):
+        pool["t3"].set_desc(f"draft {i}")
+    index.catch_up(pool)
+    assert index.find(TaskFilter("weeds")) == { "t2" }
+
+    # A task added to the pool without telling the index
+    pool["t5"] = Task("Mow the lawn", "", "t5")
+    index.catch_up(pool)
+    assert index.find(TaskFilter("lawn")) == { "t5" }
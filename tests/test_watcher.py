@@ -0,0 +1,37 @@
+# Copyright © 2022 Vladimir Ein. All rights reserved.
+# License: http://opensource.org/licenses/MIT
+# 
+from impl.board import BoardStorage
+from impl.task import Task, TaskStatus
+from impl.watcher import merge_external_changes
+
+
+def test_merge_task_closed_externally_then_snapshotted(tmp_path) -> None:
+    dir_name = str(tmp_path)
+    tasks_pool = dict((f"t{i}", Task(f"Task {i}", "Some description", f"t{i}")) for i in range(4))
+    BoardStorage(dir_name).save_snapshot(tasks_pool, list(tasks_pool))
+    storage = BoardStorage(dir_name)
+    epics_pool, tasks_pool, order = storage.load()
+
+    # Someone else closes one task and deletes another, and writes a snapshot
+    # (so that the closed task moves to the shards)
+    other = BoardStorage(dir_name)
+    _, other_pool, other_order = other.load()
+    other_pool["t1"].set_status(TaskStatus.DONE)
+    del other_pool["t2"]
+    other_order = [ k for k in other_order if k not in ("t1", "t2") ]
+    other.write_changes(other_pool, other_order, ["t1"], True)
+
+    base_order = list(storage.saved_order)
+    _, disk_pool, disk_order = storage.load()
+    assert "t1" not in disk_pool
+    closed_pool = storage.find_completed(k for k in tasks_pool if k not in disk_pool)
+    assert list(closed_pool) == [ "t1" ]
+    result = merge_external_changes(tasks_pool, epics_pool, order, base_order, disk_pool, disk_order,
+        closed_pool=closed_pool)
+
+    assert tasks_pool["t1"].status == TaskStatus.DONE
+    assert not tasks_pool["t1"].dirty
+    assert result.updated == [ tasks_pool["t1"] ]
+    assert [ task.id for task in result.removed ] == [ "t2" ]
+    assert result.order == [ "t0", "t3" ]
@@ -4,6 +4,17 @@
 from typing import List, Optional
 import wx
 
+CollapseButtonEventType = wx.NewEventType()
+EVT_COLLAPSE_BUTTON = wx.PyEventBinder(CollapseButtonEventType, 0)
+
+class CollapseButtonEvent(wx.CommandEvent):
+    expanded: bool
+
+    def __init__(self, expanded: bool):
+        wx.CommandEvent.__init__(self, CollapseButtonEventType)
+        self.expanded = expanded
+
+
 class CollapseButton(wx.StaticText):
 
     buddies: List[wx.Window]
@@ -43,6 +54,7 @@ class CollapseButton(wx.StaticText):
         # a set of sizers to refresh in the previous for loop.
         for buddy in self.buddies:
             buddy.GetContainingSizer().Layout()
+        wx.PostEvent(self.GetEventHandler(), CollapseButtonEvent(expand))
 
     def AcceptsFocus(self) -> bool:
         return True
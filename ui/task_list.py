@@ -1,11 +1,14 @@
 # Copyright © 2022 Vladimir Ein. All rights reserved.
 # License: http://opensource.org/licenses/MIT
 # 
-from datetime import datetime, timedelta
-import pickle
-from typing import Any, ClassVar, Dict, List, Optional, Sequence
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+import sys
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Sequence, Tuple
 import wx
 
+from impl.board import diff_order
+from impl.search import SearchEntry, make_search_entry
 from impl.task import Task, TaskFilter, TaskStatus
 
 
@@ -19,6 +22,21 @@ class TaskListTable(wx.grid.GridTableBase):
     # Positions of the displayed items in the original list (i.e. `task_list`).
     display_index: List[int]
     last_filter: TaskFilter
+    # Recent filter results (positions in task_list) by query, so that typing
+    # in the search box only checks the tasks found for the previous query;
+    # see PlanSearch.  Any change to task_list, or to any task, invalidates
+    # the whole cache.
+    filter_cache: Dict[str, Tuple[TaskFilter, List[int]]]
+    # Task.edit_count as of the time the cache has been filled
+    filter_cache_edits: int = 0
+    # The day the cache has been filled on: date terms like closed:today
+    # find different tasks the next day
+    filter_cache_day: Optional[date] = None
+    # What the search needs to know about each item of task_list, for
+    # searching on another thread (see impl.search).  Built on demand, and
+    # invalidated along with filter_cache.
+    snapshot: Optional[List[Optional[SearchEntry]]] = None
+    MAX_FILTER_CACHE: ClassVar[int] = 32
 
     # TODO: will we also need the task pool? Or should we serialize the task
     # entirely on drag'n'drop?
@@ -29,6 +47,7 @@ class TaskListTable(wx.grid.GridTableBase):
         self.last_filter = TaskFilter()
         self.display_list = []
         self.display_index = []
+        self.filter_cache = {}
     
     def CanMeasureColUsingSameAttr(self, col: int) -> bool:
         # We always use the same renderer and font for all cells within a column
@@ -53,7 +72,7 @@ class TaskListTable(wx.grid.GridTableBase):
         if col == 1:
             task = self.display_list[row]
             if task:
-                task.summary = value
+                task.set_summary(value)
 
     def FindOrigTaskPos(self, pos: int) -> int:
         # Converts the position of a task in display_list to the corresponding
@@ -64,6 +83,7 @@ class TaskListTable(wx.grid.GridTableBase):
     def InsertRows(self, pos: int = 0, numRows: int = 1) -> bool:
         # Note: `pos` points to a row in display_list, but we need to update
         # both display_list and task_list.
+        self.InvalidateMatches()
         orig_pos = self.FindOrigTaskPos(pos)
         # Slicing inserts one list into another at the `pos` index,
         # and the list being inserted is just a list of None's.
@@ -78,6 +98,7 @@ class TaskListTable(wx.grid.GridTableBase):
         return True
 
     def DeleteRows(self, pos: int = 0, numRows: int = 1) -> bool:
+        self.InvalidateMatches()
         # Delete the items in the back-storage list.  It is important to go
         # backwards so that indices in `display_index` remain valid.
         for i in range(numRows, 0, -1):
@@ -94,6 +115,66 @@ class TaskListTable(wx.grid.GridTableBase):
         self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, pos, numRows)
         return True
 
+    def InvalidateMatches(self) -> None:
+        """Drops everything known about the search results; called on any change to task_list."""
+        self.filter_cache.clear()
+        self.snapshot = None
+
+    def ValidateMatches(self) -> None:
+        """Drops the search results if any task has been edited (or a day has passed) since they've been found."""
+        today = date.today()
+        if self.filter_cache_edits != Task.edit_count or self.filter_cache_day != today:
+            self.InvalidateMatches()
+            self.filter_cache_edits = Task.edit_count
+            self.filter_cache_day = today
+
+    def PlanSearch(self, filter: TaskFilter) -> Optional[Sequence[int]]:
+        """
+        Returns the positions in task_list that need to be checked against
+        `filter`, in ascending order; or None if the results of the same
+        query are in the cache (e.g. on Backspace).  If the cache has the
+        results of a broader query (typically, the previous one), only those
+        need to be checked.
+        """
+        self.ValidateMatches()
+        if filter.query in self.filter_cache:
+            return None
+        positions: Sequence[int] = range(len(self.task_list))
+        # The smallest of the results that include everything `filter` can match
+        for (broader, broader_positions) in self.filter_cache.values():
+            if len(broader_positions) < len(positions) and filter.refines(broader):
+                positions = broader_positions
+        return positions
+
+    def CacheMatches(self, filter: TaskFilter, positions: List[int]) -> None:
+        # The most recent query goes last, and the oldest one is dropped
+        self.filter_cache.pop(filter.query, None)
+        self.filter_cache[filter.query] = (filter, positions)
+        if len(self.filter_cache) > self.MAX_FILTER_CACHE:
+            del self.filter_cache[next(iter(self.filter_cache))]
+
+    def FindMatches(self, filter: TaskFilter) -> List[int]:
+        """Returns the positions of the items of task_list matching `filter`."""
+        positions = self.PlanSearch(filter)
+        if positions is None:
+            matched = self.filter_cache[filter.query][1]
+        else:
+            matched = [ pos for pos in positions if self.task_list[pos] is None or filter.match(self.task_list[pos]) ]     # type: ignore[arg-type]
+        self.CacheMatches(filter, matched)
+        # The cache must not share the lists that the table modifies
+        return list(matched)
+
+    def GetSnapshot(self) -> List[Optional[SearchEntry]]:
+        self.ValidateMatches()
+        if self.snapshot is None:
+            self.snapshot = [ make_search_entry(task) if task is not None else None for task in self.task_list ]
+        return self.snapshot
+
+    def IsSnapshotCurrent(self, snapshot: List[Optional[SearchEntry]]) -> bool:
+        """Tells whether neither task_list nor the tasks have changed since `snapshot` was taken."""
+        self.ValidateMatches()
+        return snapshot is self.snapshot
+
     # TODO: do we need this? - probably yes, for auto-size
     def GetColLabelValue(self, col: int) -> str:
         return "99 wk left|epic id" if col == 0 else ""
@@ -115,16 +196,74 @@ class TaskListTable(wx.grid.GridTableBase):
     def GetItem(self, row: int) -> Optional[Task]:
         return self.display_list[row]
 
+    def FindItem(self, task: Task) -> int:
+        """Returns the row where `task` is displayed, or -1 if it's not."""
+        try:
+            return self.display_list.index(task)
+        except ValueError:
+            return -1
+
     def GetItems(self, start: int, end: int) -> List[Optional[Task]]:
         return self.display_list[start:end]
 
     def InsertItems(self, pos: int, items: Sequence[Task]) -> None:
         """Inserts the passed Task objects into the list, updating the grid."""
+        self.InvalidateMatches()
         orig_pos = self.FindOrigTaskPos(pos)
         self.task_list[orig_pos:orig_pos] = items
-        # TODO: refilter the inserted items only, and update row heights for them
-        # rather than for the entire list.
-        self.Filter()
+        # Keeping the rows already shown in sync with task_list, so that only
+        # the new ones are added.  The current search might have narrowed
+        # down its candidates, which the new tasks are not among.
+        self.display_index = [ i + len(items) if i >= orig_pos else i for i in self.display_index ]
+        filter = self.last_filter.without_candidates()
+        first = bisect_left(self.display_index, orig_pos)
+        added = [ orig_pos + i for i, task in enumerate(items) if filter.match(task) ]
+        self.SetDisplayIndex(self.display_index[:first] + added + self.display_index[first:])
+
+    def ReplaceItems(self, start: int, end: int, items: Sequence[Task]) -> None:
+        """
+        Replaces task_list[start:end] with `items`, notifying the grid about
+        the affected rows only (unlike InsertItems, which refilters the whole
+        list).  The new items are filtered with the current filter.
+        """
+        self.InvalidateMatches()
+        # The displayed part of the range
+        first = bisect_left(self.display_index, start)
+        last = bisect_left(self.display_index, end)
+        if last > first:
+            del self.display_list[first:last]
+            del self.display_index[first:last]
+            self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, first, last - first)
+
+        self.task_list[start:end] = items
+        shift = len(items) - (end - start)
+        if shift != 0:
+            # Imports insert lots of batches at the top of a long list, so
+            # this needs to be fast.
+            self.display_index[first:] = [ i + shift for i in self.display_index[first:] ]
+
+        # Same as in InsertItems, the items can be outside of the candidates
+        filter = self.last_filter.without_candidates()
+        shown = [ (start + i, task) for i, task in enumerate(items) if filter.match(task) ]
+        if shown:
+            self.display_list[first:first] = [ task for pos, task in shown ]
+            self.display_index[first:first] = [ pos for pos, task in shown ]
+            self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_INSERTED, first, len(shown))
+            for row in range(first, first + len(shown)):
+                self.GetView().AutoSizeRow(row)
+
+    def SyncList(self, items: Sequence[Task]) -> None:
+        """
+        Makes the table contain `items`, in that order, by inserting, deleting
+        and moving only the rows that differ.  Unlike LoadList, keeps the grid
+        cursor and the selection where possible.
+        """
+        tasks = dict((task.id, task) for task in items)
+        old_ids = [ task.id if task else "" for task in self.task_list ]
+        edits = diff_order(old_ids, [ task.id for task in items ])
+        # Going backwards so that positions of the remaining edits stay valid
+        for start, end, ids in reversed(edits):
+            self.ReplaceItems(start, end, [ tasks[task_id] for task_id in ids ])
 
     def LoadList(self, items: Sequence[Task]) -> None:
         """
@@ -144,42 +283,112 @@ class TaskListTable(wx.grid.GridTableBase):
         # reuse the same table object, just call SetTable(). Need to check what
         # attributes might get lost on resetting the table.
 
+        # The old rows have nothing to do with the new list, so Filter()
+        # can't reuse them
+        self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, 0, len(self.display_list))
+        self.display_list = []
+        self.display_index = []
         self.task_list = list(items)
+        self.InvalidateMatches()
         # resetting the filter to 'pass everything'
         self.Filter(TaskFilter())
 
     def Filter(self, filter: Optional[TaskFilter] = None) -> None:
-        # TODO: these notifications will probably reset cursor and selection state.
-        # We need to keep these if possible. Ideally, we can compare the new display
-        # list against the old one, and only send notifications where items were
-        # actually inserted or deleted, but it's not trivial to calculate.
-        # E.g. we could store the visibility status (as a boolean) for each task
-        # in `task_list`, then run match() with the new filter and create a new
-        # visibility list, and by comparing lists element-to-element it would
-        # be easy to tell where the items have been inserted or deleted.  The
-        # 'visibility list' can be easily recreated from display_index.
-        # *However* the visibility list does not yield positions in the filtered
-        # list - it operates on task_list.  It should be possible to track
-        # display_list positions if we go through the visibility list backwards.
+        """
+        Shows the items matching `filter` (by default, the current filter).
+        The grid is only notified about the rows that appear or disappear,
+        and only the new rows are measured, so the rest of the grid (and the
+        cursor) stays as it is.
+        """
         if filter is None:
             filter = self.last_filter
-        self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, 0, len(self.display_list))
-
-        filtered = [ (pos, task) for pos, task in enumerate(self.task_list) if task is None or filter.match(task) ]
-        # We could have used zip(*filtered) but the code below reads better
-        self.display_list = [ task for pos, task in filtered ]
-        self.display_index = [ pos for pos, task in filtered ]
-
-        self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_INSERTED, 0, len(self.display_list))
-        # This really looks like a hack.  It would be better to handle this in
-        # the grid itself; however, to do that, we'd need to override 
-        # ProcessTableMessage, which would look like another hack.
-        self.GetView().AutoSizeRows()
+        new_index = self.FindMatches(filter)
         self.last_filter = filter
+        self.SetDisplayIndex(new_index)
+
+    def ShowMatches(self, filter: TaskFilter, snapshot: List[Optional[SearchEntry]], matched: List[int],
+        upto: int, done: bool) -> None:
+        """
+        Shows the results of a background search as they come in (see
+        impl.search.run_search): `matched` are the matching positions found
+        in task_list[:upto]; the rest of the list is shown as before until
+        the search gets there.  The caller must make sure `snapshot`, which
+        the search is running on, is still current.
+        """
+        new_index = matched + [ i for i in self.display_index if i >= upto ]
+        if done:
+            self.CacheMatches(filter, list(matched))
+            self.last_filter = filter
+        self.SetDisplayIndex(new_index)
+
+    def SetDisplayIndex(self, new_index: List[int]) -> None:
+        grid = self.GetView()
+        cursor_row = grid.GetGridCursorRow()
+        cursor_task = self.display_list[cursor_row] if 0 <= cursor_row < len(self.display_list) else None
+
+        old_index = self.display_index
+        self.display_index = new_index
+        self.display_list = [ self.task_list[i] for i in new_index ]
+
+        grid.BeginBatch()
+        try:
+            for row in self.NotifyIndexChanges(old_index, self.display_index):
+                grid.AutoSizeRow(row)
+        finally:
+            grid.EndBatch()
+
+        # The grid doesn't move the cursor along with the rows inserted or
+        # deleted above it
+        if cursor_task is not None:
+            row = self.FindItem(cursor_task)
+            if row >= 0 and row != grid.GetGridCursorRow():
+                grid.SetGridCursor(row, grid.GetGridCursorCol())
+
+    def NotifyIndexChanges(self, old_index: Sequence[int], new_index: Sequence[int]) -> List[int]:
+        """
+        Tells the grid how to get from the rows in `old_index` to the rows in
+        `new_index` (both being positions in task_list, in ascending order):
+        one notification per run of deleted or inserted rows.  Returns the
+        inserted rows.
+        """
+        inserted: List[int] = []
+        # Runs are notified as they are found, so `row` is always a position
+        # in the grid as the grid sees it at the moment.
+        row = 0
+        i = j = 0
+        while i < len(old_index) or j < len(new_index):
+            if i < len(old_index) and j < len(new_index) and old_index[i] == new_index[j]:
+                row += 1
+                i += 1
+                j += 1
+            elif j == len(new_index) or (i < len(old_index) and old_index[i] < new_index[j]):
+                start = i
+                while i < len(old_index) and (j == len(new_index) or old_index[i] < new_index[j]):
+                    i += 1
+                self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, row, i - start)
+            else:
+                start = j
+                while j < len(new_index) and (i == len(old_index) or new_index[j] < old_index[i]):
+                    j += 1
+                self.NotifyGrid(wx.grid.GRIDTABLE_NOTIFY_ROWS_INSERTED, row, j - start)
+                inserted.extend(range(row, row + j - start))
+                row += j - start
+        return inserted
 
 # TODO: we probably need an attr provider that will return different attrs for
 # different columns.
 
+def DrawCellBackground(grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, rect: wx.Rect, isSelected: bool) -> None:
+    dc.SetBackgroundMode(wx.BRUSHSTYLE_SOLID)
+    cell_back_col = attr.GetBackgroundColour() if not isSelected \
+        else (grid.GetSelectionBackground() if grid.HasFocus() \
+        else wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNSHADOW))
+
+    dc.SetBrush(wx.Brush(cell_back_col))
+    dc.SetPen(wx.TRANSPARENT_PEN)   # type: ignore[attr-defined]    # wx.TRANSPARENT_PEN is initialized directly in wx.core
+    dc.DrawRectangle(rect)
+
+
 class TaskStatusRenderer(wx.grid.GridCellStringRenderer):
     status_font: wx.Font
 
@@ -278,14 +487,7 @@ class TaskStatusRenderer(wx.grid.GridCellStringRenderer):
 
     def Draw(self, grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, rect: wx.Rect, row: int, col: int, isSelected: bool) -> None:
         # Clear cell background
-        dc.SetBackgroundMode(wx.BRUSHSTYLE_SOLID)
-        cell_back_col = attr.GetBackgroundColour() if not isSelected \
-            else (grid.GetSelectionBackground() if grid.HasFocus() \
-            else wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNSHADOW))
-
-        dc.SetBrush(wx.Brush(cell_back_col))
-        dc.SetPen(wx.TRANSPARENT_PEN)   # type: ignore[attr-defined]    # wx.TRANSPARENT_PEN is initialized directly in wx.core
-        dc.DrawRectangle(rect)
+        DrawCellBackground(grid, attr, dc, rect, isSelected)
 
         # TODO: This looks like a dirty trick.  We should be using something like
         # grid.GetCellValue(), but returning non-string data.  Is there such
@@ -341,12 +543,160 @@ class TaskStatusRenderer(wx.grid.GridCellStringRenderer):
                 label_renderer.DrawLabel(dc, label, wx.Colour(232, 232, 232), wx.Colour(0, 0, 0), True)
 
 
+def wrap_text(text: str, width: int, measure: Callable[[str], int]) -> Tuple[List[str], int, int]:
+    """
+    Breaks `text` into lines no wider than `width` (as told by `measure`),
+    the same way GridCellAutoWrapStringRenderer does: between words, or
+    within a word that doesn't fit on a line by itself.
+
+    Returns the lines along with the range of widths that give exactly the
+    same lines: from the widest line (not counting single characters that
+    don't fit anyway) to the narrowest width that would let more text on
+    some line.  The lines can be reused for any width in that range.
+    """
+    lines: List[str] = []
+    min_width = 0
+    next_width = sys.maxsize
+    for paragraph in text.split("\n"):
+        line = ""
+        line_width = 0
+        for word in paragraph.split():
+            candidate = line + " " + word if line else word
+            candidate_width = measure(candidate)
+            if candidate_width <= width:
+                line, line_width = candidate, candidate_width
+                continue
+            next_width = min(next_width, candidate_width)
+            if line:
+                lines.append(line)
+                min_width = max(min_width, line_width)
+            line, line_width = word, measure(word)
+            while line_width > width and len(line) > 1:
+                # Any wider, and the rest of the word might fit as a whole
+                next_width = min(next_width, line_width)
+                # The longest piece that fits, but at least one character
+                lo, hi = 1, len(line) - 1
+                while lo < hi:
+                    mid = (lo + hi + 1) // 2
+                    if measure(line[:mid]) <= width:
+                        lo = mid
+                    else:
+                        hi = mid - 1
+                piece_width = measure(line[:lo])
+                if piece_width <= width:
+                    min_width = max(min_width, piece_width)
+                next_width = min(next_width, measure(line[:lo + 1]))
+                lines.append(line[:lo])
+                line = line[lo:]
+                line_width = measure(line)
+        lines.append(line)
+        if line_width <= width or len(line) > 1:
+            min_width = max(min_width, line_width)
+    return lines, min_width, next_width
+
+
+class TextLayoutCache:
+    """
+    Remembers how texts have been wrapped (see wrap_text), by text and font.
+    A text usually keeps its lines over a range of widths, so most resizes
+    of the window don't need to measure anything.
+    """
+    # (text, font): [ (lines, min width, next width) ]
+    layouts: Dict[Tuple[str, str], List[Tuple[List[str], int, int]]]
+
+    # A few widths per text are enough; the window is only resized so often.
+    MAX_LAYOUTS_PER_TEXT: ClassVar[int] = 4
+    MAX_TEXTS: ClassVar[int] = 100000
+
+    def __init__(self) -> None:
+        self.layouts = {}
+
+    def Find(self, text: str, font: str, width: int) -> Optional[Tuple[List[str], int, int]]:
+        for layout in self.layouts.get((text, font), ()):
+            if layout[1] <= width < layout[2]:
+                return layout
+        return None
+
+    def Get(self, text: str, font: str, width: int, measure: Callable[[str], int]) -> Tuple[List[str], int, int]:
+        layout = self.Find(text, font, width)
+        if layout is None:
+            if len(self.layouts) >= self.MAX_TEXTS:
+                self.layouts.clear()
+            layout = wrap_text(text, width, measure)
+            known = self.layouts.setdefault((text, font), [])
+            known.insert(0, layout)
+            del known[self.MAX_LAYOUTS_PER_TEXT:]
+        return layout
+
+
+class TaskSummaryRenderer(wx.grid.GridCellStringRenderer):
+    """
+    Word-wrapping renderer for the summary column.  Unlike
+    GridCellAutoWrapStringRenderer, which breaks the text into lines again
+    every time a cell is measured or drawn, it takes the lines from
+    a TextLayoutCache, shared by all the clones of the renderer.
+    """
+    layouts: TextLayoutCache
+
+    # Same as in GridCellAutoWrapStringRenderer: keeps the text from looking
+    # too cramped
+    BORDER: ClassVar[int] = 6
+
+    def __init__(self, layouts: Optional[TextLayoutCache] = None) -> None:
+        super().__init__()
+        self.layouts = layouts if layouts is not None else TextLayoutCache()
+
+    @staticmethod
+    def TextWidth(col_width: int) -> int:
+        return col_width - 2 * TaskStatusRenderer.GRID_TEXT_MARGIN
+
+    def GetLines(self, grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, row: int, col: int, col_width: int) -> List[str]:
+        text = grid.GetTable().GetValue(row, col) or ""
+        font = attr.GetFont()
+        dc.SetFont(font)
+        return self.layouts.Get(text, font.GetNativeFontInfoDesc(), self.TextWidth(col_width),
+            lambda s: dc.GetTextExtent(s).width)[0]
+
+    def Draw(self, grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, rect: wx.Rect, row: int, col: int, isSelected: bool) -> None:
+        DrawCellBackground(grid, attr, dc, rect, isSelected)
+        lines = self.GetLines(grid, attr, dc, row, col, rect.width)
+        if isSelected:
+            dc.SetTextForeground(grid.GetSelectionForeground() if grid.HasFocus()
+                else wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNTEXT))
+        else:
+            dc.SetTextForeground(attr.GetTextColour())
+        dc.SetBackgroundMode(wx.BRUSHSTYLE_TRANSPARENT)
+        text_rect = wx.Rect(rect.topLeft, rect.bottomRight)
+        text_rect.Deflate(TaskStatusRenderer.GRID_TEXT_MARGIN)
+        h_align, v_align = attr.GetAlignment()
+        grid.DrawTextRectangle(dc, lines, text_rect, h_align, v_align)
+
+    def GetBestHeight(self, grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, row: int, col: int, width: int) -> int:
+        lines = self.GetLines(grid, attr, dc, row, col, width)
+        return len(lines) * dc.GetCharHeight() + self.BORDER
+
+    def GetBestWidth(self, grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, row: int, col: int, height: int) -> int:
+        # The column is always stretched to the window width
+        return grid.GetColSize(col)
+
+    def GetBestSize(self, grid: wx.grid.Grid, attr: wx.grid.GridCellAttr, dc: wx.DC, row: int, col: int) -> wx.Size:
+        width = grid.GetColSize(col)
+        return wx.Size(width, self.GetBestHeight(grid, attr, dc, row, col, width))
+
+    def Clone(self) -> "TaskSummaryRenderer":
+        return TaskSummaryRenderer(self.layouts)
+
+
 TaskListDropEventType = wx.NewEventType()
 EVT_TASK_LIST_DROP = wx.PyEventBinder(TaskListDropEventType, 0)
 
 class TaskListDropEvent(wx.CommandEvent):
-    def __init__(self):
+    # IDs of the tasks that have been dropped
+    items: List[str]
+
+    def __init__(self, items: Sequence[str] = ()):
         wx.Event.__init__(self, commandEventType = TaskListDropEventType)
+        self.items = list(items)
    
 
 class TaskList(wx.grid.Grid):
@@ -360,11 +710,19 @@ class TaskList(wx.grid.Grid):
     drag_start_row: Optional[int] = None
 
     task_pool: Dict[str, Task]
+    summary_renderer: TaskSummaryRenderer
+    # Row heights measured so far, by whatever the height depends on (see
+    # RowHeightKey), and then by the range of summary column widths that
+    # give the same height: [ (min width, next width, height) ].
+    row_heights: Dict[Tuple[Any, ...], List[Tuple[int, int, int]]]
 
     def __init__(self, *arg, **kw) -> None:
         super().__init__(*arg, **kw)
 
         self.task_pool = {}
+        self.row_heights = {}
+        self.summary_renderer = TaskSummaryRenderer()
+        self.SetDefaultRenderer(self.summary_renderer)
 
         # Note: whatever the doc says about AssignTable being identical
         # to SetTable(takeOwnership=True), seems to be wrong for wxPython 4.1.1.
@@ -393,6 +751,52 @@ class TaskList(wx.grid.Grid):
         table.Filter(filter)
         # self.AutoSizeRows()
 
+    def RowHeightKey(self, task: Task) -> Tuple[Any, ...]:
+        # Everything shown in the row, except for the width of the summary
+        # column, which is checked against the ranges stored in row_heights.
+        # The deadline label depends on today's date.
+        return (task.id, task.summary, task.status, task.deadline, date.today() if task.deadline is not None else None,
+            task.epic.id if task.epic is not None else None, tuple(task.labels),
+            self.GetColSize(0), self.GetDefaultCellFont().GetNativeFontInfoDesc())
+
+    def AutoSizeRow(self, row: int, setAsMin: bool = True) -> None:
+        """
+        Same as Grid.AutoSizeRow(), but only measures the row if its contents
+        or the column widths have changed since it was last measured.
+        """
+        task = self.GetTable().GetValue(row, 0)
+        if task is None:
+            super().AutoSizeRow(row, setAsMin)
+            return
+
+        key = self.RowHeightKey(task)
+        width = TaskSummaryRenderer.TextWidth(self.GetColSize(1))
+        height = next((h for (lo, hi, h) in self.row_heights.get(key, ()) if lo <= width < hi), None)
+        if height is None:
+            super().AutoSizeRow(row, setAsMin)
+            # The measurement has put the lines into the renderer's cache
+            layout = self.summary_renderer.layouts.Find(task.summary, key[-1], width)
+            if layout is not None:
+                if len(self.row_heights) >= TextLayoutCache.MAX_TEXTS:
+                    self.row_heights.clear()
+                known = self.row_heights.setdefault(key, [])
+                known.insert(0, (layout[1], layout[2], self.GetRowSize(row)))
+                del known[TextLayoutCache.MAX_LAYOUTS_PER_TEXT:]
+            return
+
+        if setAsMin:
+            self.SetRowMinimalHeight(row, height)
+        if self.GetRowSize(row) != height:
+            self.SetRowSize(row, height)
+
+    def AutoSizeRows(self, setAsMin: bool = True) -> None:
+        self.BeginBatch()
+        try:
+            for row in range(self.GetNumberRows()):
+                self.AutoSizeRow(row, setAsMin)
+        finally:
+            self.EndBatch()
+
     def GetColGridLinePen1(self, col: wx.Colour) -> wx.Pen:
         # pen = wx.Pen(wx.Colour(0, 255, 255), 1, style=wx.PENSTYLE_USER_DASH)
         # pen.SetDashes([2, 2])
@@ -415,6 +819,7 @@ class TaskList(wx.grid.Grid):
         Put together a data object for drag-and-drop _from_ this list, and
         initiate the drag-and-drop operation.
         """
+        import pickle
 
         drag_data = {}
 
@@ -543,8 +948,8 @@ class TaskList(wx.grid.Grid):
                 self.SetGridCursor(index, 1)
         
         # TODO: maybe call ProcessEvent directly? does PostEvent use a queue? is it critical for us?
-        # TODO: maybe pass extra data like what items were dropped and where
-        wx.PostEvent(self.GetEventHandler(), TaskListDropEvent())
+        # TODO: maybe pass extra data like where the items were dropped
+        wx.PostEvent(self.GetEventHandler(), TaskListDropEvent(items))
 
 
     def MoveDropPlaceholder(self, index: int) -> None:
@@ -726,6 +1131,7 @@ class TaskListDropTarget(wx.DropTarget):
         """
         ...
         """
+        import pickle
 
         # No need to cache it anymore
         self.last_drag_point_y = -1